@@ -0,0 +1,51 @@
+# app/celery_app.py
+"""
+The Celery application, without any task implementations.
+
+The API only publishes tasks by name and reads results, so it imports this
+module instead of app.tasks (which pulls in the renderer and storage SDKs).
+Workers load the task modules through `include`: app.tasks always, and
+app.generation (which loads the LLM provider SDKs) only on workers that serve
+the generation stage.
+"""
+import time
+from celery import Celery
+from celery.signals import before_task_publish
+from app.config import (
+    BROKER_VISIBILITY_TIMEOUT, REDIS_URL, RENDER_QUEUE_BASIC, RENDER_QUEUE_LATEX, TASK_ACKS_LATE,
+    WORKER_PREFETCH_MULTIPLIER, WORKER_STAGES,
+)
+from app.core import tracing
+
+# Keep the historical main name so task names stay "app.tasks.<name>".
+celery = Celery("app.tasks", broker=REDIS_URL, backend=REDIS_URL,
+                include=["app.tasks"] + (["app.generation"] if "generation" in WORKER_STAGES else []))
+celery.conf.update(
+    worker_prefetch_multiplier=WORKER_PREFETCH_MULTIPLIER,
+    task_acks_late=TASK_ACKS_LATE,
+    # A render whose worker died (OOM kill, node loss) goes back to the queue
+    task_reject_on_worker_lost=TASK_ACKS_LATE,
+    broker_transport_options={"visibility_timeout": BROKER_VISIBILITY_TIMEOUT},
+    # Only used by workers started with --autoscale
+    worker_autoscaler="app.services.autoscale:CostAwareAutoscaler",
+)
+
+RENDER_TASK = "app.tasks.render_manim_scene"
+UPGRADE_TASK = "app.tasks.upgrade_render"
+COLLECT_SCENES_TASK = "app.tasks.collect_scene_renders"
+NOTIFY_WEBHOOK_TASK = "app.tasks.notify_webhook"
+GENERATE_TASK = "app.generation.generate_scene"
+
+# Render-stage workers always consume the basic queue and add the LaTeX queue
+# when their toolchain probe finds latex and dvisvgm; generation-stage workers
+# consume GENERATION_QUEUE (see app.tasks).
+LATEX_QUEUE = RENDER_QUEUE_LATEX
+BASIC_QUEUE = RENDER_QUEUE_BASIC
+
+
+@before_task_publish.connect
+def _stamp_task_headers(headers=None, **kwargs):
+    # Runs in the publishing process (API); the headers travel with the message.
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+        tracing.inject(headers)
@@ -14,11 +14,174 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 # Model Configuration
 MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "openai")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")
+DEEPSEEK_MODEL_NAME = os.getenv("DEEPSEEK_MODEL_NAME", "deepseek-chat")
+# Speculative generation: ask each provider for this many candidates at once (n>1 where the API
+# supports it, parallel calls otherwise) and keep the first that passes the checks; 1 disables it
+GENERATION_CANDIDATES = int(os.getenv("GENERATION_CANDIDATES", "1"))
+# Checks a candidate must pass on top of the basic one: "static" (CodeValidator) and/or "dry_run"
+# (Manim --dry_run of the first scene; needs Manim on the API host, skipped without it)
+GENERATION_CANDIDATE_CHECKS = [c.strip() for c in os.getenv("GENERATION_CANDIDATE_CHECKS", "").split(",") if c.strip()]
+# Reject generated code that uses Manim classes, functions, methods or keywords the index does not have.
+# Build the index with `python -m app.services.manim_api build` where Manim is installed; without one, nothing is checked.
+MANIM_API_CHECK = os.getenv("MANIM_API_CHECK", "true").lower() == "true"
+MANIM_API_INDEX_DIR = os.getenv("MANIM_API_INDEX_DIR", os.path.join(os.path.dirname(__file__), "data"))
+# Index to use where Manim itself is not installed (the API); defaults to the newest in MANIM_API_INDEX_DIR
+MANIM_API_VERSION = os.getenv("MANIM_API_VERSION", "")
 
 # Google Cloud Storage
 GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME","your-default-name")
 # Make sure GOOGLE_APPLICATION_CREDENTIALS is set in your environment
 
+# Storage backend for rendered videos: "gcs" or "local" (served by /api/videos)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "media_store")
+# Prefix for public URLs of locally stored files; set to the API's external URL in production
+LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL", "/api/videos").rstrip("/")
+VIDEO_MAX_OPEN_FILES = int(os.getenv("VIDEO_MAX_OPEN_FILES", "256"))  # concurrent open handles for /api/videos
+VIDEO_OPEN_TIMEOUT = float(os.getenv("VIDEO_OPEN_TIMEOUT", "5"))  # seconds to wait for a free handle before 503
+# Internal location prefix for nginx X-Accel-Redirect offload (e.g. "/protected-videos"); empty serves from the API
+VIDEO_ACCEL_REDIRECT_PREFIX = os.getenv("VIDEO_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+
 # Redis and Celery
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
\ No newline at end of file
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Renders run for minutes: a worker process reserves one message at a time and
+# acks it only when the task ends, so renders of a crashed worker are redelivered
+WORKER_PREFETCH_MULTIPLIER = int(os.getenv("WORKER_PREFETCH_MULTIPLIER", "1"))
+TASK_ACKS_LATE = os.getenv("TASK_ACKS_LATE", "true").lower() == "true"
+# Unacked messages go back to the queue after this many seconds; keep it above the slowest render
+BROKER_VISIBILITY_TIMEOUT = int(os.getenv("BROKER_VISIBILITY_TIMEOUT", str(4 * 3600)))
+# A render redelivered this many times (it keeps killing its worker) fails instead of looping
+TASK_MAX_DELIVERIES = int(os.getenv("TASK_MAX_DELIVERIES", "3"))
+# Cost-aware pool sizing for workers started with --autoscale=MAX,MIN
+WORKER_COST_AUTOSCALE = os.getenv("WORKER_COST_AUTOSCALE", "true").lower() == "true"
+WORKER_CPU_BUDGET = float(os.getenv("WORKER_CPU_BUDGET", "0"))  # cores available to renders; 0 = all
+WORKER_MEMORY_FRACTION = float(os.getenv("WORKER_MEMORY_FRACTION", "0.8"))  # of physical RAM
+# Replace the static per-quality cost table with measured CPU and peak memory once renders report them
+WORKER_COST_CALIBRATION = os.getenv("WORKER_COST_CALIBRATION", "true").lower() == "true"
+# Job pipeline: POST /api/render answers 202 at once and code generation runs as a Celery stage
+GENERATION_QUEUE = os.getenv("GENERATION_QUEUE", "generation")
+# Stages a worker serves, comma-separated: "generation" (LLM calls, loads the provider SDKs) and/or "render".
+# Run one pool per stage (e.g. WORKER_STAGES=generation celery -A app.celery_app worker -Q generation) to scale them apart.
+WORKER_STAGES = [s.strip() for s in os.getenv("WORKER_STAGES", "generation,render").split(",") if s.strip()]
+JOB_TTL = int(os.getenv("JOB_TTL", str(24 * 3600)))  # seconds a job's stage record is kept
+
+# Rendering
+# Extra directory searched for latex/dvisvgm (e.g. MiKTeX's bin dir on Windows); PATH is always searched
+LATEX_BIN_DIR = os.getenv("LATEX_BIN_DIR", "")
+# Route scenes that use Tex/MathTex to LaTeX-capable workers and the rest to any worker
+TOOLCHAIN_ROUTING_ENABLED = os.getenv("TOOLCHAIN_ROUTING_ENABLED", "true").lower() == "true"
+RENDER_QUEUE_LATEX = os.getenv("RENDER_QUEUE_LATEX", "render_latex")
+RENDER_QUEUE_BASIC = os.getenv("RENDER_QUEUE_BASIC", "render_basic")
+# A dry-run of construct() catches hallucinated APIs and bad LaTeX in seconds,
+# before a worker commits to a full-quality render.
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() == "true"
+PREFLIGHT_TIMEOUT = int(os.getenv("PREFLIGHT_TIMEOUT", "60"))
+
+# Cancellation (DELETE /api/render/{task_id}): running renders check for a cancel flag this often
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "2"))
+CANCEL_KILL_GRACE = float(os.getenv("CANCEL_KILL_GRACE", "5"))  # seconds between SIGTERM and SIGKILL
+# Cancel renders no client has polled for this many seconds (0 disables); keep well above STATUS_MAX_WAIT
+RENDER_ABANDON_TIMEOUT = int(os.getenv("RENDER_ABANDON_TIMEOUT", "0"))
+
+# Completion webhooks (callback_url on POST /api/render): a signed POST when the render finishes
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))  # then the delivery is dead-lettered
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "2"))  # seconds before the first retry, doubling
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "600"))
+# Signs callbacks registered without a secret of their own (empty: those go unsigned)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Hosts callbacks may target, comma-separated (empty allows any); keeps the workers from being used to probe the network
+WEBHOOK_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+# Let callbacks target loopback, private, link-local and reserved addresses (local testing only)
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = os.getenv("WEBHOOK_ALLOW_PRIVATE_ADDRESSES", "false").lower() == "true"
+WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "")  # empty: Celery's default queue, which every worker consumes
+WEBHOOK_DEAD_LETTER_MAX = int(os.getenv("WEBHOOK_DEAD_LETTER_MAX", "1000"))
+
+# Admission control for POST /api/render (checked before the LLM call)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "100"))
+ADMISSION_MAX_BACKLOG_SECONDS = float(os.getenv("ADMISSION_MAX_BACKLOG_SECONDS", "900"))
+# Per-client cap on queued/running renders; shrinks to a fair share of
+# ADMISSION_MAX_QUEUE_DEPTH when many clients are active at once
+ADMISSION_MAX_INFLIGHT_PER_CLIENT = int(os.getenv("ADMISSION_MAX_INFLIGHT_PER_CLIENT", "3"))
+ADMISSION_INFLIGHT_TTL = int(os.getenv("ADMISSION_INFLIGHT_TTL", "3600"))  # forget leaked slots after this
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "300"))
+
+# Load-adaptive quality degradation (opt-in). Under queue pressure, requests
+# step down QUALITY_LADDER (most to least expensive) one rung per threshold crossed.
+QUALITY_DEGRADATION_ENABLED = os.getenv("QUALITY_DEGRADATION_ENABLED", "false").lower() == "true"
+QUALITY_LADDER = os.getenv("QUALITY_LADDER", "production,3b1b-style,polished,draft")
+QUALITY_DEGRADE_QUEUE_DEPTHS = os.getenv("QUALITY_DEGRADE_QUEUE_DEPTHS", "10,25,50")
+# Total render slots across all workers (sum of --concurrency); 0 ignores utilization
+RENDER_WORKER_SLOTS = int(os.getenv("RENDER_WORKER_SLOTS", "0"))
+QUALITY_DEGRADE_UTILIZATION = float(os.getenv("QUALITY_DEGRADE_UTILIZATION", "0.9"))
+# Re-render degraded requests at the requested quality once load subsides
+QUALITY_UPGRADE_ENABLED = os.getenv("QUALITY_UPGRADE_ENABLED", "false").lower() == "true"
+QUALITY_UPGRADE_DELAY = int(os.getenv("QUALITY_UPGRADE_DELAY", "120"))  # seconds between load checks
+QUALITY_UPGRADE_MAX_ATTEMPTS = int(os.getenv("QUALITY_UPGRADE_MAX_ATTEMPTS", "30"))
+
+# Template fast path: well-known topics skip the LLM and use a pre-validated scene
+TEMPLATES_ENABLED = os.getenv("TEMPLATES_ENABLED", "true").lower() == "true"
+TEMPLATE_MATCH_THRESHOLD = float(os.getenv("TEMPLATE_MATCH_THRESHOLD", "0.8"))
+# Finished renders keyed by (code, scene, quality); identical requests reuse the upload
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "true").lower() == "true"
+RENDER_CACHE_TTL = int(os.getenv("RENDER_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Near-duplicate prompt index: reuse the code of an earlier successful render for a reworded prompt
+PROMPT_INDEX_ENABLED = os.getenv("PROMPT_INDEX_ENABLED", "true").lower() == "true"
+PROMPT_INDEX_THRESHOLD = float(os.getenv("PROMPT_INDEX_THRESHOLD", "0.75"))  # Jaccard similarity of prompt tokens
+PROMPT_INDEX_MAX_ENTRIES = int(os.getenv("PROMPT_INDEX_MAX_ENTRIES", "200000"))  # per generation worker process, ~300 bytes each
+PROMPT_INDEX_CODE_TTL = int(os.getenv("PROMPT_INDEX_CODE_TTL", str(30 * 24 * 3600)))
+
+# Few-shot examples and guideline lines in the generation prompt (see app/services/prompts.py):
+# "dynamic" picks them per request from the style and the prompt's math domains, "full" embeds the original set
+PROMPT_FEW_SHOT = os.getenv("PROMPT_FEW_SHOT", "dynamic").lower()
+PROMPT_MAX_EXAMPLES = int(os.getenv("PROMPT_MAX_EXAMPLES", "1"))
+PROMPT_FULL_SAMPLE_RATE = float(os.getenv("PROMPT_FULL_SAMPLE_RATE", "0"))  # share of requests on "full", as a control group
+PROMPT_EXAMPLES_DIR = os.getenv("PROMPT_EXAMPLES_DIR", "")  # extra example files, each with a "# domains:" header
+
+# Multi-scene files: every Scene class renders as its own parallel subtask
+MAX_SCENES_PER_REQUEST = int(os.getenv("MAX_SCENES_PER_REQUEST", "8"))
+SCENE_STITCH_ENABLED = os.getenv("SCENE_STITCH_ENABLED", "true").lower() == "true"  # concat into one video
+
+# Video encoding per quality tier (tier:profile pairs; see app/core/encoding.py for the profiles).
+# A profile is a name (manim, fast, draft, small, hevc) or codec/preset/crf, e.g. "qk:libx264/veryfast/22".
+# "manim" keeps Manim's own settings (libx264, preset medium, CRF 23).
+ENCODER_PROFILES = os.getenv("ENCODER_PROFILES", "ql:manim,qm:manim,qh:manim,qk:manim")
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))  # encoder threads per render; 0 = encoder default
+
+# Post-processing of rendered videos (faststart, poster frame, optional HLS)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")  # frame counts for resource accounting
+POSTPROCESS_ENABLED = os.getenv("POSTPROCESS_ENABLED", "true").lower() == "true"
+POSTPROCESS_TIMEOUT = int(os.getenv("POSTPROCESS_TIMEOUT", "300"))
+THUMBNAIL_ENABLED = os.getenv("THUMBNAIL_ENABLED", "true").lower() == "true"
+HLS_ENABLED = os.getenv("HLS_ENABLED", "false").lower() == "true"
+# height:video_bitrate pairs; renditions taller than the source are skipped
+HLS_RENDITIONS = os.getenv("HLS_RENDITIONS", "1080:5000k,720:2800k,480:1400k")
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+
+# Logging: records go through a queue to a background thread, so callers never wait on the stream
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" (one object per line) or "text"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped, not waited for
+# Below WARNING only: module or logger name -> keep ratio ("validator:0.1") or records per second ("tasks:20/s")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+# Metrics
+# Port for the worker-side Prometheus exporter (0 disables it). The API serves /metrics itself.
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9808"))
+
+# Tracing
+# TRACE_EXPORTER: "none", "file" (OTLP/JSON lines) or "otlp" (OTLP/HTTP JSON collector)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE_PATH = os.getenv("TRACE_FILE_PATH", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.1"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "manimate")
+
+# Status API
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))  # finished tasks kept in-process
+STATUS_MAX_WAIT = float(os.getenv("STATUS_MAX_WAIT", "30"))  # long-poll ceiling in seconds
+STATUS_BULK_MAX_IDS = int(os.getenv("STATUS_BULK_MAX_IDS", "200"))
@@ -0,0 +1,143 @@
+# app/core/accounting.py
+"""
+Resource accounting for render tasks: CPU time, peak RSS and disk I/O.
+
+Subprocesses (Manim, ffmpeg) are reaped with os.wait4. It returns the usage
+of that one child, including the descendants it waited for, such as the
+ffmpeg and LaTeX processes Manim runs. The numbers are therefore exact even
+when one worker runs several tasks. The usage goes to every collect() block
+open on the calling thread.
+
+In-process work (uploads) is measured by measure_process() as a
+getrusage(RUSAGE_SELF) delta. That is exact under the prefork pool, where a
+process runs one task at a time.
+"""
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+MB = 1024 * 1024
+BLOCK_BYTES = 512  # unit of ru_inblock / ru_oublock
+MAXRSS_BYTES = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is KiB on Linux, bytes on macOS
+
+_local = threading.local()
+
+
+@dataclass
+class Usage:
+    wall: float = 0.0
+    user: float = 0.0
+    sys: float = 0.0
+    peak_rss: int = 0  # bytes
+    read_bytes: int = 0  # from storage, not the page cache
+    written_bytes: int = 0
+
+    @property
+    def cpu(self) -> float:
+        return self.user + self.sys
+
+    def add(self, other: "Usage") -> None:
+        """Folds in a child's usage: times and I/O add up, peak memory is the larger one."""
+        self.user += other.user
+        self.sys += other.sys
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+        self.read_bytes += other.read_bytes
+        self.written_bytes += other.written_bytes
+
+    def compact(self) -> dict:
+        """Short form stored with the task result."""
+        return {
+            "wall_s": round(self.wall, 3),
+            "user_s": round(self.user, 3),
+            "sys_s": round(self.sys, 3),
+            "rss_mb": round(self.peak_rss / MB, 1),
+            "read_mb": round(self.read_bytes / MB, 2),
+            "write_mb": round(self.written_bytes / MB, 2),
+        }
+
+
+def _from_rusage(rusage, wall: float, peak_rss: bool = True) -> Usage:
+    return Usage(
+        wall=wall,
+        user=rusage.ru_utime,
+        sys=rusage.ru_stime,
+        peak_rss=rusage.ru_maxrss * MAXRSS_BYTES if peak_rss else 0,
+        read_bytes=rusage.ru_inblock * BLOCK_BYTES,
+        written_bytes=rusage.ru_oublock * BLOCK_BYTES,
+    )
+
+
+def _record(usage: Usage) -> None:
+    for sink in getattr(_local, "sinks", ()):
+        sink.add(usage)
+
+
+@contextmanager
+def collect():
+    """Yields a Usage that sums every subprocess reaped in the block; `wall` is the block's duration."""
+    usage = Usage()
+    sinks = getattr(_local, "sinks", None)
+    if sinks is None:
+        sinks = _local.sinks = []
+    sinks.append(usage)
+    started = time.monotonic()
+    try:
+        yield usage
+    finally:
+        usage.wall = time.monotonic() - started
+        sinks.remove(usage)
+
+
+@contextmanager
+def measure_process():
+    """Yields a Usage of this process's own CPU and I/O in the block (threads included, children not)."""
+    usage = Usage()
+    before, started = resource.getrusage(resource.RUSAGE_SELF), time.monotonic()
+    try:
+        yield usage
+    finally:
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        usage.wall = time.monotonic() - started
+        usage.user = after.ru_utime - before.ru_utime
+        usage.sys = after.ru_stime - before.ru_stime
+        usage.read_bytes = (after.ru_inblock - before.ru_inblock) * BLOCK_BYTES
+        usage.written_bytes = (after.ru_oublock - before.ru_oublock) * BLOCK_BYTES
+
+
+class AccountedPopen(subprocess.Popen):
+    """Popen that reaps its child with wait4 and keeps the child's usage in `.usage`."""
+
+    def __init__(self, *args, **kwargs):
+        self.usage: Optional[Usage] = None
+        self._started = time.monotonic()
+        super().__init__(*args, **kwargs)
+
+    if hasattr(os, "wait4"):
+        def _try_wait(self, wait_flags):
+            # Same contract as Popen._try_wait, which reaps with waitpid and drops the rusage
+            try:
+                pid, status, rusage = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return self.pid, 0
+            if pid == self.pid:
+                self.usage = _from_rusage(rusage, time.monotonic() - self._started)
+                _record(self.usage)
+            return pid, status
+
+
+def run(args: list, timeout: float = None, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run(args, capture_output=True, timeout=timeout, **kwargs), accounted."""
+    with AccountedPopen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
@@ -0,0 +1,94 @@
+# app/core/encoding.py
+"""
+Video encoder profiles per quality tier.
+
+Manim encodes every animation with libx264 at CRF 23 and x264's default
+"medium" preset. At 1080p60 and 2160p60 that encode is a large share of the
+render. An EncoderProfile sets the codec, preset, CRF, tuning, pixel format
+and thread count. It is applied to Manim's own encoder through
+app/core/manim_launcher.py, and to the HLS renditions in post-processing.
+
+ENCODER_PROFILES picks a profile for each tier. Use benchmarks/encoders.py
+to compare the profiles on your hardware.
+"""
+import json
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+from app.config import ENCODER_PROFILES, ENCODER_THREADS
+from app.core.manim_launcher import ENCODER_ENV
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    name: str
+    codec: str = "libx264"
+    preset: str = "medium"
+    crf: int = 23
+    tune: Optional[str] = None
+    pix_fmt: str = "yuv420p"
+    threads: int = 0  # 0 lets the encoder decide
+
+    def codec_options(self) -> Dict[str, str]:
+        """Private options for the libx264/libx265 encoder, as PyAV and ffmpeg take them."""
+        options = {"preset": self.preset, "crf": str(self.crf)}
+        if self.tune:
+            options["tune"] = self.tune
+        return options
+
+    def ffmpeg_args(self, rate_control: bool = True) -> List[str]:
+        """Video encoder arguments for an ffmpeg command; without `rate_control` the caller sets a bitrate."""
+        args = ["-c:v", self.codec, "-preset", self.preset, "-pix_fmt", self.pix_fmt]
+        if rate_control:
+            args += ["-crf", str(self.crf)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+        return args
+
+    def to_json(self) -> str:
+        """The form the Manim launcher reads from ENCODER_ENV."""
+        return json.dumps({"name": self.name, "codec": self.codec, "pix_fmt": self.pix_fmt, "threads": self.threads,
+                           "options": self.codec_options()}, separators=(",", ":"))
+
+
+# "manim" reproduces Manim's own encoder settings exactly
+PROFILES = {
+    "manim": EncoderProfile("manim"),
+    "fast": EncoderProfile("fast", preset="veryfast", crf=23, tune="animation"),
+    "draft": EncoderProfile("draft", preset="ultrafast", crf=28),
+    "small": EncoderProfile("small", preset="slow", crf=24, tune="animation"),
+    # Roughly half the size of x264 at equal quality, but slower, and not every browser plays HEVC
+    "hevc": EncoderProfile("hevc", codec="libx265", preset="fast", crf=28),
+}
+
+
+def parse_profile(spec: str) -> EncoderProfile:
+    """A profile name, or "codec/preset/crf" for a custom one."""
+    spec = spec.strip()
+    if spec in PROFILES:
+        profile = PROFILES[spec]
+    elif spec.count("/") == 2:
+        codec, preset, crf = spec.split("/")
+        profile = EncoderProfile(spec, codec=codec, preset=preset, crf=int(crf))
+    else:
+        raise ValueError(f"Unknown encoder profile {spec!r}; use one of {sorted(PROFILES)} or codec/preset/crf")
+    return replace(profile, threads=ENCODER_THREADS) if ENCODER_THREADS else profile
+
+
+def parse_tier_profiles(spec: str) -> Dict[str, EncoderProfile]:
+    """"ql:fast,qk:libx264/veryfast/22" -> {"-ql": fast, "-qk": custom}; tiers left out use "manim"."""
+    profiles = {}
+    for item in spec.split(","):
+        if item.strip():
+            tier, profile = item.strip().split(":", 1)
+            profiles["-" + tier.strip().lstrip("-")] = parse_profile(profile)
+    return profiles
+
+
+TIER_PROFILES = parse_tier_profiles(ENCODER_PROFILES)
+
+
+def profile_for(quality_flag: str) -> EncoderProfile:
+    return TIER_PROFILES.get(quality_flag) or parse_profile("manim")
@@ -1,13 +1,220 @@
+# app/core/logging.py
+"""
+Application logging.
+
+A QueueHandler enqueues each record, and a QueueListener thread writes it, so
+neither the event loop nor a render task waits on the output stream. The
+calling thread only merges the message arguments. JSON encoding and the write
+happen on the listener thread. When the queue is full, records are dropped and
+counted, and the caller never blocks.
+
+Every record carries the ids bound with log_context() or bind(). The API binds
+the request's trace id, and workers bind the task and render ids. Records below
+WARNING can be sampled or rate-limited per module or logger name (LOG_SAMPLING).
+
+Pass arguments separately, as in logger.debug("code: %s", code). An f-string is
+formatted even when its level is disabled.
+"""
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+from app.config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLING
+
+_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("log_context", default={})
+
+
+# -------------------------------
+# Context ids
+# -------------------------------
+def bind(**ids) -> contextvars.Token:
+    """Adds `ids` (request_id, task_id, ...) to every record logged in this context; undo with unbind()."""
+    return _context.set({**_context.get(), **{key: str(value) for key, value in ids.items() if value is not None}})
+
+
+def unbind(token: contextvars.Token) -> None:
+    try:
+        _context.reset(token)
+    except ValueError:
+        _context.set({})  # Bound in a different context (e.g. Celery signals)
+
+
+@contextmanager
+def log_context(**ids):
+    token = bind(**ids)
+    try:
+        yield
+    finally:
+        unbind(token)
+
+
+class ContextFilter(logging.Filter):
+    """Attaches the bound ids to the record while still on the logging thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+# -------------------------------
+# Sampling and rate limits
+# -------------------------------
+def parse_sampling(spec: str) -> Dict[str, Tuple[str, float]]:
+    """"validator:0.1,tasks:20/s" -> {"validator": ("ratio", 0.1), "tasks": ("rate", 20.0)}"""
+    rules = {}
+    for item in spec.split(","):
+        if item.strip():
+            key, rule = item.strip().rsplit(":", 1)
+            if rule.endswith("/s"):
+                rules[key.strip()] = ("rate", float(rule[:-2]))
+            else:
+                rules[key.strip()] = ("ratio", float(rule))
+    return rules
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Thins out records below WARNING, by module (e.g. "validator") or logger
+    name: "ratio" rules keep that fraction at random, "rate" rules keep at most
+    that many per second (a token bucket). Warnings and errors always pass.
+    """
+
+    def __init__(self, rules: Dict[str, Tuple[str, float]]):
+        super().__init__()
+        self.rules = rules
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rules:
+            return True
+        key = record.module if record.module in self.rules else record.name
+        rule = self.rules.get(key)
+        if rule is None:
+            return True
+        kind, value = rule
+        if kind == "ratio":
+            return random.random() < value
+        with self._lock:
+            tokens, last = self._buckets.get(key, (value, record.created))
+            tokens = min(value, tokens + (record.created - last) * value)
+            keep = tokens >= 1
+            self._buckets[key] = (tokens - 1 if keep else tokens, record.created)
+        return keep
 
-logger = logging.getLogger("manim_app")
-logger.setLevel(logging.INFO)
 
-# Console handler
-ch = logging.StreamHandler()
-ch.setLevel(logging.INFO)
+# -------------------------------
+# Output
+# -------------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
 
-formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] %(name)s - %(message)s")
-ch.setFormatter(formatter)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
 
-logger.addHandler(ch)
+
+class TextFormatter(logging.Formatter):
+    """The classic console format, with the bound ids appended."""
+
+    def __init__(self):
+        super().__init__("[%(asctime)s] [%(levelname)s] %(name)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        return f"{line} [{' '.join(f'{k}={v}' for k, v in context.items())}]" if context else line
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record, and the next record that fits reports how many were lost."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may change once the caller moves on); formatting is the listener's job
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    "name": record.name, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"{self.dropped} log records dropped: logging queue full", "context": {},
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Waits for room: the running listener thread drains the queue, and stop() must not fail on a full one
+        self.queue.put(self._sentinel)
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+_stream = logging.StreamHandler()
+_stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+_handler = AsyncQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+_handler.addFilter(ContextFilter())
+_listener = None
+
+
+def _start_listener() -> None:
+    global _listener
+    # A fresh queue after fork: the inherited one may be locked by the parent's listener thread
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = _Listener(_handler.queue, _stream)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Writes out the queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+_start_listener()
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    # Prefork worker children do not inherit the parent's listener thread
+    os.register_at_fork(after_in_child=_start_listener)
+
+logger = logging.getLogger("manim_app")
+logger.setLevel(LOG_LEVEL)
+logger.addHandler(_handler)
+# The queue handler is the only output; Celery's root handlers would write every record again, synchronously
+logger.propagate = False
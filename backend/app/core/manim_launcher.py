@@ -0,0 +1,122 @@
+# app/core/manim_launcher.py
+"""
+Runs the Manim CLI with the encoder profile in $MANIMATE_ENCODER applied.
+
+Manim opens every partial movie file with a hardcoded libx264 encoder at CRF
+23. This wrapper swaps in the profile's codec and options when Manim adds that
+stream. It then sets the profile's pixel format and thread count before the
+first frame is encoded. Transparent (qtrle) and WebM output keep Manim's
+settings, and so does combining the partial movies (a stream copy). Without
+the variable, or on a Manim version without PyAV partial movies, Manim runs
+unchanged.
+
+Render subprocesses run it as a module, with the backend directory on
+PYTHONPATH (see command() and environment()). Run by path, its directory would
+come first on sys.path and app/core/logging.py would shadow the stdlib logging
+package Manim imports. It imports nothing from the app:
+
+    PYTHONPATH=. python -m app.core.manim_launcher scene.py MyScene -qh --renderer=cairo
+"""
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+ENCODER_ENV = "MANIMATE_ENCODER"
+MANIM_PARTIAL_MOVIE_CODEC = "libx264"
+# The directory holding the `app` package
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def command(*args: str) -> List[str]:
+    """The subprocess command running Manim with `args` through this launcher."""
+    return [sys.executable, "-m", "app.core.manim_launcher", *args]
+
+
+def environment(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """`env` (default: this process's) with the backend directory on PYTHONPATH, so command() finds the launcher."""
+    env = dict(os.environ if env is None else env)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+class _Container:
+    """Output container proxy: Manim's libx264 stream gets the profile's codec and options."""
+
+    def __init__(self, container, profile: dict):
+        self._container = container
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+    def __enter__(self):
+        self._container.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._container.__exit__(*exc_info)
+
+    def add_stream(self, *args, **kwargs):
+        codec_name = args[0] if args else kwargs.get("codec_name")
+        if codec_name != MANIM_PARTIAL_MOVIE_CODEC:
+            return self._container.add_stream(*args, **kwargs)
+        # Keep Manim's container options (e.g. "an" for no audio), replace the encoder's
+        options = {k: v for k, v in (kwargs.pop("options", None) or {}).items() if k not in ("crf", "preset", "tune")}
+        options.update(self._profile["options"])
+        kwargs.pop("codec_name", None)
+        return self._container.add_stream(self._profile["codec"], *args[1:], options=options, **kwargs)
+
+
+class _AV:
+    """Stands in for the `av` module inside manim.scene.scene_file_writer."""
+
+    def __init__(self, av, profile: dict):
+        self._av = av
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._av, name)
+
+    def open(self, *args, **kwargs):
+        container = self._av.open(*args, **kwargs)
+        return _Container(container, self._profile) if kwargs.get("mode") == "w" else container
+
+
+def install_profile(profile: dict) -> bool:
+    """Patches Manim's scene file writer; False if this Manim version cannot take a profile."""
+    from manim.scene import scene_file_writer
+
+    writer = scene_file_writer.SceneFileWriter
+    if not hasattr(writer, "open_partial_movie_stream") or not hasattr(scene_file_writer, "av"):
+        return False
+    scene_file_writer.av = _AV(scene_file_writer.av, profile)
+    original = writer.open_partial_movie_stream
+
+    def open_partial_movie_stream(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        stream = self.video_stream
+        if stream.codec_context.name == profile["codec"]:
+            stream.pix_fmt = profile["pix_fmt"]
+            if profile["threads"]:
+                stream.codec_context.thread_count = profile["threads"]
+
+    writer.open_partial_movie_stream = open_partial_movie_stream
+    return True
+
+
+def main() -> None:
+    spec = os.environ.get(ENCODER_ENV)
+    if spec:
+        profile = json.loads(spec)
+        if not install_profile(profile):
+            print(f"manim_launcher: this Manim version ignores encoder profiles; "
+                  f"using its defaults instead of {profile.get('name')}", file=sys.stderr)
+    from manim.__main__ import main as manim_main
+
+    sys.argv[0] = "manim"
+    manim_main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# app/core/metrics.py
+"""
+Prometheus metrics shared by the API and the Celery workers.
+
+When PROMETHEUS_MULTIPROC_DIR is set (required for prefork workers and
+multi-process uvicorn), values are written to per-process files and merged
+at scrape time.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+
+# Sub-millisecond to second range for in-process checks
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Seconds to tens of minutes for LLM calls, queueing and rendering
+SLOW_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800)
+# 1 MB to 16 GB for peak memory and output sizes
+BYTE_BUCKETS = tuple(2 ** power for power in range(20, 35))
+# LLM tokens per request
+TOKEN_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+PROMPT_VALIDATION_SECONDS = Histogram(
+    "manimate_prompt_validation_seconds",
+    "Time spent validating the user prompt",
+    buckets=FAST_BUCKETS,
+)
+GENERATION_SECONDS = Histogram(
+    "manimate_generation_seconds",
+    "LLM code generation time per provider attempt",
+    ["provider", "model", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+CANDIDATES_GENERATED = Counter(
+    "manimate_generation_candidates_total",
+    "Generated code candidates by outcome (accepted, rejected, error, or unused after another was accepted)",
+    ["provider", "outcome"],
+)
+GENERATION_TOKENS = Counter(
+    "manimate_generation_tokens_total",
+    "LLM tokens billed per provider, by candidate outcome",
+    ["provider", "outcome"],
+)
+ACCEPTED_GENERATION_SECONDS = Histogram(
+    "manimate_accepted_generation_seconds",
+    "Time from the first LLM call to an accepted scene, across providers and candidates",
+    ["candidates"],
+    buckets=SLOW_BUCKETS,
+)
+TOKENS_PER_ACCEPTED_SCENE = Histogram(
+    "manimate_tokens_per_accepted_scene",
+    "LLM tokens of the candidates checked for a request, up to and including its accepted scene",
+    ["candidates"],
+    buckets=TOKEN_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "manimate_prompt_tokens",
+    "Estimated input tokens of the generation prompt, by few-shot variant (dynamic or full)",
+    ["few_shot"],
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000),
+)
+PROMPT_CANDIDATES = Counter(
+    "manimate_prompt_candidates_total",
+    "Checked code candidates by few-shot variant and outcome (accepted or rejected), for each variant's pass rate",
+    ["few_shot", "outcome"],
+)
+CODE_VALIDATION_SECONDS = Histogram(
+    "manimate_code_validation_seconds",
+    "Time spent validating generated Manim code",
+    buckets=FAST_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "manimate_queue_wait_seconds",
+    "Time between a task being published and a worker starting it",
+    ["task"],
+    buckets=SLOW_BUCKETS,
+)
+JOB_STAGE_SECONDS = Histogram(
+    "manimate_job_stage_seconds",
+    "Time render jobs spent in each pipeline stage (queued, generating, validating, rendering, uploading)",
+    ["stage"],
+    buckets=SLOW_BUCKETS,
+)
+PREFLIGHT_SECONDS = Histogram(
+    "manimate_preflight_seconds",
+    "Dry-run pre-flight time",
+    ["outcome"],
+    buckets=SLOW_BUCKETS,
+)
+RENDER_SECONDS = Histogram(
+    "manimate_render_seconds",
+    "Manim subprocess wall time (includes Manim's own encoding)",
+    ["quality"],
+    buckets=SLOW_BUCKETS,
+)
+POSTPROCESS_SECONDS = Histogram(
+    "manimate_postprocess_seconds",
+    "Post-render processing time per step (faststart, poster, hls)",
+    ["quality", "step"],
+    buckets=SLOW_BUCKETS,
+)
+UPLOAD_SECONDS = Histogram(
+    "manimate_upload_seconds",
+    "Time spent uploading rendered artifacts",
+    buckets=SLOW_BUCKETS,
+)
+QUALITY_DOWNGRADES = Counter(
+    "manimate_quality_downgrades_total",
+    "Render requests served at a lower quality because of queue pressure",
+    ["requested", "served"],
+)
+VIDEO_BYTES_SERVED = Counter(
+    "manimate_video_bytes_served_total",
+    "Bytes sent by the local video endpoint",
+    ["transfer"],  # zerocopy or buffered
+)
+TEMPLATE_LOOKUPS = Counter(
+    "manimate_template_lookups_total",
+    "Prompts checked against the scene templates",
+    ["outcome"],  # hit or miss
+)
+TEMPLATE_MATCHES = Counter(
+    "manimate_template_matches_total",
+    "Prompts served from a scene template instead of the LLM",
+    ["template"],
+)
+PROMPT_INDEX_LOOKUPS = Counter(
+    "manimate_prompt_index_lookups_total",
+    "Prompts checked against the near-duplicate prompt index",
+    ["outcome"],  # hit or miss
+)
+RENDER_CACHE_HITS = Counter(
+    "manimate_render_cache_hits_total",
+    "Render requests answered from the render cache",
+    ["where"],  # api or worker
+)
+SECONDS_SAVED = Counter(
+    "manimate_seconds_saved_total",
+    "Estimated generation and render seconds avoided by templates, the prompt index and the render cache",
+    ["source"],  # template, prompt_index or render_cache
+)
+CANCELLATIONS = Counter(
+    "manimate_render_cancellations_total",
+    "Renders cancelled before they finished",
+    ["reason", "phase"],  # client or abandoned; queued or running
+)
+RECLAIMED_SECONDS = Counter(
+    "manimate_reclaimed_worker_seconds_total",
+    "Estimated render seconds workers did not spend on cancelled renders",
+    ["reason"],
+)
+WEBHOOK_DELIVERIES = Counter(
+    "manimate_webhook_deliveries_total",
+    "Completion webhook delivery attempts",
+    ["outcome"],  # delivered, retried or dead_lettered
+)
+# Per-render resource accounting (app.core.accounting); stage is preflight, render, postprocess or upload
+TASK_CPU_SECONDS = Histogram(
+    "manimate_task_cpu_seconds",
+    "User+system CPU seconds per render stage, subprocesses included",
+    ["quality", "style", "stage"],
+    buckets=SLOW_BUCKETS,
+)
+TASK_WRITTEN_BYTES = Counter(
+    "manimate_task_written_bytes_total",
+    "Bytes written to storage per render stage",
+    ["quality", "style", "stage"],
+)
+RENDER_PEAK_RSS_BYTES = Histogram(
+    "manimate_render_peak_rss_bytes",
+    "Peak resident memory of the Manim process tree",
+    ["quality", "style"],
+    buckets=BYTE_BUCKETS,
+)
+RENDER_OUTPUT_BYTES = Histogram(
+    "manimate_render_output_bytes",
+    "Size of the delivered video",
+    ["quality", "style"],
+    buckets=BYTE_BUCKETS,
+)
+RENDERED_FRAMES = Counter(
+    "manimate_rendered_frames_total",
+    "Frames in delivered videos",
+    ["quality", "style"],
+)
+FAILURES = Counter(
+    "manimate_failures_total",
+    "Failed requests and renders",
+    ["stage", "error_type"],
+)
+QUEUE_DEPTH = Gauge(
+    "manimate_queue_depth",
+    "Messages waiting in the broker queue",
+    ["queue"],
+    multiprocess_mode="livemax",
+)
+ACTIVE_RENDERS = Gauge(
+    "manimate_active_renders",
+    "Render tasks currently executing",
+    multiprocess_mode="livesum",
+)
+
+
+def _is_multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def _collect_registry():
+    if not _is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Exposition payload and content type for a /metrics response."""
+    return generate_latest(_collect_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int) -> None:
+    """Serves /metrics on a background thread (used by Celery workers)."""
+    start_http_server(port, registry=_collect_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drops a dead worker child's live gauges in multiprocess mode."""
+    if _is_multiprocess():
+        multiprocess.mark_process_dead(pid)
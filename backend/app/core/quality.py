@@ -0,0 +1,25 @@
+# app/core/quality.py
+"""Quality names accepted by the API and their Manim flags and output directories."""
+
+# Map descriptive quality names to Manim's single-letter flags.
+QUALITY_MAP = {
+    "minimal": "-ql",
+    "draft": "-ql",
+    "low": "-ql",
+    "polished": "-qm",
+    "medium": "-qm",
+    "3b1b-style": "-qh", # 3b1b-style implies high quality
+    "high": "-qh",
+    "production": "-qk" # For 4k if needed
+}
+
+# Also map to the correct output directory name
+QUALITY_DIR_MAP = {
+    "-ql": "480p15",
+    "-qm": "720p30",
+    "-qh": "1080p60",
+    "-qk": "2160p60"
+}
+
+# Manim flags from cheapest to most expensive
+FLAG_ORDER = ["-ql", "-qm", "-qh", "-qk"]
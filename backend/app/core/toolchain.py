@@ -0,0 +1,111 @@
+# app/core/toolchain.py
+"""
+One-time probe of the render toolchain on a worker.
+
+The result decides which render queues the worker consumes, is advertised in
+Redis for operators, and produces the manim.cfg written next to each scene.
+"""
+import importlib
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.config import FFMPEG_BINARY, LATEX_BIN_DIR
+
+PROBE_TIMEOUT = 10
+
+
+@dataclass
+class Toolchain:
+    latex: Optional[str] = None
+    dvisvgm: Optional[str] = None
+    ffmpeg: Optional[str] = None
+    ffmpeg_version: Optional[str] = None
+    libraries: Dict[str, Optional[str]] = field(default_factory=dict)  # module -> version, None if missing
+    cpu_count: int = 1
+    memory_bytes: Optional[int] = None
+    probed_at: float = 0.0
+
+    @property
+    def has_latex(self) -> bool:
+        # Manim compiles Tex with latex and converts the DVI to SVG with dvisvgm
+        return bool(self.latex and self.dvisvgm)
+
+    @property
+    def has_ffmpeg(self) -> bool:
+        return self.ffmpeg is not None
+
+    def capabilities(self) -> dict:
+        return {**asdict(self), "has_latex": self.has_latex, "has_ffmpeg": self.has_ffmpeg}
+
+    def manim_cfg(self) -> str:
+        lines = ["[CLI]"]
+        if self.latex:
+            lines.append(f"tex_executable = {self.latex.replace(os.sep, '/')}")
+        return "\n".join(lines) + "\n"
+
+
+def _search_path() -> Optional[str]:
+    if not LATEX_BIN_DIR:
+        return None
+    return os.pathsep.join([LATEX_BIN_DIR, os.environ.get("PATH", "")])
+
+
+def _which(name: str) -> Optional[str]:
+    return shutil.which(name, path=_search_path())
+
+
+def _ffmpeg_version(binary: str) -> Optional[str]:
+    try:
+        completed = subprocess.run([binary, "-version"], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    first_line = completed.stdout.splitlines()[0] if completed.stdout else ""
+    # "ffmpeg version 6.1.1-3ubuntu5 Copyright ..." -> "6.1.1-3ubuntu5"
+    parts = first_line.split()
+    return parts[2] if len(parts) > 2 and parts[1] == "version" else None
+
+
+def _library_version(module: str) -> Optional[str]:
+    try:
+        imported = importlib.import_module(module)
+    except Exception:
+        return None
+    version = getattr(imported, "__version__", None) or getattr(imported, "version", None)
+    return str(version) if version is not None else "unknown"
+
+
+def _memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def probe_toolchain() -> Toolchain:
+    ffmpeg = shutil.which(FFMPEG_BINARY)
+    return Toolchain(
+        latex=_which("latex"),
+        dvisvgm=_which("dvisvgm"),
+        ffmpeg=ffmpeg,
+        ffmpeg_version=_ffmpeg_version(ffmpeg) if ffmpeg else None,
+        # pycairo draws frames, manimpango lays out Text/MarkupText
+        libraries={module: _library_version(module) for module in ("cairo", "manimpango", "av")},
+        cpu_count=os.cpu_count() or 1,
+        memory_bytes=_memory_bytes(),
+        probed_at=time.time(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_toolchain() -> Toolchain:
+    """The probe result for this process, computed on first use."""
+    toolchain = probe_toolchain()
+    if LATEX_BIN_DIR and toolchain.latex:
+        # Manim finds latex/dvisvgm through PATH in its subprocesses
+        os.environ["PATH"] = os.pathsep.join([LATEX_BIN_DIR, os.environ.get("PATH", "")])
+    return toolchain
@@ -0,0 +1,332 @@
+# app/core/tracing.py
+"""
+Lightweight request tracing for the API -> Celery -> Manim -> storage path.
+
+Trace context follows the W3C `traceparent` format so it can cross the Celery
+broker in task headers and be understood by any OTLP-compatible collector.
+Finished spans are handed to a background batch processor and written by a
+pluggable exporter (JSON-lines file, OTLP/HTTP JSON, in-memory or none).
+"""
+import atexit
+import contextvars
+import json
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.config import (
+    TRACE_EXPORTER,
+    TRACE_FILE_PATH,
+    TRACE_OTLP_ENDPOINT,
+    TRACE_SAMPLE_RATIO,
+    TRACE_SERVICE_NAME,
+)
+from app.core.logging import logger
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+    _token: object = field(default=None, repr=False, compare=False)
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        """Span duration in seconds (0 while still open)."""
+        return max(self.end_ns - self.start_ns, 0) / 1e9
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_payload(spans: List[Span]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "manimate"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+# -------------------------------
+# Exporters
+# -------------------------------
+class SpanExporter:
+    """Base class: receives batches of finished, sampled spans."""
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NoopSpanExporter(SpanExporter):
+    def export(self, spans: List[Span]) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps spans in a list; used by benchmarks to compute per-stage latency."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends one OTLP/JSON `resourceSpans` document per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        line = json.dumps(_otlp_payload(spans))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """POSTs OTLP/JSON to a collector, e.g. http://localhost:4318/v1/traces."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(_otlp_payload(spans)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class BatchSpanProcessor:
+    """Buffers finished spans and exports them off the request path."""
+
+    def __init__(self, exporter: SpanExporter, max_queue_size: int = 2048,
+                 max_batch_size: int = 128, flush_interval: float = 1.0):
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue_size)
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # Dropping spans is preferable to blocking a request
+
+    def _drain(self) -> None:
+        while True:
+            batch = []
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.warning("Span export failed (%s spans dropped): %s", len(batch), e)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            self._drain()
+
+    def force_flush(self, timeout: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout
+        self._flush_requested.set()
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._drain()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._flush_requested.set()
+        self._thread.join(timeout=5.0)
+        self._drain()
+        self.exporter.shutdown()
+
+
+# -------------------------------
+# Configuration
+# -------------------------------
+_processor: Optional[BatchSpanProcessor] = None
+_sample_ratio: float = TRACE_SAMPLE_RATIO
+_config_lock = threading.Lock()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _exporter_from_config() -> SpanExporter:
+    if TRACE_EXPORTER == "file":
+        return FileSpanExporter(TRACE_FILE_PATH)
+    if TRACE_EXPORTER == "otlp":
+        return OTLPHttpSpanExporter(TRACE_OTLP_ENDPOINT)
+    return NoopSpanExporter()
+
+
+def configure_tracing(exporter: Optional[SpanExporter] = None, sample_ratio: Optional[float] = None) -> None:
+    """Replaces the active exporter and/or sampling ratio (defaults come from app.config)."""
+    global _processor, _sample_ratio
+    with _config_lock:
+        if _processor is not None:
+            _processor.shutdown()
+        _processor = BatchSpanProcessor(exporter or _exporter_from_config())
+        if sample_ratio is not None:
+            _sample_ratio = sample_ratio
+
+
+def _get_processor() -> BatchSpanProcessor:
+    # Created lazily so prefork worker children each start their own export thread.
+    if _processor is None:
+        configure_tracing()
+    return _processor
+
+
+def force_flush() -> None:
+    if _processor is not None:
+        _processor.force_flush()
+
+
+def shutdown_tracing() -> None:
+    global _processor
+    with _config_lock:
+        if _processor is not None:
+            _processor.shutdown()
+            _processor = None
+
+
+atexit.register(shutdown_tracing)
+
+
+# -------------------------------
+# Span API
+# -------------------------------
+def parse_traceparent(traceparent: Optional[str]):
+    """Returns (trace_id, parent_span_id, sampled) or None for a missing/invalid header."""
+    if not traceparent:
+        return None
+    parts = traceparent.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2], parts[3] == "01"
+
+
+def begin_span(name: str, parent: Optional[str] = None, **attributes) -> Span:
+    """
+    Opens a span and makes it current. `parent` is a remote traceparent; without
+    one the span nests under the current span or starts a new (sampled?) trace.
+    Pair with end_span(); prefer the start_span() context manager.
+    """
+    remote = parse_traceparent(parent)
+    local = _current_span.get()
+    if remote:
+        trace_id, parent_id, sampled = remote
+    elif local:
+        trace_id, parent_id, sampled = local.trace_id, local.span_id, local.sampled
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+        sampled = random.random() < _sample_ratio
+    span = Span(name, trace_id, secrets.token_hex(8), parent_id, sampled, attributes=attributes)
+    span._token = _current_span.set(span)
+    return span
+
+
+def end_span(span: Span, error: Optional[BaseException] = None) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    try:
+        _current_span.reset(span._token)
+    except ValueError:
+        _current_span.set(None)  # Ended from a different context (e.g. Celery signals)
+    if span.sampled:
+        _get_processor().on_end(span)
+
+
+@contextmanager
+def start_span(name: str, parent: Optional[str] = None, **attributes):
+    span = begin_span(name, parent, **attributes)
+    try:
+        yield span
+    except BaseException as e:
+        end_span(span, e)
+        raise
+    end_span(span)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def inject(headers: dict) -> None:
+    """Adds the current traceparent to outgoing headers (HTTP or Celery)."""
+    span = _current_span.get()
+    if span is not None:
+        headers.setdefault("traceparent", span.traceparent)
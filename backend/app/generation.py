@@ -0,0 +1,181 @@
+# app/generation.py
+"""
+The generation stage of a render job (see app.services.jobs).
+
+POST /api/render queues generate_scene on GENERATION_QUEUE under the job id and
+answers at once. The task produces the Manim code (a scene template, an earlier
+near-identical prompt's code, or the LLM), validates it, and reuses an
+identical finished render when there is one. Otherwise it publishes the render
+task, or the chord of per-scene renders, under the same id and ends without a
+result of its own, as Task.replace does. Clients keep polling one id from
+queued to done. Generation and validation failures are the job's result.
+
+Only workers serving the generation stage load this module (and with it the
+LLM provider SDKs); render workers never do.
+"""
+import time
+from typing import Dict, Optional
+
+from celery import chord
+from celery.exceptions import Ignore
+
+from app.celery_app import celery, BASIC_QUEUE, COLLECT_SCENES_TASK, LATEX_QUEUE, RENDER_TASK, UPGRADE_TASK
+from app.config import MAX_SCENES_PER_REQUEST, QUALITY_UPGRADE_DELAY, QUALITY_UPGRADE_ENABLED, TEMPLATES_ENABLED, TOOLCHAIN_ROUTING_ENABLED
+from app.core import metrics, tracing
+from app.core.logging import logger
+from app.core.quality import QUALITY_MAP
+from app.services import cancellation, jobs, prompt_index
+from app.services.llm import generate_manim_code
+from app.services.quality_policy import choose_quality
+from app.services.render_cache import get_cached_render, render_key
+from app.services.render_stats import estimate_render_seconds
+from app.services.templates import estimated_generation_seconds, match_template, record_generation_seconds
+from app.services.validator import validate_manim_code
+from app.utils.helpers import find_scene_classes, needs_latex
+
+
+@celery.task(bind=True)
+def generate_scene(self, prompt: str, quality: str, style: str, preferred_provider: str,
+                   api_keys: Optional[Dict[str, Optional[str]]] = None):
+    """Generates and validates the job's code, then hands the job over to the render stage."""
+    job_id = self.request.id
+    reason = cancellation.cancel_reason(job_id)
+    if reason:
+        return cancellation.cancelled_result(reason)
+    jobs.advance(job_id, jobs.GENERATING)
+
+    # --- Generate Manim code: a scene template or an earlier near-identical prompt's code
+    # when one fits, else the Intelligent Engine ---
+    template_match, similar = None, None
+    if TEMPLATES_ENABLED:
+        with tracing.start_span("match_template") as span:
+            template_match = match_template(prompt)
+            span.set_attribute("template", template_match.template.name if template_match else "none")
+        metrics.TEMPLATE_LOOKUPS.labels("hit" if template_match else "miss").inc()
+
+    if template_match:
+        metrics.TEMPLATE_MATCHES.labels(template_match.template.name).inc()
+        metrics.SECONDS_SAVED.labels("template").inc(estimated_generation_seconds())
+        result = {"success": True, "code": template_match.code, "provider_used": "template"}
+    else:
+        with tracing.start_span("prompt_index") as span:
+            similar = prompt_index.find_similar(prompt, style)
+            span.set_attribute("hit", similar is not None)
+        metrics.PROMPT_INDEX_LOOKUPS.labels("hit" if similar else "miss").inc()
+
+    if similar:
+        metrics.SECONDS_SAVED.labels("prompt_index").inc(estimated_generation_seconds())
+        logger.info("Reusing code from a similar earlier prompt (similarity %.2f)", similar.score)
+        result = {"success": True, "code": similar.code, "provider_used": "prompt_index"}
+    elif not template_match:
+        with tracing.start_span("generate_code", preferred_provider=preferred_provider) as span:
+            started = time.perf_counter()
+            result = generate_manim_code(
+                prompt=prompt,
+                quality=quality,
+                style=style,
+                preferred_provider=preferred_provider,
+                api_keys=api_keys or {},
+            )
+            span.set_attribute("provider", result.get("provider_used", "none"))
+        if result["success"]:
+            record_generation_seconds(time.perf_counter() - started)
+
+    if not result["success"]:
+        logger.error("Code generation failed: %s", result["validation_result"])
+        return {"status": "FAILURE", "stage": "generation", "error_type": "all_providers_failed",
+                "message": result["validation_result"], "logs": ""}
+
+    # --- Validate generated code before rendering ---
+    jobs.advance(job_id, jobs.VALIDATING)
+    manim_code = result["code"]
+    scene_names = find_scene_classes(manim_code) or ["DefaultScene"]
+    if len(scene_names) > MAX_SCENES_PER_REQUEST:
+        logger.warning("Generated code has %d scenes; rendering the first %d", len(scene_names), MAX_SCENES_PER_REQUEST)
+        scene_names = scene_names[:MAX_SCENES_PER_REQUEST]
+    scene_name = scene_names[0]
+    logger.info("Code generated successfully using provider: %s (scenes=%s)", result["provider_used"], scene_names)
+    jobs.annotate(job_id, provider_used=result["provider_used"], scene_names=scene_names,
+                  template=template_match.template.name if template_match else None)
+
+    with tracing.start_span("validate_code"), metrics.CODE_VALIDATION_SECONDS.time():
+        code_is_valid = validate_manim_code(manim_code)
+    if not code_is_valid:
+        logger.error("Invalid Manim code generated for prompt: %s", prompt)
+        return {"status": "FAILURE", "stage": "code_validation", "error_type": "invalid_code",
+                "message": "Code validation failed. The AI model may have returned invalid code.", "logs": ""}
+    logger.debug("Generated Manim code validated successfully")
+
+    # The LLM call may have taken a while: a job cancelled meanwhile ends here
+    reason = cancellation.cancel_reason(job_id)
+    if reason:
+        return cancellation.cancelled_result(reason)
+
+    # --- Reuse an identical finished render (nothing to queue) ---
+    if len(scene_names) == 1:
+        with tracing.start_span("render_cache") as span:
+            cached = get_cached_render(render_key(manim_code, scene_name, quality))
+            span.set_attribute("hit", cached is not None)
+        if cached:
+            metrics.RENDER_CACHE_HITS.labels("api").inc()
+            metrics.SECONDS_SAVED.labels("render_cache").inc(estimate_render_seconds(QUALITY_MAP.get(quality, "-ql")))
+            if not template_match:
+                prompt_index.publish(prompt, style, manim_code)
+            logger.info("Render cache hit for scene %s (job %s)", scene_name, job_id)
+            return {**cached, "cached": True, "logs": ""}
+
+    # --- Pick the worker pool and the render quality for the current load ---
+    uses_latex = needs_latex(manim_code)
+    queue = (LATEX_QUEUE if uses_latex else BASIC_QUEUE) if TOOLCHAIN_ROUTING_ENABLED else None
+    decision = choose_quality(quality)
+    link, upgrade_task_id = None, None
+    if decision.degraded:
+        metrics.QUALITY_DOWNGRADES.labels(decision.requested, decision.quality).inc()
+        logger.info("Queue under pressure (level %d): rendering %s at %s instead of %s",
+                    decision.pressure_level, scene_name, decision.quality, decision.requested)
+        if QUALITY_UPGRADE_ENABLED and len(scene_names) == 1:
+            # Runs after the degraded render and waits for load to subside
+            link = celery.signature(UPGRADE_TASK, args=[manim_code, scene_name, decision.requested],
+                                    countdown=QUALITY_UPGRADE_DELAY, queue=queue)
+            upgrade_task_id = link.freeze().id
+    jobs.annotate(job_id, quality=decision.quality,
+                  **({"requested_quality": decision.requested, "upgrade_task_id": upgrade_task_id}
+                     if decision.degraded else {}))
+
+    # --- Hand the job to the render stage, under the same id ---
+    render_kwargs = {"requested_quality": decision.requested} if decision.degraded else None
+    # Carried over from the API: the client's admission slot and the style label of the resource metrics
+    client_id = getattr(self.request, "client_id", None)
+    render_style = getattr(self.request, "style", None) or "other"
+    headers = {"client_id": client_id, "style": render_style} if client_id else {"style": render_style}
+    if not template_match:
+        # Indexed for reworded repeats once the render succeeds
+        prompt_index.record_pending(job_id, prompt, style, manim_code)
+    with tracing.start_span("enqueue_render", scene=scene_name, quality=decision.quality,
+                            scenes=len(scene_names), queue=queue or "default"):
+        # The traceparent of this span is copied into the Celery task headers
+        if len(scene_names) == 1:
+            celery.send_task(
+                RENDER_TASK,
+                args=[manim_code, scene_name, decision.quality],
+                kwargs=render_kwargs,
+                link=link,
+                task_id=job_id,
+                headers=headers,
+                queue=queue,
+            )
+        else:
+            # One subtask per scene, rendered in parallel; the callback's id is the job's, and each
+            # subtask carries it as render_id
+            renders = [
+                celery.signature(RENDER_TASK, args=[manim_code, name, decision.quality], kwargs=render_kwargs,
+                                 queue=queue, headers={"render_id": job_id, "style": render_style})
+                for name in scene_names
+            ]
+            # Stitching needs ffmpeg, not LaTeX
+            collect = celery.signature(COLLECT_SCENES_TASK, args=[scene_names], task_id=job_id, headers=headers,
+                                       queue=BASIC_QUEUE if TOOLCHAIN_ROUTING_ENABLED else None)
+            chord(renders)(collect)
+    logger.info("Queued render task for scenes: %s (job %s, queue=%s)", scene_names, job_id, queue)
+    # No result of our own: the render now owns the job id (and would be overwritten by one)
+    raise Ignore()
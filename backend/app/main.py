@@ -1,7 +1,10 @@
 # app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import render
+from app.core import metrics, tracing
+from app.core.logging import log_context
+from app.routes import render, videos
+from app.services.queue_stats import get_queue_depths
 
 app = FastAPI(
     title="ManiMate API",
@@ -18,13 +21,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request tracing: continue an incoming traceparent or start a new trace.
+# Plain ASGI (not @app.middleware) so streaming and zero-copy file responses
+# pass through untouched.
+class TraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+        method, path = scope["method"], scope["path"]
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent")
+        with tracing.start_span(
+            f"{method} {path}",
+            parent=traceparent.decode("latin-1") if traceparent else None,
+            **{"http.method": method, "http.target": path},
+        ) as span, log_context(request_id=span.trace_id):
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+app.add_middleware(TraceMiddleware)
+
 # Include API routes
 app.include_router(render.router, prefix="/api")
+app.include_router(videos.router, prefix="/api")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the ManiMate API"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Queue depth is sampled at scrape time so the request path pays nothing for it
+    for queue, depth in get_queue_depths().items():
+        metrics.QUEUE_DEPTH.labels(queue).set(depth)
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
 # You can add more routes here, for example, to check the status of a rendering task
 # @app.get("/status/{task_id}")
 # def get_status(task_id: str):
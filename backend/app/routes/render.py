@@ -1,15 +1,22 @@
 # app/routes/render.py
 
-from fastapi import APIRouter, HTTPException, Header
-from pydantic import BaseModel
-from typing import Optional, Dict
-from celery.result import AsyncResult
+import uuid
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response
+from celery import states
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Dict, List, get_args
 
 from app.core.logging import logger
-from app.services.llm import generate_manim_code, ProviderType
-from app.services.validator import validate_prompt, validate_manim_code
-from app.utils.helpers import extract_scene_name
-from app.tasks import render_manim_scene, celery
+from app.core import metrics, tracing
+from app.services.llm import ProviderType, StyleType
+from app.services.validator import validate_prompt
+from app.celery_app import celery, GENERATE_TASK
+from app.config import STATUS_MAX_WAIT, STATUS_BULK_MAX_IDS, ADMISSION_ENABLED, GENERATION_QUEUE
+from app.services.admission import admit, client_id_for, release
+from app.services import jobs, webhooks
+from app.services.cancellation import REASON_CLIENT, cancelled_result, request_cancel, touch
+from app.services.status import format_status, get_statuses, compute_etag, is_known, is_terminal
 
 router = APIRouter()
 
@@ -21,26 +28,46 @@ class RenderRequest(BaseModel):
     quality: str = "polished"
     style: str = "educational"
     preferred_provider: ProviderType = "auto"
+    # Optional: POSTed the final status once the render finishes, signed with the secret (see app.services.webhooks)
+    callback_url: Optional[str] = None
+    callback_secret: Optional[str] = None
     # Note: API keys are now passed in headers, not the body.
 
 
+class StatusBulkRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_length=1, max_length=STATUS_BULK_MAX_IDS)
+    # Long-poll: return as soon as any task changes, or after `wait` seconds
+    wait: float = Field(0, ge=0, le=STATUS_MAX_WAIT)
+    # ETags the client already holds, per task id (from a previous response)
+    etags: Dict[str, str] = {}
+
+
 # -------------------------------
 # Render Endpoint
 # -------------------------------
-@router.post("/render")
-async def render(
+# A plain def: FastAPI runs it in the threadpool, as admission, job and webhook
+# bookkeeping, the callback's DNS lookup and send_task all block on the network.
+@router.post("/render", status_code=202)
+def render(
     request: RenderRequest,
+    http_request: Request,
     # --- BYOK: Accept keys securely via headers ---
     openai_api_key: Optional[str] = Header(None),
     gemini_api_key: Optional[str] = Header(None),
     deepseek_api_key: Optional[str] = Header(None)
 ):
     # --- Step 1: Validate the prompt ---
-    is_valid, message = validate_prompt(request.prompt)
+    with tracing.start_span("validate_prompt"), metrics.PROMPT_VALIDATION_SECONDS.time():
+        is_valid, message = validate_prompt(request.prompt)
     if not is_valid:
+        metrics.FAILURES.labels("prompt_validation", "invalid_prompt").inc()
         logger.warning("Rejected render request: %s", message)
         raise HTTPException(status_code=400, detail=message)
-    logger.info("Prompt validated successfully for: %s", request.prompt)
+    logger.debug("Prompt validated successfully (%d chars)", len(request.prompt))
+    if request.callback_url:
+        callback_error = webhooks.callback_url_error(request.callback_url)
+        if callback_error:
+            raise HTTPException(status_code=400, detail=callback_error)
 
     # --- Step 2: Collect user-supplied API keys ---
     user_api_keys: Dict[str, Optional[str]] = {
@@ -49,60 +76,135 @@ async def render(
         "deepseek": deepseek_api_key,
     }
 
-    # --- Step 3: Generate Manim code using the Intelligent Engine ---
-    result = generate_manim_code(
-        prompt=request.prompt,
-        quality=request.quality,
-        style=request.style,
-        preferred_provider=request.preferred_provider,
-        api_keys=user_api_keys,
+    # --- Step 3: Admission control, before any LLM spend ---
+    task_id = str(uuid.uuid4())
+    client_id = client_id_for(
+        openai_api_key or gemini_api_key or deepseek_api_key,
+        http_request.client.host if http_request.client else None,
     )
-
-    if not result["success"]:
-        logger.error("Code generation failed: %s", result["validation_result"])
-        raise HTTPException(status_code=500, detail=result["validation_result"])
-
-    manim_code = result["code"]
-    scene_name = extract_scene_name(manim_code)
-    logger.info("Code generated successfully using provider: %s (scene=%s)", result["provider_used"], scene_name)
-
-    # --- Step 4: Validate generated code before queuing ---
-    if not validate_manim_code(manim_code):
-        logger.error("Invalid Manim code generated for prompt: %s", request.prompt)
-        raise HTTPException(status_code=400, detail="Code validation failed. The AI model may have returned invalid code.")
-    logger.info("Generated Manim code validated successfully")
-
-    # --- Step 5: Queue the render task (non-blocking) ---
-    task = render_manim_scene.delay(manim_code, scene_name, request.quality)
-    logger.info("Queued render task for scene: %s (task_id=%s)", scene_name, task.id)
+    with tracing.start_span("admission") as span:
+        admission = admit(client_id, task_id, request.quality)
+        span.set_attribute("admitted", admission.admitted)
+    if not admission.admitted:
+        metrics.FAILURES.labels("admission", admission.reason).inc()
+        logger.warning("Refused render request from %s (%s); retry after %ss",
+                       client_id, admission.reason, admission.retry_after)
+        raise HTTPException(status_code=admission.status_code, detail=admission.message,
+                            headers={"Retry-After": str(admission.retry_after)})
+
+    try:
+        # --- Step 4: Queue the job; generation, validation and rendering run as worker stages ---
+        # The worker frees the client's in-flight slot when the job ends; the style labels its resource metrics
+        style = request.style if request.style in get_args(StyleType) else "other"
+        headers = {"client_id": client_id, "style": style} if ADMISSION_ENABLED else {"style": style}
+        jobs.create(task_id)
+        # Starts the abandonment clock (when enabled) before a worker can pick the job up
+        touch([task_id])
+        if request.callback_url:
+            # Claimed by whichever sees the job finish first: the worker, or a cancel
+            webhooks.register(task_id, request.callback_url, request.callback_secret)
+        with tracing.start_span("enqueue_generation", queue=GENERATION_QUEUE) as span:
+            # The traceparent of this span is copied into the Celery task headers.
+            # The keys travel in the message: the generation stage calls the providers with them.
+            celery.send_task(
+                GENERATE_TASK,
+                args=[request.prompt, request.quality, request.style, request.preferred_provider],
+                kwargs={"api_keys": {name: key for name, key in user_api_keys.items() if key}},
+                task_id=task_id,
+                headers=headers,
+                queue=GENERATION_QUEUE,
+            )
+        logger.info("Queued render job %s", task_id)
+    except BaseException:
+        # Nothing was queued, so the reserved slot would otherwise leak until it expires
+        release(client_id, task_id)
+        raise
 
     return {
-        "message": "Rendering started",
-        "scene_name": scene_name,
-        "task_id": task.id,
-        "provider_used": result["provider_used"],
+        "message": "Render job queued",
+        "job_id": task_id,
+        "task_id": task_id,
+        "status": "IN_PROGRESS",
+        "stage": jobs.QUEUED,
+        "status_url": f"/api/status/{task_id}",
+        "trace_id": span.trace_id,
     }
 
 
 # -------------------------------
-# Status Endpoint
+# Cancellation Endpoint
 # -------------------------------
+@router.delete("/render/{task_id}", status_code=202)
+async def cancel_render(task_id: str):
+    """
+    Revokes a queued render and signals a running one; its worker kills the
+    Manim process group within CANCEL_POLL_INTERVAL seconds. Pollers see the
+    cancellation at once. Ids that are neither jobs nor known to the result
+    backend get a 404; finished ones a 409.
+    """
+    # Unknown ids would otherwise look in progress, and the cancellation would store a result for them
+    if not await run_in_threadpool(is_known, task_id):
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found.")
+    payload = (await get_statuses([task_id]))[task_id]
+    if is_terminal(payload):
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already finished with status {payload['status']}.")
+    with tracing.start_span("cancel_render", task_id=task_id):
+        await run_in_threadpool(_cancel, task_id)
+    logger.info("Cancelled render task %s", task_id)
+    return {"task_id": task_id, "status": "CANCELLED", "message": "The render was cancelled."}
+
+
+def _cancel(task_id: str) -> None:
+    """The Redis and broker calls of a cancellation, which block (run in the threadpool)."""
+    request_cancel(task_id)
+    # Workers drop revoked messages they hold or receive; scenes of a multi-scene render see the flag
+    celery.control.revoke(task_id)
+    # Structured like a worker's result (a returned dict); the worker may later record REVOKED itself
+    celery.backend.store_result(task_id, cancelled_result(REASON_CLIENT), states.SUCCESS)
+    jobs.advance(task_id, jobs.DONE)
+    webhooks.schedule(task_id, format_status(task_id, {"status": states.SUCCESS,
+                                                       "result": cancelled_result(REASON_CLIENT)}))
+
+
+# -------------------------------
+# Status Endpoints
+# -------------------------------
+def _cache_headers(etag: str, terminal: bool) -> Dict[str, str]:
+    # Finished results never change; in-progress ones must be revalidated
+    cache_control = "private, max-age=31536000, immutable" if terminal else "no-cache"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
 @router.get("/status/{task_id}")
-async def check_status(task_id: str):
-    task_result = AsyncResult(task_id, app=celery)
-
-    if task_result.ready():
-        result = task_result.result
-        if result.get("status") == "success":
-            logger.info("Task %s finished successfully (url=%s)", task_id, result.get("url"))
-            return {"status": "SUCCESS", "url": result.get("url")}
-        else:
-            logger.error("Task %s failed: %s", task_id, result.get("message"))
-            return {
-                "status": "FAILURE",
-                "error": result.get("message"),
-                "logs": result.get("logs"),
-            }
-    else:
-        logger.info("Task %s still in progress", task_id)
-        return {"status": "IN_PROGRESS"}
+async def check_status(
+    task_id: str,
+    response: Response,
+    wait: float = Query(0, ge=0, le=STATUS_MAX_WAIT),
+    if_none_match: Optional[str] = Header(None),
+):
+    known = {task_id: if_none_match} if if_none_match else None
+    payload = (await get_statuses([task_id], wait, known))[task_id]
+    headers = _cache_headers(compute_etag(payload), is_terminal(payload))
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return payload
+
+
+@router.post("/status")
+async def check_status_bulk(
+    request: StatusBulkRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
+    task_ids = list(dict.fromkeys(request.task_ids))
+    payloads = await get_statuses(task_ids, request.wait, request.etags)
+    body = {
+        "statuses": payloads,
+        "etags": {task_id: compute_etag(payload) for task_id, payload in payloads.items()},
+    }
+    headers = _cache_headers(compute_etag(body["etags"]), all(is_terminal(p) for p in payloads.values()))
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return body
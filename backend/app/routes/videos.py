@@ -0,0 +1,193 @@
+# app/routes/videos.py
+"""
+Serves videos from local storage (STORAGE_BACKEND=local).
+
+- Single byte ranges (206), unsatisfiable ranges (416) and If-Range
+- Conditional requests on a strong, content-hash ETag (304 / 412)
+- Zero-copy transfer through the ASGI `http.response.zerocopysend`
+  extension when the server offers it, or offload to nginx with
+  X-Accel-Redirect. Otherwise the file is read in chunks with os.pread.
+- A semaphore caps open file handles; requests wait briefly for a slot and
+  then get 503 with Retry-After.
+"""
+import asyncio
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from anyio import to_thread
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.types import Receive, Scope, Send
+
+from app.config import VIDEO_ACCEL_REDIRECT_PREFIX, VIDEO_MAX_OPEN_FILES, VIDEO_OPEN_TIMEOUT
+from app.core import metrics
+from app.core.logging import logger
+from app.storage.local import StoredFile, stat_key
+
+router = APIRouter()
+
+READ_CHUNK_SIZE = 256 * 1024
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+_open_slots = asyncio.Semaphore(VIDEO_MAX_OPEN_FILES)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+# -------------------------------
+# Header helpers
+# -------------------------------
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single "bytes=" range, or None to send the
+    whole file. Multiple ranges are ignored, which RFC 9110 permits.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_list(header: str):
+    return [tag.strip() for tag in header.split(",")]
+
+
+def _matches_weak(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/ prefixes are ignored
+    candidates = [tag[2:] if tag.startswith("W/") else tag for tag in _etag_list(header)]
+    return "*" in candidates or etag in candidates
+
+
+def _matches_strong(header: str, etag: str) -> bool:
+    candidates = _etag_list(header)
+    return "*" in candidates or etag in candidates
+
+
+def _not_modified_since(header: Optional[str], mtime: float) -> bool:
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+# -------------------------------
+# Response
+# -------------------------------
+class FileRangeResponse(Response):
+    """Sends `count` bytes of a file starting at `offset`, then releases its handle slot."""
+
+    def __init__(self, stored: StoredFile, offset: int, count: int, status_code: int,
+                 headers: dict, send_body: bool):
+        super().__init__(status_code=status_code, headers=headers, media_type=stored.content_type)
+        self.stored = stored
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self.send_body or self.count == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            with open(self.stored.path, "rb") as f:
+                if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                    await send({"type": ZEROCOPY_EXTENSION, "file": f, "offset": self.offset,
+                                "count": self.count, "more_body": False})
+                    metrics.VIDEO_BYTES_SERVED.labels("zerocopy").inc(self.count)
+                else:
+                    await self._send_chunks(f.fileno(), send)
+        finally:
+            _open_slots.release()
+
+    async def _send_chunks(self, fd: int, send: Send) -> None:
+        position, remaining = self.offset, self.count
+        while remaining > 0:
+            chunk = await to_thread.run_sync(os.pread, fd, min(READ_CHUNK_SIZE, remaining), position)
+            if not chunk:  # File truncated underneath us
+                break
+            position += len(chunk)
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            metrics.VIDEO_BYTES_SERVED.labels("buffered").inc(len(chunk))
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+# -------------------------------
+# Video Endpoint
+# -------------------------------
+@router.api_route("/videos/{key:path}", methods=["GET", "HEAD"])
+async def serve_video(key: str, request: Request):
+    stored = await to_thread.run_sync(stat_key, key)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    headers = {
+        "ETag": stored.etag,
+        "Last-Modified": formatdate(stored.mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        # Keys can be re-rendered under the same name, so clients revalidate (cheap 304s)
+        "Cache-Control": "public, no-cache",
+    }
+
+    if_match = request.headers.get("if-match")
+    if if_match and not _matches_strong(if_match, stored.etag):
+        return Response(status_code=412, headers=headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if _matches_weak(if_none_match, stored.etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since"), stored.mtime):
+        return Response(status_code=304, headers=headers)
+
+    if VIDEO_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the bytes (with sendfile and its own range handling)
+        headers["X-Accel-Redirect"] = f"{VIDEO_ACCEL_REDIRECT_PREFIX}/{key}"
+        return Response(headers=headers, media_type=stored.content_type)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != stored.etag:
+        range_header = None  # The client's copy is stale: send the whole file
+    try:
+        byte_range = parse_range(range_header, stored.size)
+    except RangeNotSatisfiable:
+        headers["Content-Range"] = f"bytes */{stored.size}"
+        return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        status_code, offset, count = 200, 0, stored.size
+    else:
+        start, end = byte_range
+        status_code, offset, count = 206, start, end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{stored.size}"
+    headers["Content-Length"] = str(count)
+
+    try:
+        await asyncio.wait_for(_open_slots.acquire(), VIDEO_OPEN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("All %d video file handles busy; rejecting %s", VIDEO_MAX_OPEN_FILES, key)
+        raise HTTPException(status_code=503, detail="Too many concurrent downloads",
+                            headers={"Retry-After": "1"})
+    return FileRangeResponse(stored, offset, count, status_code, headers,
+                             send_body=request.method != "HEAD")
@@ -0,0 +1,152 @@
+# app/services/admission.py
+"""
+Admission control for new render requests, checked before any LLM call.
+
+A request is refused when:
+- the broker queue is deeper than ADMISSION_MAX_QUEUE_DEPTH (503),
+- the estimated backlog (queued renders x EWMA render time / worker slots)
+  exceeds ADMISSION_MAX_BACKLOG_SECONDS (503), or
+- the client already has its share of renders in flight (429).
+
+A client is identified by a hash of its API key, or by IP address when it
+sends no key. Its in-flight renders live in a Redis sorted set of task ids,
+scored by expiry. Admitting and releasing are Lua scripts, so concurrent
+API processes cannot overshoot a limit. The per-client limit is the smaller
+of ADMISSION_MAX_INFLIGHT_PER_CLIENT and an equal split of
+ADMISSION_MAX_QUEUE_DEPTH across the active clients.
+"""
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import redis
+from app.config import (
+    ADMISSION_ENABLED,
+    ADMISSION_INFLIGHT_TTL,
+    ADMISSION_MAX_BACKLOG_SECONDS,
+    ADMISSION_MAX_INFLIGHT_PER_CLIENT,
+    ADMISSION_MAX_QUEUE_DEPTH,
+    ADMISSION_MAX_RETRY_AFTER,
+    REDIS_URL,
+    RENDER_WORKER_SLOTS,
+)
+from app.core.logging import logger
+from app.core.quality import QUALITY_MAP
+from app.services.quality_policy import current_load
+from app.services.render_stats import estimate_render_seconds
+
+INFLIGHT_KEY_PREFIX = "manimate:inflight:"
+ACTIVE_CLIENTS_KEY = "manimate:inflight_clients"
+
+# KEYS: client set, active clients. ARGV: now, expiry, max per client, capacity, task id, client id
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local inflight = redis.call('ZCARD', KEYS[1])
+local clients = redis.call('ZCARD', KEYS[2])
+if inflight == 0 then clients = clients + 1 end
+local limit = tonumber(ARGV[3])
+local capacity = tonumber(ARGV[4])
+if capacity > 0 then
+    limit = math.min(limit, math.max(1, math.floor(capacity / clients)))
+end
+if inflight >= limit then
+    return {0, inflight, limit}
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[5])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2]) - now))
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[6])
+return {1, inflight + 1, limit}
+"""
+
+# KEYS: client set, active clients. ARGV: task id, client id
+RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+_redis_client = None
+_admit = None
+_release = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client, _admit, _release
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+        _admit = _redis_client.register_script(ADMIT_SCRIPT)
+        _release = _redis_client.register_script(RELEASE_SCRIPT)
+    return _redis_client
+
+
+@dataclass
+class AdmissionDecision:
+    admitted: bool
+    status_code: int = 200  # 429 or 503 when refused
+    reason: str = ""
+    retry_after: int = 0
+    message: str = ""
+
+
+def client_id_for(api_key: Optional[str], remote_addr: Optional[str]) -> str:
+    """Stable, non-reversible identity for fair sharing."""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"ip:{remote_addr or 'unknown'}"
+
+
+def _retry_after(seconds: float) -> int:
+    return int(min(max(math.ceil(seconds), 1), ADMISSION_MAX_RETRY_AFTER))
+
+
+def admit(client_id: str, task_id: str, quality: str) -> AdmissionDecision:
+    """Reserves an in-flight slot for `task_id` or explains why not. Fails open on Redis errors."""
+    if not ADMISSION_ENABLED:
+        return AdmissionDecision(True)
+
+    per_render = estimate_render_seconds(QUALITY_MAP.get(quality, "-ql"))
+    load = current_load()
+    if load.queue_depth >= 0:
+        slots = max(RENDER_WORKER_SLOTS, 1)
+        backlog = load.queue_depth * per_render / slots
+        if load.queue_depth >= ADMISSION_MAX_QUEUE_DEPTH:
+            excess = load.queue_depth - ADMISSION_MAX_QUEUE_DEPTH + 1
+            return AdmissionDecision(False, 503, "queue_full", _retry_after(excess * per_render / slots),
+                                     "The render queue is full. Please retry later.")
+        if backlog > ADMISSION_MAX_BACKLOG_SECONDS:
+            return AdmissionDecision(False, 503, "backlog", _retry_after(backlog - ADMISSION_MAX_BACKLOG_SECONDS),
+                                     f"Renders are currently backed up by about {int(backlog)}s. Please retry later.")
+
+    now = time.time()
+    try:
+        _get_client()
+        admitted, inflight, limit = _admit(
+            keys=[INFLIGHT_KEY_PREFIX + client_id, ACTIVE_CLIENTS_KEY],
+            args=[now, now + ADMISSION_INFLIGHT_TTL, ADMISSION_MAX_INFLIGHT_PER_CLIENT,
+                  ADMISSION_MAX_QUEUE_DEPTH, task_id, client_id],
+        )
+    except redis.RedisError as e:
+        logger.warning("Admission check unavailable, admitting request: %s", e)
+        return AdmissionDecision(True)
+    if not admitted:
+        # A slot frees up when one of this client's renders finishes
+        return AdmissionDecision(False, 429, "client_limit", _retry_after(per_render),
+                                 f"Too many renders in progress ({inflight}/{limit}). Wait for one to finish.")
+    return AdmissionDecision(True)
+
+
+def release(client_id: Optional[str], task_id: str) -> None:
+    """Frees a slot once its render finished or the request was abandoned before queuing."""
+    if not client_id:
+        return
+    try:
+        _get_client()
+        _release(keys=[INFLIGHT_KEY_PREFIX + client_id, ACTIVE_CLIENTS_KEY], args=[task_id, client_id])
+    except redis.RedisError as e:
+        logger.warning("Could not release in-flight slot for %s: %s", client_id, e)
@@ -0,0 +1,189 @@
+# app/services/autoscale.py
+"""
+Cost-aware sizing of a render worker's process pool.
+
+Celery's stock autoscaler adds a process for every reserved message, up to the
+--autoscale maximum, whatever the message costs. One process per core is fine
+for -ql renders, but 4K renders need several GB each and encode with more than
+one thread, so a full pool of them runs out of memory.
+
+CostAwareAutoscaler runs as many processes as the reserved renders fit into the
+worker's CPU and memory budget. Each render is costed by a static table per
+Manim quality flag. While the broker has a backlog and there is headroom for a
+light render, the pool grows one process per tick, and the prefetch count
+follows the pool size, so a worker never hoards renders a sibling could start.
+It shrinks back (after Celery's keepalive) when the backlog drains.
+
+With WORKER_COST_CALIBRATION, the static table is overridden by the cores and
+peak RSS measured on finished renders (app/services/render_stats.py), refreshed
+every minute.
+
+Enable it by starting the worker with --autoscale=MAX,MIN.
+"""
+from dataclasses import dataclass
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+
+from app.config import (
+    WORKER_COST_AUTOSCALE,
+    WORKER_COST_CALIBRATION,
+    WORKER_CPU_BUDGET,
+    WORKER_MEMORY_FRACTION,
+    WORKER_PREFETCH_MULTIPLIER,
+)
+from app.core.logging import logger
+from app.core.quality import QUALITY_MAP
+
+MB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class JobCost:
+    cpu: float  # cores busy for the duration of the job
+    memory: int  # peak resident bytes
+
+
+# Rough peak usage of one Manim render plus its ffmpeg encode, per quality flag.
+# Frames are rendered single-threaded; encoding and post-processing add threads at higher resolutions.
+RENDER_COSTS = {
+    "-ql": JobCost(cpu=1.0, memory=600 * MB),
+    "-qm": JobCost(cpu=1.0, memory=900 * MB),
+    "-qh": JobCost(cpu=1.5, memory=1600 * MB),
+    "-qk": JobCost(cpu=2.0, memory=3500 * MB),
+}
+STITCH_COST = JobCost(cpu=0.25, memory=200 * MB)  # ffmpeg concat with stream copy
+NOTIFY_COST = JobCost(cpu=0.05, memory=50 * MB)  # one HTTP POST
+GENERATE_COST = JobCost(cpu=0.1, memory=150 * MB)  # mostly waiting on the LLM provider
+LIGHTEST_COST = RENDER_COSTS["-ql"]
+CALIBRATION_REFRESH_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class Capacity:
+    cpu: float
+    memory: int
+
+
+def worker_capacity(cpu_count: int, memory_bytes: Optional[int]) -> Capacity:
+    cpu = WORKER_CPU_BUDGET or float(cpu_count)
+    # Without a memory reading, assume the CPU budget is the only limit
+    memory = int(memory_bytes * WORKER_MEMORY_FRACTION) if memory_bytes else 1 << 62
+    return Capacity(cpu=cpu, memory=memory)
+
+
+def calibrated_costs(measured: Dict[str, tuple]) -> Dict[str, JobCost]:
+    """RENDER_COSTS with the measured (cores, peak RSS) per quality flag in place of the static figures."""
+    costs = dict(RENDER_COSTS)
+    for quality_flag, (cores, peak_rss) in measured.items():
+        if cores > 0 and peak_rss > 0:
+            costs[quality_flag] = JobCost(cpu=cores, memory=peak_rss)
+    return costs
+
+
+def job_cost(task_name: str, args: Iterable, kwargs: Optional[dict] = None,
+             costs: Dict[str, JobCost] = RENDER_COSTS) -> JobCost:
+    """Estimate for a render-pipeline task from its name and arguments, by the `costs` table."""
+    args, kwargs = list(args or ()), kwargs or {}
+    if task_name.endswith("collect_scene_renders"):
+        return STITCH_COST
+    if task_name.endswith("notify_webhook"):
+        return NOTIFY_COST
+    if task_name.endswith("generate_scene"):
+        return GENERATE_COST
+    if task_name.endswith("upgrade_render"):
+        quality = args[3] if len(args) > 3 else kwargs.get("quality")
+    else:
+        quality = args[2] if len(args) > 2 else kwargs.get("quality", "low")
+    return costs.get(QUALITY_MAP.get(quality, "-ql"), LIGHTEST_COST)
+
+
+def plan_concurrency(demand: List[JobCost], backlog: int, capacity: Capacity,
+                     min_concurrency: int, max_concurrency: int) -> int:
+    """
+    Processes to run for the reserved jobs in `demand` (running ones first):
+    as many as fit the budget, plus one more when the broker has a backlog
+    and a light render would still fit. At least one job always runs, however
+    heavy.
+    """
+    target, cpu, memory = 0, 0.0, 0
+    for cost in demand:
+        if target >= max_concurrency:
+            break
+        if target and (cpu + cost.cpu > capacity.cpu or memory + cost.memory > capacity.memory):
+            break
+        target, cpu, memory = target + 1, cpu + cost.cpu, memory + cost.memory
+    all_placed = target == len(demand)
+    fits_another = (cpu + LIGHTEST_COST.cpu <= capacity.cpu and memory + LIGHTEST_COST.memory <= capacity.memory)
+    if backlog > 0 and all_placed and (fits_another or target == 0):
+        target += 1
+    return max(min_concurrency, min(target, max_concurrency))
+
+
+class CostAwareAutoscaler(Autoscaler):
+    """Drop-in replacement for Celery's Autoscaler (see the module docstring)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Imported here: the API never loads this module, workers probe once at startup
+        from app.core.toolchain import get_toolchain
+        toolchain = get_toolchain()
+        self.capacity = worker_capacity(toolchain.cpu_count, toolchain.memory_bytes)
+        self.costs, self._costs_refreshed = RENDER_COSTS, None
+        logger.info("Cost-aware autoscaler: %.1f cores, %d MB budget, %d-%d processes",
+                    self.capacity.cpu, self.capacity.memory // MB, self.min_concurrency, self.max_concurrency)
+
+    def _refresh_costs(self) -> None:
+        if not WORKER_COST_CALIBRATION:
+            return
+        now = monotonic()
+        if self._costs_refreshed is not None and now - self._costs_refreshed < CALIBRATION_REFRESH_SECONDS:
+            return
+        from app.services.render_stats import measured_render_usage
+        self.costs, self._costs_refreshed = calibrated_costs(measured_render_usage()), now
+
+    def _demand(self) -> List[JobCost]:
+        self._refresh_costs()
+        active = set(state.active_requests)
+        reserved = sorted(state.reserved_requests, key=lambda req: req not in active)
+        return [job_cost(req.name, req.args, req.kwargs, self.costs) for req in reserved]
+
+    def _backlog(self) -> int:
+        from app.services.queue_stats import get_queue_depths
+        consumed = {queue.name for queue in self.worker.consumer.task_consumer.queues} \
+            if self.worker and self.worker.consumer and self.worker.consumer.task_consumer else None
+        depths = get_queue_depths()
+        return sum(max(depth, 0) for queue, depth in depths.items() if consumed is None or queue in consumed)
+
+    def _maybe_scale(self, req=None):
+        if not WORKER_COST_AUTOSCALE:
+            return super()._maybe_scale(req)
+        target = plan_concurrency(self._demand(), self._backlog(), self.capacity,
+                                  self.min_concurrency, self.max_concurrency)
+        self._follow_prefetch(target)
+        procs = self.processes
+        if target > procs:
+            self.scale_up(target - procs)
+            return True
+        if target < procs:
+            self.scale_down(procs - target)
+            return True
+        return False
+
+    def scale_down(self, n):
+        # The stock scaler only shrinks after it has grown once; a pool started at MAX must shrink too
+        if self._last_scale_up is None or monotonic() - self._last_scale_up > self.keepalive:
+            return self._shrink(n)
+
+    def _follow_prefetch(self, target: int) -> None:
+        # Stock Celery prefetches for MAX processes whatever the pool size; reserve only for the planned pool
+        consumer = self.worker.consumer if self.worker else None
+        if getattr(consumer, "qos", None) is None or not consumer.initial_prefetch_count:
+            return
+        diff = target * WORKER_PREFETCH_MULTIPLIER - consumer.qos.value
+        if diff > 0:
+            consumer.qos.increment_eventually(diff)
+        elif diff < 0:
+            consumer.qos.decrement_eventually(-diff)
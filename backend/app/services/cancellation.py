@@ -0,0 +1,97 @@
+# app/services/cancellation.py
+"""
+Cancellation of renders nobody is going to watch.
+
+DELETE /api/render/{task_id} sets a cancel flag in Redis and revokes the task.
+A queued render sees the flag (or the revocation) as soon as a worker picks it
+up, and returns without rendering. A running render checks the flag every
+CANCEL_POLL_INTERVAL seconds while Manim runs. When the flag is set, the
+worker terminates Manim's whole process group, including its ffmpeg and LaTeX
+children, and the temporary workspace is removed as the task unwinds.
+
+With RENDER_ABANDON_TIMEOUT > 0, enqueueing a render and every status poll
+refresh a "seen" key with that TTL. Once the key expires, no client has polled
+for that long, and the render is cancelled the same way.
+
+The subtasks of a multi-scene render carry the id clients poll in a
+`render_id` header, so one flag and one seen key cover every scene.
+"""
+from typing import Iterable, Optional
+
+import redis
+from app.config import REDIS_URL, RENDER_ABANDON_TIMEOUT
+from app.core.logging import logger
+
+CANCEL_KEY_PREFIX = "manimate:cancel:"
+SEEN_KEY_PREFIX = "manimate:seen:"
+CANCEL_FLAG_TTL = 24 * 3600  # longer than any render stays queued
+
+REASON_CLIENT = "client"
+REASON_ABANDONED = "abandoned"
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+class RenderCancelled(Exception):
+    """Raised inside a worker when the render it is running has been cancelled."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def cancelled_result(reason: str, reclaimed_seconds: Optional[float] = None) -> dict:
+    if reason == REASON_ABANDONED:
+        message = f"The render was cancelled because no client checked on it for {RENDER_ABANDON_TIMEOUT}s."
+    else:
+        message = "The render was cancelled."
+    result = {"status": "FAILURE", "stage": "cancellation", "error_type": "cancelled", "cancel_reason": reason,
+              "message": message, "logs": ""}
+    if reclaimed_seconds is not None:
+        result["reclaimed_seconds"] = round(reclaimed_seconds, 3)
+    return result
+
+
+def request_cancel(task_id: str) -> bool:
+    """Flags a render as cancelled. False if Redis is unreachable (only revocation will apply)."""
+    try:
+        _get_client().set(CANCEL_KEY_PREFIX + task_id, REASON_CLIENT, ex=CANCEL_FLAG_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not flag %s as cancelled: %s", task_id, e)
+        return False
+    return True
+
+
+def touch(task_ids: Iterable[str]) -> None:
+    """Records that a client is still interested in these renders (no-op unless abandonment is enabled)."""
+    task_ids = list(task_ids)
+    if not RENDER_ABANDON_TIMEOUT or not task_ids:
+        return
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.set(SEEN_KEY_PREFIX + task_id, 1, ex=RENDER_ABANDON_TIMEOUT)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not record interest in %d renders: %s", len(task_ids), e)
+
+
+def cancel_reason(task_id: str) -> Optional[str]:
+    """Why the render should stop, or None to carry on (including when Redis is unreachable)."""
+    try:
+        flag, seen = _get_client().mget([CANCEL_KEY_PREFIX + task_id, SEEN_KEY_PREFIX + task_id])
+    except redis.RedisError as e:
+        logger.warning("Could not check cancellation of %s: %s", task_id, e)
+        return None
+    if flag is not None:
+        return REASON_CLIENT
+    if RENDER_ABANDON_TIMEOUT and seen is None:
+        return REASON_ABANDONED
+    return None
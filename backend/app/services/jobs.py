@@ -0,0 +1,158 @@
+# app/services/jobs.py
+"""
+The state machine of a render job.
+
+POST /api/render only validates the prompt, admits the request and queues the
+generation stage. It answers 202 with the job id, which is also the Celery task
+id clients poll and cancel (each stage replaces the previous one under the same
+id). Each stage moves the job forward:
+
+    queued -> generating -> validating -> rendering -> uploading -> done
+
+A job is a Redis hash holding the current stage, its rank, the time each stage
+was entered, and details the generation stage learns (provider, scene names,
+quality). Stages never move backwards, so the parallel scenes of a multi-scene
+render can all report progress. Every move is published on
+JOB_EVENTS_PREFIX + id, which wakes long-polling status requests (see
+app.services.status).
+"""
+import json
+import time
+from typing import Dict, Iterable, Optional
+
+import redis
+from app.config import JOB_TTL, REDIS_URL
+from app.core import metrics
+from app.core.logging import logger
+
+JOB_KEY_PREFIX = "manimate:job:"
+JOB_EVENTS_PREFIX = "manimate:job_events:"
+DETAIL_PREFIX = "d:"
+
+QUEUED = "queued"
+GENERATING = "generating"
+VALIDATING = "validating"
+RENDERING = "rendering"
+UPLOADING = "uploading"
+DONE = "done"
+STAGES = (QUEUED, GENERATING, VALIDATING, RENDERING, UPLOADING, DONE)
+
+# Creates the hash and its TTL in one round trip
+_CREATE = """
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+"""
+
+# Moves the job to a later stage only; returns the stage it left and when it entered it
+_ADVANCE = """
+local rank = tonumber(redis.call('HGET', KEYS[1], 'rank'))
+if not rank or rank >= tonumber(ARGV[2]) then
+    return false
+end
+local previous = redis.call('HGET', KEYS[1], 'stage')
+local since = redis.call('HGET', KEYS[1], previous .. '_at')
+redis.call('HSET', KEYS[1], 'stage', ARGV[1], 'rank', ARGV[2], ARGV[1] .. '_at', ARGV[3])
+redis.call('PUBLISH', KEYS[2], ARGV[1])
+return {previous, since}
+"""
+
+_redis_client = None
+_create_script = None
+_advance_script = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client, _create_script, _advance_script
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+        _create_script = _redis_client.register_script(_CREATE)
+        _advance_script = _redis_client.register_script(_ADVANCE)
+    return _redis_client
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+# -------------------------------
+# Transitions
+# -------------------------------
+def create(job_id: str, **details) -> bool:
+    """Records a new job in the queued stage. False if Redis is unreachable (the job runs without stages)."""
+    fields = {"stage": QUEUED, "rank": 0, f"{QUEUED}_at": time.time()}
+    fields.update({DETAIL_PREFIX + key: json.dumps(value) for key, value in details.items()})
+    try:
+        _get_client()
+        _create_script(keys=[JOB_KEY_PREFIX + job_id],
+                       args=[JOB_TTL, *(item for pair in fields.items() for item in pair)])
+    except redis.RedisError as e:
+        logger.warning("Could not record job %s: %s", job_id, e)
+        return False
+    return True
+
+
+def advance(job_id: Optional[str], stage: str) -> bool:
+    """Moves the job to `stage` unless it is already there or further along. No-op for ids that are not jobs."""
+    if not job_id:
+        return False
+    try:
+        _get_client()
+        moved = _advance_script(keys=[JOB_KEY_PREFIX + job_id, JOB_EVENTS_PREFIX + job_id],
+                                args=[stage, STAGES.index(stage), time.time()])
+    except redis.RedisError as e:
+        logger.warning("Could not move job %s to %s: %s", job_id, stage, e)
+        return False
+    if not moved:
+        return False
+    previous, since = _text(moved[0]), moved[1]
+    if since is not None:
+        metrics.JOB_STAGE_SECONDS.labels(previous).observe(max(time.time() - float(since), 0.0))
+    return True
+
+
+def annotate(job_id: str, **details) -> None:
+    """Adds details the status endpoint reports alongside the stage (provider_used, scene_names, ...)."""
+    try:
+        _get_client().hset(JOB_KEY_PREFIX + job_id, mapping={
+            DETAIL_PREFIX + key: json.dumps(value) for key, value in details.items() if value is not None})
+    except redis.RedisError as e:
+        logger.warning("Could not annotate job %s: %s", job_id, e)
+
+
+# -------------------------------
+# Lookups
+# -------------------------------
+def fetch(job_ids: Iterable[str]) -> Dict[str, dict]:
+    """{job id: {"stage": ..., "details": {...}}} for the ids that are jobs, in one round trip."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(JOB_KEY_PREFIX + job_id)
+        records = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not read job stages: %s", e)
+        return {}
+    jobs = {}
+    for job_id, record in zip(job_ids, records):
+        if not record:
+            continue
+        record = {_text(key): _text(value) for key, value in record.items()}
+        jobs[job_id] = {
+            "stage": record.get("stage"),
+            "details": {key[len(DETAIL_PREFIX):]: json.loads(value)
+                        for key, value in record.items() if key.startswith(DETAIL_PREFIX)},
+        }
+    return jobs
+
+
+def with_stage(payload: dict, job: Optional[dict]) -> dict:
+    """The status payload with the job's current stage (while in progress) and its details."""
+    if job is None:
+        return payload
+    payload = {**payload, **{key: value for key, value in job["details"].items() if key not in payload}}
+    if payload["status"] == "IN_PROGRESS" and job["stage"]:
+        payload["stage"] = job["stage"]
+    return payload
@@ -1,15 +1,35 @@
 # app/services/llm.py
 
-from openai import OpenAI
-import google.generativeai as genai
 import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import closing
+from dataclasses import dataclass
+from functools import lru_cache
 from app.core.logging import logger
-from typing import Dict, Optional, Literal
+from app.core.metrics import (
+    ACCEPTED_GENERATION_SECONDS,
+    CANDIDATES_GENERATED,
+    GENERATION_SECONDS,
+    GENERATION_TOKENS,
+    PROMPT_CANDIDATES,
+    PROMPT_TOKENS,
+    TOKENS_PER_ACCEPTED_SCENE,
+)
+from app.core import tracing
+from app.services.prompts import build_prompt, choose_mode, estimate_tokens
+from app.services.validator import CodeValidator, dry_run_manim_code, manim_available, validate_manim_symbols
+from typing import Dict, Iterator, List, Optional, Literal, Tuple, Union
 from app.config import (
     OPENAI_API_KEY,
     GEMINI_API_KEY,
     DEEPSEEK_API_KEY,
     OPENAI_PROJECT_ID,
+    MODEL_NAME,
+    DEEPSEEK_MODEL_NAME,
+    GENERATION_CANDIDATES,
+    GENERATION_CANDIDATE_CHECKS,
+    MANIM_API_CHECK,
     # OPENROUTER_API_KEY,
 )
 
@@ -21,171 +41,40 @@ StyleType = Literal[
 DetailLevel = Literal["basic", "intermediate", "advanced"]
 ProviderType = Literal["openai", "gemini", "deepseek", "openrouter", "auto"]
 
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+# OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
 # Clients setup
-openai_client = OpenAI(api_key=OPENAI_API_KEY, project=OPENAI_PROJECT_ID)
+# Provider SDKs are imported on first use, not at module import: they dominate
+# API cold start and most processes never talk to every provider.
+def get_openai_client(api_key: str, base_url: Optional[str] = None, project: Optional[str] = None,
+                      byok: bool = False):
+    """
+    OpenAI-compatible client. Clients for the server's configured keys are
+    cached so connection pools are reused. A user's own key (byok) gets a
+    client for this request only: it is not kept in process memory, and cannot
+    evict the server's clients.
+    """
+    if byok:
+        return _new_openai_client(api_key, base_url, project)
+    return _server_openai_client(api_key, base_url, project)
 
-# openrouter_client = OpenAI(
-#     api_key=OPENROUTER_API_KEY, base_url="https://openrouter.ai/api/v1"
-# )
 
-deepseek_client = OpenAI(
-    api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com/v1"
-)
+@lru_cache(maxsize=4)
+def _server_openai_client(api_key: str, base_url: Optional[str], project: Optional[str]):
+    return _new_openai_client(api_key, base_url, project)
 
-# Enhanced examples with better commenting
-EXAMPLE_ALGEBRA = """
-from manim import *
-
-class PythagoreanProof(Scene):
-    def construct(self):
-        # Step 1: Introduce the theorem
-        title = Title("Visual Proof of the Pythagorean Theorem")
-        self.play(Write(title))
-
-        # Step 2: Set up the triangle dimensions
-        a, b = 2.0, 3.0
-        c = np.sqrt(a**2 + b**2)
-
-        # Step 3: Create visual squares representing a² and b²
-        sq_a = Square(side_length=a, fill_color=BLUE,
-                      fill_opacity=0.8).shift(LEFT * (b/2 + a/2))
-        sq_b = Square(side_length=b, fill_color=GREEN,
-                      fill_opacity=0.8).next_to(sq_a, RIGHT, buff=0)
-
-        # Step 4: Add the right triangle to complete the visual
-        triangle = Polygon(sq_a.get_corner(UR), sq_b.get_corner(UL), sq_b.get_corner(DL),
-                          stroke_color=WHITE, fill_color=YELLOW, fill_opacity=0.8)
-
-        self.play(Create(sq_a), Create(sq_b), run_time=1.5)
-        self.play(Create(triangle))
-
-        # Step 5: Visual transformation showing a² + b² = c²
-        rearranged_group = VGroup(sq_a.copy(), sq_b.copy())
-        sq_c = Square(side_length=c, fill_color=RED, fill_opacity=0.8)
-
-        self.play(Transform(rearranged_group, sq_c))
-
-        # Step 6: Display the mathematical conclusion
-        formula = MathTex("a^2", "+", "b^2", "=",
-                          "c^2").next_to(title, DOWN, buff=0.5)
-        formula[0].set_color(BLUE)
-        formula[2].set_color(GREEN)
-        formula[4].set_color(RED)
-        self.play(Write(formula))
-        self.wait(2)
-"""
-
-EXAMPLE_CALCULUS = """
-from manim import *
-
-class DerivativeVisualization(Scene):
-    def construct(self):
-        # Step 1: Set up coordinate system
-        axes = Axes(x_range=[-4, 4, 1], y_range=[-1, 7, 1],
-                    axis_config={"color": BLUE})
-        parabola = axes.plot(lambda x: x**2, color=WHITE, stroke_width=3)
-
-        # Step 2: Create dynamic tracking system
-        x_tracker = ValueTracker(-2)
-
-        # Step 3: Define the tangent line that updates dynamically
-        tangent_line = always_redraw(
-            lambda: axes.get_secant_slope_group(
-                x=x_tracker.get_value(),
-                graph=parabola,
-                dx=0.01,
-                secant_line_color=YELLOW,
-                secant_line_length=4,
-            )
-        )
 
-        # Step 4: Add a tracking dot
-        tracking_dot = always_redraw(
-            lambda: Dot(color=RED).move_to(
-                axes.c2p(x_tracker.get_value(), x_tracker.get_value()**2)
-            )
-        )
-
-        # Step 5: Build the scene progressively
-        self.play(Create(axes), Create(parabola))
-        self.play(Create(tracking_dot), Create(tangent_line))
-        self.wait(1)
-
-        # Step 6: Animate the key insight - derivative as slope
-        self.play(x_tracker.animate.set_value(2), run_time=5)
-
-        # Step 7: Add explanatory text
-        explanation = Text(
-            "Derivative = Slope of Tangent Line", font_size=24).to_edge(UP)
-        self.play(Write(explanation))
-        self.wait(2)
-"""
-
-# Enhanced prompt template with quality-aware instructions
-ENHANCED_PROMPT_TEMPLATE = """
-You are an expert Manim developer and visual educator in the style of 3Blue1Brown. Generate a complete Python script for a Manim Community animation.
-
-**ANALYSIS PHASE - Follow this Chain of Thought:**
-
-1. **Concept Deconstruction**: What mathematical concept needs visualization?
-2. **Visual Insight Discovery**: What's the "aha!" moment that makes this concept click?
-3. **Educational Flow Planning**: How should the explanation unfold step-by-step?
-4. **Pattern Recognition**: Which animation template best fits this concept?
-
-**QUALITY REQUIREMENTS:**
-- Quality Level: {quality}
-- Style Focus: {style}
-- Detail Level: {detail_level}
-
-**Quality Level Guidelines:**
-- **draft**: Basic visualization, minimal comments
-- **polished**: Smooth animations, clear explanations, good pacing
-- **3b1b-style**: Elegant visual storytelling, multiple "reveal" moments
-- **minimal**: Simple, clean, focused on core concept
-
-**Style Focus Guidelines:**
-- **educational**: Emphasize step-by-step learning
-- **geometric**: Focus on shapes, transformations, spatial relationships
-- **algebraic**: Show equation manipulations and symbolic reasoning
-- **calculus**: Demonstrate limits, derivatives, integrals with dynamic elements
-- **probability**: Use histograms, distributions, random processes
-- **linear-algebra**: Vectors, matrices, transformations, basis changes
-
-**TECHNICAL REQUIREMENTS:**
-- Import: `from manim import *` only
-- Class name must be descriptive and CamelCase
-- Add step-by-step comments explaining the educational purpose
-- Use meaningful variable names
-- Include proper timing with `run_time` and `wait()`
-- Color code related elements for visual clarity
--**CRITICAL: For all `MathTex` objects, ensure the string is a raw string (e.g., `r"..."`) and that all LaTeX syntax is 100% valid. Double-check all backslashes and special characters.**
--**CRITICAL: To set the color of a mobject created by a helper method (like `Brace.get_tex` or `Axes.get_graph_label`), you must do it in two steps. First, create the object. Second, set its color. Example: `label = brace.get_tex("My Label"); label.set_color(BLUE)`**
-
-**Animation Patterns Available:**
-- Dynamic function plotting with `always_redraw()`
-- Geometric transformations and morphing
-- Step-by-step equation derivations
-- Interactive elements with `ValueTracker`
-- Progressive revelation techniques
-- Mathematical theorem proofs
-
-**Examples:**
-
-**Example 1: Geometric Proof**
-```python
-{example_algebra}
-```
-
-**Example 2: Calculus Concept**
-```python
-{example_calculus}
-```
-
-**User Request**: {user_prompt}
-
-**Generate the complete, educational Python script now:**
-"""
+def _new_openai_client(api_key: str, base_url: Optional[str], project: Optional[str]):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, project=project)
+
 
+def get_genai():
+    """The google.generativeai module, imported lazily."""
+    import google.generativeai as genai
+    return genai
 
 def extract_python_code(text: str) -> str:
     """Extract Python code from various markdown formats with robust fallbacks."""
@@ -244,6 +133,174 @@ def validate_manim_code(code: str) -> tuple[bool, str]:
     return True, "Code appears valid"
 
 
+@lru_cache(maxsize=1)
+def _dry_run_available() -> bool:
+    if not manim_available():
+        logger.warning("GENERATION_CANDIDATE_CHECKS has dry_run but Manim is not installed here; skipping it")
+        return False
+    return True
+
+
+_code_validator = CodeValidator()
+
+
+def check_candidate(code: str) -> Tuple[bool, str]:
+    """validate_manim_code, the Manim API index check, then the GENERATION_CANDIDATE_CHECKS, cheapest first."""
+    is_valid, message = validate_manim_code(code)
+    if is_valid and MANIM_API_CHECK:
+        result = validate_manim_symbols(code)
+        is_valid, message = result.is_valid, result.message
+    if is_valid and "static" in GENERATION_CANDIDATE_CHECKS:
+        result = _code_validator.validate_and_sanitize_code(code)
+        is_valid, message = result.is_valid, result.message
+    if is_valid and "dry_run" in GENERATION_CANDIDATE_CHECKS and _dry_run_available():
+        is_valid, message = dry_run_manim_code(code)
+    return is_valid, message
+
+
+# -------------------------------
+# Provider calls and speculative candidates
+# -------------------------------
+# Providers whose API returns several completions for one prompt (n>1); the others get parallel calls
+NATIVE_N_PROVIDERS = {"openai"}
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    tokens: int  # billed tokens; an n>1 call's usage is split evenly across its completions
+    seconds: float  # latency of the call that produced it
+
+
+def _usage_tokens(usage, field: str) -> int:
+    return int(getattr(usage, field, 0) or 0) if usage is not None else 0
+
+
+def _complete(provider: str, full_prompt: str, user_key: Optional[str], n: int = 1) -> List[Completion]:
+    """One call to `provider`: `n` completions where its API supports that, else one. Empty if it has no key."""
+    model_used = "unknown"
+    started = time.perf_counter()
+    try:
+        if provider == "openai":
+            model_used = MODEL_NAME
+            project = None if user_key else OPENAI_PROJECT_ID
+            client = get_openai_client(user_key or OPENAI_API_KEY, project=project, byok=bool(user_key))
+            response = client.chat.completions.create(
+                model=model_used,
+                messages=[{"role": "user", "content": full_prompt}],
+                n=n,
+            )
+            texts = [choice.message.content for choice in response.choices]
+            tokens = _usage_tokens(response.usage, "total_tokens")
+
+        elif provider == "gemini":
+            # **FIX #1: Handle Gemini's unique response structure**
+            gemini_key = user_key or GEMINI_API_KEY
+            if not gemini_key: return [] # Skip if no key is available
+
+            genai = get_genai()
+            genai.configure(api_key=gemini_key)
+            # Using a list of models to try is more robust
+            models_to_try = ['gemini-2.5-pro', 'gemini-1.5-flash-latest']
+            raw_text, tokens = "", 0
+            for model_name in models_to_try:
+                model_started = time.perf_counter()
+                try:
+                    model = genai.GenerativeModel(model_name)
+                    response = model.generate_content(full_prompt)
+                    raw_text = response.text
+                    tokens = _usage_tokens(getattr(response, "usage_metadata", None), "total_token_count")
+                    model_used = model_name
+                    started = model_started # failed models were observed separately
+                    break # Success, exit the inner loop
+                except Exception as model_error:
+                    GENERATION_SECONDS.labels(provider, model_name, "error").observe(time.perf_counter() - model_started)
+                    logger.warning("Gemini model '%s' failed: %s", model_name, model_error)
+                    raw_text = "" # Ensure raw_text is empty on failure
+            if not raw_text:
+                raise Exception("All Gemini models failed.")
+            texts = [raw_text]
+
+        elif provider == "deepseek":
+            deepseek_key = user_key or DEEPSEEK_API_KEY
+            if not deepseek_key: return []
+
+            model_used = DEEPSEEK_MODEL_NAME
+            client = get_openai_client(deepseek_key, base_url=DEEPSEEK_BASE_URL, byok=bool(user_key))
+            response = client.chat.completions.create(
+                model=model_used,
+                messages=[{"role": "user", "content": full_prompt}],
+            )
+            texts = [response.choices[0].message.content]
+            tokens = _usage_tokens(response.usage, "total_tokens")
+
+        else:
+            texts, tokens = [""], 0
+    except Exception:
+        # **FIX #2: Correctly capture the error**
+        if provider != "gemini":
+            GENERATION_SECONDS.labels(provider, model_used, "error").observe(time.perf_counter() - started)
+        raise
+
+    seconds = time.perf_counter() - started
+    return [Completion(text or "", model_used, tokens // len(texts), seconds) for text in texts]
+
+
+def _count_unused(provider: str, completions: List[Completion]) -> None:
+    for completion in completions:
+        CANDIDATES_GENERATED.labels(provider, "unused").inc()
+        GENERATION_TOKENS.labels(provider, "unused").inc(completion.tokens)
+
+
+def _count_unused_call(provider: str, future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        _count_unused(provider, future.result())
+
+
+def _candidates(provider: str, full_prompt: str, user_key: Optional[str],
+                n: int) -> Iterator[Union[Completion, Exception]]:
+    """
+    Up to `n` completions from `provider` in arrival order; a failed call
+    yields its exception. Closing the generator (once a candidate is accepted)
+    cancels the calls that have not started. Calls already in flight finish in
+    the background, and only their tokens are counted, as "unused".
+    """
+    if n <= 1 or provider in NATIVE_N_PROVIDERS:
+        try:
+            completions = _complete(provider, full_prompt, user_key, n)
+        except Exception as e:
+            yield e
+            return
+        try:
+            while completions:
+                yield completions.pop(0)
+        finally:
+            _count_unused(provider, completions)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"llm-{provider}")
+    futures = [executor.submit(_complete, provider, full_prompt, user_key) for _ in range(n)]
+    pending = set(futures)
+    try:
+        for future in as_completed(futures):
+            pending.discard(future)
+            try:
+                completions = future.result()
+            except Exception as e:
+                yield e
+                continue
+            try:
+                while completions:
+                    yield completions.pop(0)
+            finally:
+                _count_unused(provider, completions)
+    finally:
+        for future in pending:
+            future.add_done_callback(lambda done: _count_unused_call(provider, done))
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 # app/services/llm.py
 
 def generate_manim_code(
@@ -256,15 +313,17 @@ def generate_manim_code(
 ) -> dict:
     """
     Generate Manim code with enhanced parameters, validation, and robust error handling.
+
+    With GENERATION_CANDIDATES > 1, each provider attempt requests that many
+    candidates at once and returns the first that passes check_candidate();
+    one invalid generation no longer costs a sequential retry. The result's
+    "tokens" counts what the candidates checked so far were billed.
     """
-    full_prompt = ENHANCED_PROMPT_TEMPLATE.format(
-        user_prompt=prompt,
-        quality=quality,
-        style=style,
-        detail_level=detail_level,
-        example_algebra=EXAMPLE_ALGEBRA.strip(),
-        example_calculus=EXAMPLE_CALCULUS.strip(),
-    )
+    few_shot = choose_mode()
+    full_prompt, examples = build_prompt(prompt, quality, style, detail_level, few_shot)
+    prompt_tokens = estimate_tokens(full_prompt)
+    PROMPT_TOKENS.labels(few_shot).observe(prompt_tokens)
+    logger.info("Prompt (%s few-shot) has ~%d tokens with examples %s", few_shot, prompt_tokens, examples)
 
     providers_to_try = []
     if preferred_provider == "auto":
@@ -281,71 +340,57 @@ def generate_manim_code(
          return {"success": False, "validation_result": "No API key provided or configured."}
 
     last_error = "No providers were available or attempted."
-    
+    request_started, spent_tokens = time.perf_counter(), 0
+
     for provider in providers_to_try:
+        models = []
+        span = tracing.begin_span("llm.attempt", provider=provider, candidates=GENERATION_CANDIDATES,
+                                  few_shot=few_shot, prompt_tokens=prompt_tokens)
         try:
-            print(f"Attempting to generate code with {provider}...")
-            raw_text = ""
-            
+            logger.info("Attempting to generate code with %s...", provider)
             # Use the user's key if provided, otherwise fall back to the system key from config.py
-            user_key = api_keys.get(provider)
-            
-            if provider == "openai":
-                client = OpenAI(api_key=user_key or OPENAI_API_KEY)
-                response = client.chat.completions.create(...) # your OpenAI call
-                raw_text = response.choices[0].message.content
-                
-            elif provider == "gemini":
-                # **FIX #1: Handle Gemini's unique response structure**
-                gemini_key = user_key or GEMINI_API_KEY
-                if not gemini_key: continue # Skip if no key is available
-                
-                genai.configure(api_key=gemini_key)
-                # Using a list of models to try is more robust
-                models_to_try = ['gemini-2.5-pro', 'gemini-1.5-flash-latest']
-                for model_name in models_to_try:
-                    try:
-                        model = genai.GenerativeModel(model_name)
-                        response = model.generate_content(full_prompt)
-                        raw_text = response.text
-                        break # Success, exit the inner loop
-                    except Exception as model_error:
-                        print(f"Gemini model '{model_name}' failed: {model_error}")
-                        raw_text = "" # Ensure raw_text is empty on failure
-                if not raw_text:
-                    raise Exception("All Gemini models failed.")
-
-            elif provider == "deepseek":
-                deepseek_key = user_key or DEEPSEEK_API_KEY
-                if not deepseek_key: continue
-                
-                client = OpenAI(api_key=deepseek_key, base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(...) # your DeepSeek call
-                raw_text = response.choices[0].message.content
-            
-            code = extract_python_code(raw_text)
-            is_valid, validation_msg = validate_manim_code(code)
-            
-            if is_valid:
-                logger.info(f"'{provider}' succeeded and passed validation.")
-                
-                # --- ADD THIS LOG MESSAGE ---
-                logger.debug(f"--- Generated Code from {provider} ---\n{code}\n--------------------")
-                
-                return {
-                    "code": code,
-                    "provider_used": provider,
-                    "validation_result": validation_msg,
-                    "success": True
-                }
-            else:
-                last_error = f"'{provider}' generated invalid code: {validation_msg}"
-                print(last_error)
-                
+            with closing(_candidates(provider, full_prompt, api_keys.get(provider), GENERATION_CANDIDATES)) as candidates:
+                for candidate in candidates:
+                    if isinstance(candidate, Exception):
+                        CANDIDATES_GENERATED.labels(provider, "error").inc()
+                        last_error = f"'{provider}' API call failed: {candidate}"
+                        span.error = last_error
+                        logger.warning(last_error)
+                        continue
+
+                    spent_tokens += candidate.tokens
+                    models.append(candidate.model)
+                    code = extract_python_code(candidate.text)
+                    is_valid, validation_msg = check_candidate(code)
+                    outcome = "accepted" if is_valid else "rejected"
+                    GENERATION_SECONDS.labels(provider, candidate.model, "success" if is_valid else "invalid_code").observe(candidate.seconds)
+                    CANDIDATES_GENERATED.labels(provider, outcome).inc()
+                    PROMPT_CANDIDATES.labels(few_shot, outcome).inc()
+                    GENERATION_TOKENS.labels(provider, outcome).inc(candidate.tokens)
+
+                    if is_valid:
+                        logger.info("'%s' succeeded and passed validation.", provider)
+                        logger.debug("--- Generated Code from %s ---\n%s\n--------------------", provider, code)
+                        ACCEPTED_GENERATION_SECONDS.labels(str(GENERATION_CANDIDATES)).observe(time.perf_counter() - request_started)
+                        TOKENS_PER_ACCEPTED_SCENE.labels(str(GENERATION_CANDIDATES)).observe(spent_tokens)
+                        return {
+                            "code": code,
+                            "provider_used": provider,
+                            "model_used": candidate.model,
+                            "validation_result": validation_msg,
+                            "success": True,
+                            "tokens": spent_tokens,
+                        }
+                    last_error = f"'{provider}' generated invalid code: {validation_msg}"
+                    logger.warning(last_error)
+
         except Exception as e:
-            # **FIX #2: Correctly capture the error**
             last_error = f"'{provider}' API call failed: {e}"
-            print(last_error)
+            span.error = last_error
+            logger.warning(last_error)
+        finally:
+            span.set_attribute("model", models[-1] if models else "unknown")
+            tracing.end_span(span)
 
     return {
         "code": f"# All AI providers failed.\n# Last error: {last_error}",
@@ -354,7 +399,6 @@ def generate_manim_code(
         "success": False
     }
 
-
 # Convenience functions for common use cases
 def generate_algebra_visualization(prompt: str) -> dict:
     """Generate algebra-focused visualization."""
@@ -0,0 +1,444 @@
+# app/services/manim_api.py
+"""
+Index of the installed Manim's public API, and a static check of generated
+scenes against it.
+
+The most common way an LLM scene fails is a call to something Manim does not
+have: a class that does not exist (`Arrow3D` on an old version), a made-up
+method (`circle.set_colour`) or keyword argument (`Text(..., font_color=RED)`).
+Without the check, such a render runs until construct() reaches that line.
+
+The index lists every name `from manim import *` provides. For classes it
+keeps the bases, the members (with parameter names for methods, including
+attributes assigned to `self` in the class source) and the __init__
+parameters. It is built once per Manim version, on a machine with Manim
+installed:
+
+    python -m app.services.manim_api build    # writes MANIM_API_INDEX_DIR/manim_api-<version>.json.gz
+
+The API loads the index matching its Manim install, MANIM_API_VERSION, or else
+the newest one present. find_unknown_symbols() walks a scene's AST against it
+in milliseconds. The check only reports what it can resolve with certainty.
+Names it cannot type (function results, `.animate` chains, objects from
+other libraries) are not checked.
+"""
+import argparse
+import ast
+import builtins
+import difflib
+import gzip
+import inspect
+import json
+import os
+import re
+import sys
+import textwrap
+from functools import lru_cache
+from importlib import metadata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from app.config import MANIM_API_INDEX_DIR, MANIM_API_VERSION
+from app.core.logging import logger
+
+INDEX_FORMAT = 1
+INDEX_FILE = re.compile(r"^manim_api-(?P<version>[\w.+-]+)\.json\.gz$")
+VAR_POSITIONAL, VAR_KEYWORD = "*", "**"
+BUILTIN_NAMES = set(dir(builtins)) | {"__name__", "__file__", "__doc__", "__builtins__"}
+
+
+# -------------------------------
+# Building
+# -------------------------------
+def _params(func) -> Optional[List[str]]:
+    """Parameter names of `func` without self/cls, with "*" and "**" for varargs; None if unknown."""
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return None
+    params = []
+    for param in signature.parameters.values():
+        if param.kind is param.VAR_POSITIONAL:
+            params.append(VAR_POSITIONAL)
+        elif param.kind is param.VAR_KEYWORD:
+            params.append(VAR_KEYWORD)
+        else:
+            params.append(param.name)
+    return params
+
+
+def _self_attributes(cls) -> Set[str]:
+    """Attributes the class source assigns to `self` (instance attributes dir() cannot see)."""
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(cls)))
+    except (OSError, TypeError, SyntaxError):
+        return set()
+    return {
+        node.attr for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store)
+        and isinstance(node.value, ast.Name) and node.value.id == "self"
+    }
+
+
+def _class_key(cls) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _describe_class(cls, classes: dict) -> str:
+    key = _class_key(cls)
+    if key in classes:
+        return key
+    classes[key] = None  # placeholder against cycles
+    members = {}
+    for name, value in vars(cls).items():
+        if name.startswith("__") and name != "__init__":
+            continue
+        if isinstance(value, (staticmethod, classmethod)):
+            value = value.__func__
+            members[name] = _params(value)
+            if members[name] and isinstance(vars(cls)[name], classmethod):
+                members[name] = members[name][1:]
+        elif inspect.isfunction(value):
+            params = _params(value)
+            members[name] = params[1:] if params else params
+        else:
+            members[name] = None
+    for name in _self_attributes(cls):
+        members.setdefault(name, None)
+    init = members.pop("__init__", None)
+    if "__init__" in vars(cls) and init is None:
+        init = [VAR_KEYWORD]  # unreadable signature: accept any keyword
+    classes[key] = {
+        "name": cls.__name__,
+        "bases": [_describe_class(base, classes) for base in cls.__bases__ if base is not object],
+        "members": members,
+        "init": init,
+        "getattr": "__getattr__" in vars(cls),
+    }
+    return key
+
+
+def build_index() -> dict:
+    """Introspects the installed Manim; every public name `from manim import *` provides."""
+    import manim
+
+    exported = getattr(manim, "__all__", None) or [name for name in dir(manim) if not name.startswith("_")]
+    symbols, classes = {}, {}
+    for name in sorted(exported):
+        value = getattr(manim, name, None)
+        if inspect.isclass(value):
+            symbols[name] = {"kind": "class", "ref": _describe_class(value, classes)}
+        elif inspect.isroutine(value):
+            symbols[name] = {"kind": "function", "params": _params(value)}
+        elif inspect.ismodule(value):
+            # Members are only listed for Manim's own modules (rate_functions, ...), not numpy and friends
+            members = sorted(n for n in dir(value) if not n.startswith("_")) \
+                if value.__name__.split(".")[0] == "manim" else None
+            symbols[name] = {"kind": "module", "members": members}
+        else:
+            symbols[name] = {"kind": "value"}
+    return {"format": INDEX_FORMAT, "manim_version": metadata.version("manim"), "symbols": symbols,
+            "classes": {key: value for key, value in classes.items() if value is not None}}
+
+
+def write_index(index: dict, directory: str = MANIM_API_INDEX_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"manim_api-{index['manim_version']}.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), sort_keys=True)
+    return path
+
+
+# -------------------------------
+# Loading
+# -------------------------------
+def _version_key(version: str) -> tuple:
+    return tuple(int(part) if part.isdigit() else -1 for part in re.split(r"[.+-]", version))
+
+
+def _installed_manim_version() -> Optional[str]:
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _index_path(directory: str) -> Optional[str]:
+    try:
+        versions = {m.group("version"): name for name in os.listdir(directory) if (m := INDEX_FILE.match(name))}
+    except FileNotFoundError:
+        return None
+    if not versions:
+        return None
+    wanted = _installed_manim_version() or MANIM_API_VERSION
+    if wanted and wanted not in versions:
+        logger.warning("No Manim API index for Manim %s; using %s", wanted, max(versions, key=_version_key))
+    version = wanted if wanted in versions else max(versions, key=_version_key)
+    return os.path.join(directory, versions[version])
+
+
+class ManimApi:
+    """A loaded index with inherited members resolved on demand."""
+
+    def __init__(self, index: dict):
+        self.version = index["manim_version"]
+        self.symbols: Dict[str, dict] = index["symbols"]
+        self.classes: Dict[str, dict] = index["classes"]
+
+    def class_of(self, name: str) -> Optional[str]:
+        symbol = self.symbols.get(name)
+        return symbol["ref"] if symbol and symbol["kind"] == "class" else None
+
+    @lru_cache(maxsize=None)
+    def members(self, key: str) -> Dict[str, Optional[list]]:
+        """Own members over inherited ones, in MRO-like order."""
+        entry = self.classes.get(key)
+        if entry is None:
+            return {}
+        merged = {}
+        for base in reversed(entry["bases"]):
+            merged.update(self.members(base))
+        merged.update(entry["members"])
+        return merged
+
+    @lru_cache(maxsize=None)
+    def dynamic_members(self, key: str) -> bool:
+        """True if a __getattr__ in the hierarchy answers get_*/set_* (Mobject does)."""
+        entry = self.classes.get(key)
+        return bool(entry) and (entry["getattr"] or any(self.dynamic_members(base) for base in entry["bases"]))
+
+    @lru_cache(maxsize=None)
+    def init_keywords(self, key: str) -> Optional[frozenset]:
+        """Keyword arguments the constructor accepts, following **kwargs up the bases; None if open-ended."""
+        entry = self.classes.get(key)
+        if entry is None:
+            return None
+        if entry["init"] is None:
+            return self.init_keywords(entry["bases"][0]) if entry["bases"] else frozenset()
+        own = frozenset(p for p in entry["init"] if p not in (VAR_POSITIONAL, VAR_KEYWORD))
+        if VAR_KEYWORD not in entry["init"]:
+            return own
+        inherited = self.init_keywords(entry["bases"][0]) if entry["bases"] else None
+        return None if inherited is None else own | inherited
+
+    def has_member(self, key: str, name: str) -> bool:
+        if name in self.members(key):
+            return True
+        return self.dynamic_members(key) and name.startswith(("get_", "set_"))
+
+
+@lru_cache(maxsize=1)
+def load_api() -> Optional[ManimApi]:
+    """The index for this deployment, or None (the check is then skipped)."""
+    path = _index_path(MANIM_API_INDEX_DIR)
+    if path is None:
+        logger.info("No Manim API index in %s; generated code is not checked against the Manim API",
+                    MANIM_API_INDEX_DIR)
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("format") != INDEX_FORMAT:
+        logger.warning("Ignoring Manim API index %s: format %s, expected %s", path, index.get("format"), INDEX_FORMAT)
+        return None
+    return ManimApi(index)
+
+
+# -------------------------------
+# Checking
+# -------------------------------
+class UnknownSymbol(NamedTuple):
+    symbol: str  # as used, e.g. "Circle.set_colour" or "Text(font_color=...)"
+    suggestion: Optional[str] = None  # the closest name Manim does have
+
+    def __str__(self) -> str:
+        return f"{self.symbol} (did you mean {self.suggestion}?)" if self.suggestion else self.symbol
+
+
+class _SymbolChecker:
+    def __init__(self, api: ManimApi, tree: ast.Module):
+        self.api = api
+        self.tree = tree
+        self.issues: List[UnknownSymbol] = []
+        self.bound = self._bound_names(tree)
+        self.user_classes = {node.name: node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)}
+
+    def _report(self, symbol: str, name: str, candidates: Iterable[str]) -> None:
+        matches = difflib.get_close_matches(name, list(candidates), n=1)
+        self.issues.append(UnknownSymbol(symbol, matches[0] if matches else None))
+
+    @staticmethod
+    def _bound_names(tree: ast.AST) -> Set[str]:
+        """Every name the code itself binds anywhere (scope-insensitive, so never a false alarm)."""
+        bound = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                bound.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                bound.add(node.name)
+            elif isinstance(node, ast.arg):
+                bound.add(node.arg)
+            elif isinstance(node, ast.alias):
+                bound.add((node.asname or node.name).split(".")[0])
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                bound.add(node.name)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                bound.update(node.names)
+            elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+                bound.add(node.name)
+        return bound
+
+    def _manim_class(self, name: str) -> Optional[str]:
+        return None if name in self.bound else self.api.class_of(name)
+
+    def _check_keywords(self, call: ast.Call, accepted: Optional[Iterable[str]], label: str) -> None:
+        """`accepted` is None when the callee takes any keyword."""
+        if accepted is None:
+            return
+        accepted = set(accepted)
+        for keyword in call.keywords:
+            if keyword.arg is not None and keyword.arg not in accepted:
+                self._report(f"{label}({keyword.arg}=...)", keyword.arg, accepted)
+
+    # --- module level: names, imports, constructor and function keywords, module members
+    def _check_names(self) -> None:
+        star_imports = [node for node in ast.walk(self.tree) if isinstance(node, ast.ImportFrom)
+                        and any(alias.name == "*" for alias in node.names)]
+        # Names from another star import cannot be known
+        check_names = all(node.module == "manim" for node in star_imports)
+        symbols = self.api.symbols
+
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.ImportFrom) and node.module == "manim":
+                for alias in node.names:
+                    if alias.name != "*" and alias.name not in symbols:
+                        self._report(alias.name, alias.name, symbols)
+            elif check_names and isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                if node.id not in self.bound and node.id not in BUILTIN_NAMES and node.id not in symbols:
+                    self._report(node.id, node.id, symbols)
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id not in self.bound:
+                symbol = symbols.get(node.func.id)
+                if symbol and symbol["kind"] == "class":
+                    self._check_keywords(node, self.api.init_keywords(symbol["ref"]), node.func.id)
+                elif symbol and symbol["kind"] == "function":
+                    self._check_keywords(node, _fixed_keywords(symbol["params"]), node.func.id)
+            elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load) \
+                    and isinstance(node.value, ast.Name) and node.value.id not in self.bound:
+                symbol = symbols.get(node.value.id)
+                if symbol and symbol["kind"] == "module" and symbol["members"] is not None \
+                        and node.attr not in symbol["members"]:
+                    self._report(f"{node.value.id}.{node.attr}", node.attr, symbol["members"])
+
+    # --- members of objects of a known Manim class: `self` in scenes, locals built by a constructor
+    def _user_class_members(self, node: ast.ClassDef, seen=()) -> Optional[Set[str]]:
+        """Names a user class and its user-defined bases add; None if a base is not Manim's (unchecked)."""
+        names = set()
+        for child in ast.walk(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                names.add(child.name)
+            elif isinstance(child, ast.Attribute) and not isinstance(child.ctx, ast.Load):
+                names.add(child.attr)
+            elif isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+                names.add(child.id)
+        for base in node.bases:
+            if isinstance(base, ast.Name) and base.id in self.user_classes and base.id not in seen:
+                inherited = self._user_class_members(self.user_classes[base.id], (*seen, node.name))
+                if inherited is None:
+                    return None
+                names |= inherited
+            elif not (isinstance(base, ast.Name) and self._manim_class(base.id)):
+                return None
+        return names
+
+    def _manim_bases(self, node: ast.ClassDef, seen=()) -> List[str]:
+        keys = []
+        for base in node.bases:
+            if isinstance(base, ast.Name) and base.id in self.user_classes and base.id not in seen:
+                keys += self._manim_bases(self.user_classes[base.id], (*seen, node.name))
+            elif isinstance(base, ast.Name) and self._manim_class(base.id):
+                keys.append(self._manim_class(base.id))
+        return keys
+
+    def _typed_locals(self, scope: ast.AST) -> Dict[str, str]:
+        """Names only ever assigned a Manim constructor call, e.g. `dot = Dot()` -> Dot's key."""
+        typed, untyped, constructor_targets = {}, set(), set()
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) \
+                    and isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name) \
+                    and self._manim_class(node.value.func.id):
+                name, key = node.targets[0].id, self._manim_class(node.value.func.id)
+                constructor_targets.add(id(node.targets[0]))
+                if typed.setdefault(name, key) != key:
+                    untyped.add(name)
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load) and id(node) not in constructor_targets:
+                untyped.add(node.id)
+            elif isinstance(node, ast.arg):
+                untyped.add(node.arg)
+        return {name: key for name, key in typed.items() if name not in untyped}
+
+    def _check_receivers(self, scope: ast.AST, receivers: Dict[str, tuple]) -> None:
+        """`<receiver>.<member>` and the member's keywords, for receivers {name: (class keys, extra names, label)}."""
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load) \
+                    and isinstance(node.value, ast.Name) and node.value.id in receivers:
+                keys, extra, label = receivers[node.value.id]
+                if node.attr not in extra and not any(self.api.has_member(key, node.attr) for key in keys):
+                    known = set(extra).union(*(self.api.members(key) for key in keys))
+                    self._report(f"{label}.{node.attr}", node.attr, known)
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                    and isinstance(node.func.value, ast.Name) and node.func.value.id in receivers:
+                keys, extra, label = receivers[node.func.value.id]
+                member = node.func.attr
+                params = next((self.api.members(key)[member] for key in keys if member in self.api.members(key)), None)
+                if member not in extra and params is not None:
+                    self._check_keywords(node, _fixed_keywords(params), f"{label}.{member}")
+
+    def check(self) -> List[UnknownSymbol]:
+        self._check_names()
+        for class_node in self.user_classes.values():
+            extra, keys = self._user_class_members(class_node), self._manim_bases(class_node)
+            if extra is not None and keys:
+                for method in class_node.body:
+                    if isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        self._check_receivers(method, {"self": (keys, extra, class_node.name)})
+        scopes = [self.tree, *(n for n in ast.walk(self.tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)))]
+        for scope in scopes:
+            receivers = {name: ([key], set(), self.api.classes[key]["name"])
+                         for name, key in self._typed_locals(scope).items()}
+            if receivers:
+                self._check_receivers(scope, receivers)
+        return list(dict.fromkeys(self.issues))
+
+
+def _fixed_keywords(params: Optional[list]) -> Optional[List[str]]:
+    """Keywords a callable accepts, or None if it takes **kwargs (or its signature is unknown)."""
+    if params is None or VAR_KEYWORD in params:
+        return None
+    return [param for param in params if param != VAR_POSITIONAL]
+
+
+def find_unknown_symbols(code: str, api: Optional[ManimApi] = None) -> List[UnknownSymbol]:
+    """Manim names, members and keyword arguments `code` uses that the index does not know."""
+    api = api or load_api()
+    if api is None:
+        return []
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []  # The syntax check reports this
+    return _SymbolChecker(api, tree).check()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the Manim API index from the installed Manim")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output-dir", default=MANIM_API_INDEX_DIR)
+    args = parser.parse_args()
+    index = build_index()
+    path = write_index(index, args.output_dir)
+    print(f"Wrote {path}: {len(index['symbols'])} symbols, {len(index['classes'])} classes "
+          f"({os.path.getsize(path) // 1024} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# app/services/postprocess.py
+"""
+Post-render processing of Manim's MP4 output for fast browser playback:
+
+- faststart: move the moov atom to the front so playback can begin before
+  the whole file is downloaded (stream copy, no re-encode)
+- poster: a JPEG frame for the <video> poster attribute
+- HLS (optional): adaptive renditions no taller than the source, encoded
+  with the tier's encoder profile at capped bitrates
+
+Every step is best-effort. A failed step is logged and skipped, and the
+original video is still delivered. The CPU, memory and I/O of all ffmpeg
+runs are reported in PostProcessResult.usage.
+"""
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.config import (
+    FFMPEG_BINARY,
+    FFPROBE_BINARY,
+    HLS_ENABLED,
+    HLS_RENDITIONS,
+    POSTPROCESS_ENABLED,
+    POSTPROCESS_TIMEOUT,
+    THUMBNAIL_ENABLED,
+)
+from app.core import accounting, metrics, tracing
+from app.core.encoding import EncoderProfile, PROFILES
+from app.core.logging import logger
+
+HLS_SEGMENT_SECONDS = 4
+# Renditions of tiers that keep Manim's encoder ("manim" profile) are encoded with this
+HLS_ENCODER = EncoderProfile("hls", preset="veryfast")
+
+
+@dataclass
+class PostProcessResult:
+    video_path: str
+    poster_path: Optional[str] = None
+    hls_dir: Optional[str] = None  # contains master.m3u8 and one sub-directory per rendition
+    timings: Dict[str, float] = field(default_factory=dict)
+    usage: Optional[accounting.Usage] = None
+
+
+def parse_renditions(spec: str) -> List[Tuple[int, str]]:
+    """"1080:5000k,720:2800k" -> [(1080, "5000k"), (720, "2800k")]"""
+    renditions = []
+    for item in spec.split(","):
+        if item.strip():
+            height, bitrate = item.strip().split(":")
+            renditions.append((int(height), bitrate))
+    return renditions
+
+
+def _bitrate_bps(bitrate: str) -> int:
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(bitrate[-1].lower(), 1)
+    digits = bitrate[:-1] if multiplier != 1 else bitrate
+    return int(float(digits) * multiplier)
+
+
+def _ffmpeg(args: List[str]) -> subprocess.CompletedProcess:
+    return accounting.run(
+        [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", *args],
+        text=True, timeout=POSTPROCESS_TIMEOUT,
+    )
+
+
+def _step(name: str, quality_dir: str, timings: Dict[str, float], fn, *args):
+    """Runs one step, recording its time; returns its result or None on failure."""
+    started = time.monotonic()
+    with tracing.start_span(f"postprocess.{name}", quality=quality_dir) as span:
+        try:
+            result = fn(*args)
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            span.error = str(e)
+            logger.warning("Post-processing step %s failed: %s", name, e)
+            result = None
+    elapsed = time.monotonic() - started
+    timings[name] = round(elapsed, 3)
+    metrics.POSTPROCESS_SECONDS.labels(quality_dir, name).observe(elapsed)
+    return result
+
+
+def apply_faststart(video_path: str, output_path: str) -> str:
+    completed = _ffmpeg(["-i", video_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", output_path])
+    if completed.returncode != 0 or not os.path.exists(output_path):
+        raise subprocess.SubprocessError(completed.stderr.strip() or "ffmpeg faststart failed")
+    return output_path
+
+
+def extract_poster(video_path: str, output_path: str) -> str:
+    # One second in skips the blank first frame most scenes start with;
+    # very short clips fall back to the first frame.
+    for offset in ("1", "0"):
+        completed = _ffmpeg([
+            "-ss", offset, "-i", video_path, "-frames:v", "1",
+            "-vf", "scale=-2:'min(720,ih)'", "-q:v", "3", output_path,
+        ])
+        if completed.returncode == 0 and os.path.exists(output_path):
+            return output_path
+    raise subprocess.SubprocessError(completed.stderr.strip() or "ffmpeg produced no poster frame")
+
+
+def package_hls(video_path: str, output_dir: str, source_height: int, encoder: EncoderProfile = None) -> str:
+    if encoder is None or encoder == PROFILES["manim"]:
+        encoder = HLS_ENCODER
+    renditions = [r for r in parse_renditions(HLS_RENDITIONS) if r[0] <= source_height]
+    if not renditions:
+        raise ValueError(f"No HLS rendition fits a {source_height}p source")
+
+    master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for height, bitrate in renditions:
+        name = f"{height}p"
+        rendition_dir = os.path.join(output_dir, name)
+        os.makedirs(rendition_dir, exist_ok=True)
+        completed = _ffmpeg([
+            "-i", video_path,
+            "-vf", f"scale=-2:{height}",
+            *encoder.ffmpeg_args(rate_control=False),
+            "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", f"{2 * _bitrate_bps(bitrate)}",
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+            "-c:a", "aac", "-b:a", "128k",
+            "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(rendition_dir, "seg_%03d.ts"),
+            os.path.join(rendition_dir, "index.m3u8"),
+        ])
+        if completed.returncode != 0:
+            raise subprocess.SubprocessError(completed.stderr.strip() or f"ffmpeg HLS {name} failed")
+        width = int(round(height * 16 / 9 / 2)) * 2
+        master.append(f"#EXT-X-STREAM-INF:BANDWIDTH={_bitrate_bps(bitrate)},RESOLUTION={width}x{height}")
+        master.append(f"{name}/index.m3u8")
+
+    with open(os.path.join(output_dir, "master.m3u8"), "w", encoding="utf-8") as f:
+        f.write("\n".join(master) + "\n")
+    return output_dir
+
+
+def concat_videos(video_paths: List[str], output_path: str) -> str:
+    """
+    Joins videos end to end without re-encoding. The parts come from the same
+    quality preset, so their codec parameters match and a stream copy is valid.
+    """
+    list_path = output_path + ".txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in video_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    completed = _ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path])
+    if completed.returncode != 0 or not os.path.exists(output_path):
+        raise subprocess.SubprocessError(completed.stderr.strip() or "ffmpeg concat failed")
+    return output_path
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def count_frames(video_path: str) -> Optional[int]:
+    """Frames in the first video stream, from the MP4 header (no decoding); None if ffprobe can't tell."""
+    try:
+        completed = subprocess.run(
+            [FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=nb_frames",
+             "-of", "default=noprint_wrappers=1:nokey=1", video_path],
+            capture_output=True, text=True, timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    value = completed.stdout.strip()
+    return int(value) if completed.returncode == 0 and value.isdigit() else None
+
+
+def postprocess_video(video_path: str, work_dir: str, quality_dir: str,
+                      encoder: EncoderProfile = None) -> PostProcessResult:
+    """
+    Prepares a rendered video for delivery. `quality_dir` is Manim's output
+    directory name (e.g. "1080p60"), used for the source height and metric labels.
+    `encoder` is the tier's profile, used by steps that re-encode.
+    """
+    result = PostProcessResult(video_path=video_path)
+    if not POSTPROCESS_ENABLED:
+        return result
+    if not ffmpeg_available():
+        logger.warning("ffmpeg not found (%s); uploading the video without post-processing", FFMPEG_BINARY)
+        return result
+    with accounting.collect() as usage:
+        _postprocess(result, work_dir, quality_dir, encoder)
+    result.usage = usage
+    logger.info("Post-processed %s (%s): %s", os.path.basename(result.video_path), quality_dir, result.timings)
+    return result
+
+
+def _postprocess(result: PostProcessResult, work_dir: str, quality_dir: str, encoder: Optional[EncoderProfile]):
+    video_path = result.video_path
+    output_dir = os.path.join(work_dir, "delivery")
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+
+    faststart_path = _step("faststart", quality_dir, result.timings, apply_faststart,
+                           video_path, os.path.join(output_dir, f"{stem}.mp4"))
+    if faststart_path:
+        result.video_path = faststart_path
+
+    if THUMBNAIL_ENABLED:
+        result.poster_path = _step("poster", quality_dir, result.timings, extract_poster,
+                                   result.video_path, os.path.join(output_dir, f"{stem}.jpg"))
+
+    if HLS_ENABLED:
+        source_height = int(quality_dir.split("p")[0])
+        result.hls_dir = _step("hls", quality_dir, result.timings, package_hls,
+                               result.video_path, os.path.join(output_dir, "hls"), source_height, encoder)
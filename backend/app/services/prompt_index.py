@@ -0,0 +1,406 @@
+# app/services/prompt_index.py
+"""
+Near-duplicate prompt index. When a new prompt says the same thing as an
+earlier one in different words, the earlier prompt's successfully rendered
+code is reused.
+
+Each prompt becomes a set of math-aware tokens: "x²" and "x**2" both
+become "x^2", and filler words such as "show" or "visualize" are dropped.
+Two prompts are compared by the Jaccard similarity of their token sets.
+MinHash with banded LSH finds the candidates. Each candidate is then scored
+exactly against its stored token hashes, and the best one at or above
+PROMPT_INDEX_THRESHOLD wins.
+
+Jaccard alone would reuse code across prompts that differ only in the math
+("derivative of x^2" and "derivative of x^3" share most words). So the math
+tokens of a prompt (numbers, powers, single-letter variables, function names
+and terms such as tangent or secant) must be identical before it is scored.
+
+Memory is bounded. The index is a ring of PROMPT_INDEX_MAX_ENTRIES slots
+kept in flat arrays; once it is full, the oldest entry is overwritten. The
+LSH buckets are open-addressing tables whose chains link slots newest
+first, so an overwritten slot ends every chain that still passes through it.
+
+Entries are shared through Redis:
+- the generation stage (app.generation, on the workers serving
+  GENERATION_QUEUE) looks up each prompt and records the prompt of each job
+  whose code the LLM generated;
+- the render worker publishes that prompt to a capped stream once the render
+  succeeds (the generation stage publishes directly on a render cache hit);
+- a background thread in every generation worker process follows the stream
+  and adds new entries to its local index. A fresh process catches up without
+  blocking jobs; until then, it simply misses more often.
+
+Code is stored once per SHA-256, with a TTL.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+import redis
+from app.config import (
+    PROMPT_INDEX_CODE_TTL,
+    PROMPT_INDEX_ENABLED,
+    PROMPT_INDEX_MAX_ENTRIES,
+    PROMPT_INDEX_THRESHOLD,
+    REDIS_URL,
+)
+from app.core.logging import logger
+
+PENDING_KEY_PREFIX = "manimate:prompt_index:pending:"
+CODE_KEY_PREFIX = "manimate:prompt_index:code:"
+ENTRIES_STREAM = "manimate:prompt_index:entries"
+PENDING_TTL = 3600
+SYNC_INTERVAL = 1.0  # longest a stream read blocks before retrying
+SYNC_BATCH = 1000
+
+BANDS, ROWS = 6, 3  # P(candidate) is 0.96 at similarity 0.75, 0.55 at 0.5 and 0.09 at 0.25
+EXACT = BANDS  # one more table keyed by the whole token set: rewordings usually normalize to the same set
+TABLES = BANDS + 1
+MAX_TOKENS = 16  # bottom-k token hashes kept per prompt, stored as 32 bits
+MIN_TOKENS = 2  # one-word prompts are too ambiguous to reuse code for
+MAX_CHAIN = 64  # newest entries examined per bucket
+MERSENNE = (1 << 61) - 1
+MASK64 = (1 << 64) - 1
+
+_rng = random.Random(0x6D616E69)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE), _rng.randrange(0, MERSENNE)) for _ in range(BANDS * ROWS)]
+
+STOPWORDS = frozenset("""
+a an the of as to for in on at by with and or is are be it its this that these those what why how
+show shows visualize visualise visualization animate animation animated explain explanation demonstrate
+illustrate illustration draw create make display render video visual visually please me us we i can
+using use used step steps simple nice beautiful clear clearly concept idea y
+""".split())
+SUPERSCRIPTS = str.maketrans({"²": "^2", "³": "^3", "⁴": "^4", "π": " pi ", "θ": " theta "})
+TOKEN_RE = re.compile(r"[a-z0-9^.]+")
+# Tokens that change what is drawn; prompts must agree on all of them (besides numbers, powers and variables)
+MATH_TERMS = frozenset("""
+sin sine cos cosine tan tangent sec secant csc cosecant cot cotangent arcsin arccos arctan sinh cosh tanh
+log logarithm ln exp exponential sqrt root abs chord normal pi theta first second third nth
+one two three four five six seven eight nine ten
+""".split())
+
+
+# -------------------------------
+# Tokens and signatures
+# -------------------------------
+def normalize_tokens(prompt: str) -> List[str]:
+    """Distinct content tokens of a prompt, with powers written as "x^2"."""
+    text = prompt.lower().translate(SUPERSCRIPTS).replace("**", "^")
+    text = re.sub(r"\s*\^\s*", "^", text)
+    tokens = set()
+    for token in TOKEN_RE.findall(text):
+        token = token.strip(".")
+        if not token or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "is", "us")):
+            token = token[:-1]  # lines -> line, derivatives -> derivative
+        tokens.add(token)
+    return sorted(tokens)
+
+
+def math_tokens(tokens: List[str]) -> List[str]:
+    """The tokens two prompts must share for one's code to fit the other: numbers, powers, variables, functions."""
+    return [token for token in tokens
+            if token in MATH_TERMS or len(token) == 1 or any(c.isdigit() or c == "^" for c in token)]
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _sketch(tokens: List[str]) -> List[int]:
+    """Bottom-k 64-bit token hashes: a fixed-size stand-in for the token set."""
+    return sorted(_token_hash(token) for token in tokens)[:MAX_TOKENS]
+
+
+def _mix(values: List[int], seed: int) -> int:
+    key = seed
+    for value in values:
+        key = (key * 0x9E3779B97F4A7C15 + value) & MASK64
+    return key or 1  # 0 marks an empty table cell
+
+
+def _table_keys(hashes: List[int]) -> List[int]:
+    """One key per LSH band, then the exact-set key."""
+    signature = [min((a * h + b) % MERSENNE for h in hashes) for a, b in PERMUTATIONS]
+    keys = [_mix(signature[band * ROWS:(band + 1) * ROWS], band) for band in range(BANDS)]
+    keys.append(_mix(hashes, EXACT))
+    return keys
+
+
+def _short(hashes: List[int]) -> List[int]:
+    return [h & 0xFFFFFFFF for h in hashes]
+
+
+def _style_hash(style: str) -> int:
+    return _token_hash(style) & 0xFFFFFFFF
+
+
+def _math_hash(tokens: List[str]) -> int:
+    return _mix(sorted(_token_hash(token) for token in math_tokens(tokens)), TABLES) & 0xFFFFFFFF
+
+
+# -------------------------------
+# In-memory index
+# -------------------------------
+@dataclass
+class IndexHit:
+    code_id: str
+    score: float
+
+
+class PromptIndex:
+    """Fixed-capacity MinHash/LSH index over prompt token sets."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 1)
+        self.table_size = 1 << (2 * self.capacity - 1).bit_length()
+        self._mask = self.table_size - 1
+        self._table_keys = [array("Q", bytes(8 * self.table_size)) for _ in range(TABLES)]
+        self._table_heads = [array("i", [-1]) * self.table_size for _ in range(TABLES)]
+        self._table_used = [0] * TABLES
+        # Per slot
+        self._seq = array("Q", bytes(8 * self.capacity))  # insertion number, 0 = empty
+        self._slot_keys = array("Q", bytes(8 * self.capacity * TABLES))
+        self._next = array("i", [-1]) * (self.capacity * TABLES)
+        self._hashes = array("I", bytes(4 * self.capacity * MAX_TOKENS))
+        self._counts = array("B", bytes(self.capacity))
+        self._styles = array("I", bytes(4 * self.capacity))
+        self._maths = array("I", bytes(4 * self.capacity))
+        self._code_ids = bytearray(16 * self.capacity)
+        self._inserted = 0
+
+    def __len__(self) -> int:
+        return min(self._inserted, self.capacity)
+
+    def memory_bytes(self) -> int:
+        buffers = [*self._table_keys, *self._table_heads, self._seq, self._slot_keys, self._next,
+                   self._hashes, self._counts, self._styles, self._maths]
+        return sum(buf.itemsize * len(buf) for buf in buffers) + len(self._code_ids)
+
+    def _find_cell(self, table: int, key: int) -> int:
+        """The cell holding `key`, or the empty cell where it would go."""
+        keys = self._table_keys[table]
+        cell = key & self._mask
+        while keys[cell] != 0 and keys[cell] != key:
+            cell = (cell + 1) & self._mask
+        return cell
+
+    def _link(self, table: int, key: int, slot: int) -> None:
+        cell = self._find_cell(table, key)
+        if self._table_keys[table][cell] == 0:
+            self._table_keys[table][cell] = key
+            self._table_used[table] += 1
+        head = self._table_heads[table][cell]
+        self._next[slot * TABLES + table] = head if head != slot else -1
+        self._table_heads[table][cell] = slot
+
+    def _rebuild(self, table: int) -> None:
+        # Buckets whose entries were all overwritten still occupy cells; drop them
+        self._table_keys[table] = array("Q", bytes(8 * self.table_size))
+        self._table_heads[table] = array("i", [-1]) * self.table_size
+        self._table_used[table] = 0
+        live = sorted((self._seq[slot], slot) for slot in range(self.capacity) if self._seq[slot])
+        for _, slot in live:
+            self._link(table, self._slot_keys[slot * TABLES + table], slot)
+
+    def insert(self, prompt: str, code_id: str, style: str = "") -> bool:
+        tokens = normalize_tokens(prompt)
+        hashes = _sketch(tokens)
+        if len(hashes) < MIN_TOKENS:
+            return False
+        slot = self._inserted % self.capacity
+        self._inserted += 1
+        self._seq[slot] = self._inserted
+        self._counts[slot] = len(hashes)
+        self._hashes[slot * MAX_TOKENS:slot * MAX_TOKENS + len(hashes)] = array("I", _short(hashes))
+        self._styles[slot] = _style_hash(style)
+        self._maths[slot] = _math_hash(tokens)
+        self._code_ids[slot * 16:slot * 16 + 16] = bytes.fromhex(code_id)[:16].ljust(16, b"\0")
+        for table, key in enumerate(_table_keys(hashes)):
+            self._slot_keys[slot * TABLES + table] = key
+            self._link(table, key, slot)
+            if self._table_used[table] > self.table_size * 3 // 4:
+                self._rebuild(table)
+        return True
+
+    def _chain(self, table: int, key: int) -> Iterator[int]:
+        """Live slots in the bucket for `key`, newest first."""
+        cell = self._find_cell(table, key)
+        if self._table_keys[table][cell] == 0:
+            return
+        slot, newer, steps = self._table_heads[table][cell], None, 0
+        while slot >= 0 and steps < MAX_CHAIN:
+            # A reused slot is newer than its predecessor or sits in another bucket: the rest is gone
+            if self._slot_keys[slot * TABLES + table] != key or (newer is not None and self._seq[slot] >= newer):
+                return
+            yield slot
+            newer = self._seq[slot]
+            slot = self._next[slot * TABLES + table]
+            steps += 1
+
+    def _hit(self, slot: int, score: float) -> IndexHit:
+        return IndexHit(code_id=self._code_ids[slot * 16:slot * 16 + 16].hex(), score=score)
+
+    def lookup(self, prompt: str, style: str = "", threshold: float = PROMPT_INDEX_THRESHOLD) -> Optional[IndexHit]:
+        tokens = normalize_tokens(prompt)
+        hashes = _sketch(tokens)
+        if len(hashes) < MIN_TOKENS:
+            return None
+        query, style_hash, math_hash = set(_short(hashes)), _style_hash(style), _math_hash(tokens)
+        keys = _table_keys(hashes)
+        for slot in self._chain(EXACT, keys[EXACT]):
+            start = slot * MAX_TOKENS
+            if (self._styles[slot] == style_hash and self._maths[slot] == math_hash and self._counts[slot] == len(query)
+                    and query.issuperset(self._hashes[start:start + len(query)])):
+                return self._hit(slot, 1.0)
+
+        best, best_slot = threshold, None
+        candidates = {slot for band in range(BANDS) for slot in self._chain(band, keys[band])}
+        for slot in candidates:
+            count = self._counts[slot]
+            # Jaccard can be no higher than the ratio of the set sizes
+            if min(count, len(query)) < best * max(count, len(query)) or self._styles[slot] != style_hash:
+                continue
+            if self._maths[slot] != math_hash:
+                # Same words, other math: the code would draw something else
+                continue
+            start = slot * MAX_TOKENS
+            shared = len(query.intersection(self._hashes[start:start + count]))
+            score = shared / (len(query) + count - shared)
+            if score > best or (score == best and (best_slot is None or self._seq[slot] > self._seq[best_slot])):
+                best, best_slot = score, slot
+        return self._hit(best_slot, best) if best_slot is not None else None
+
+
+# -------------------------------
+# Shared index (Redis)
+# -------------------------------
+_redis_client = None
+_index: Optional[PromptIndex] = None  # allocated on first lookup; render-only workers never need it
+_index_lock = threading.Lock()
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def code_id_for(manim_code: str) -> str:
+    return hashlib.sha256(manim_code.encode("utf-8")).hexdigest()[:32]
+
+
+def record_pending(task_id: str, prompt: str, style: str, manim_code: str) -> None:
+    """Remembers which prompt produced this task's code until the render outcome is known."""
+    if not PROMPT_INDEX_ENABLED:
+        return
+    entry = json.dumps({"prompt": prompt, "style": style, "code": manim_code})
+    try:
+        _get_client().set(PENDING_KEY_PREFIX + task_id, entry, ex=PENDING_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not record prompt for the index: %s", e)
+
+
+def confirm(task_id: str) -> None:
+    """Render worker side: publishes the prompt of a successful render to every generation worker."""
+    if not PROMPT_INDEX_ENABLED:
+        return
+    try:
+        raw = _get_client().getdel(PENDING_KEY_PREFIX + task_id)
+    except redis.RedisError as e:
+        logger.warning("Could not read pending prompt: %s", e)
+        return
+    if raw:
+        entry = json.loads(raw)
+        publish(entry["prompt"], entry["style"], entry["code"])
+
+
+def publish(prompt: str, style: str, manim_code: str) -> None:
+    """Adds a prompt whose code is known to render to the index of every generation worker process."""
+    if not PROMPT_INDEX_ENABLED:
+        return
+    code_id = code_id_for(manim_code)
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        pipe.set(CODE_KEY_PREFIX + code_id, manim_code, ex=PROMPT_INDEX_CODE_TTL)
+        pipe.xadd(ENTRIES_STREAM, {"prompt": prompt, "style": style, "code_id": code_id},
+                  maxlen=PROMPT_INDEX_MAX_ENTRIES, approximate=True)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not publish prompt to the index: %s", e)
+
+
+def discard(task_id: str) -> None:
+    """Drops the pending prompt of a failed render, so its code is never reused."""
+    if not PROMPT_INDEX_ENABLED:
+        return
+    try:
+        _get_client().delete(PENDING_KEY_PREFIX + task_id)
+    except redis.RedisError as e:
+        logger.warning("Could not discard pending prompt: %s", e)
+
+
+def _follow_stream() -> None:
+    """Background thread: folds new stream entries into the local index as they arrive."""
+    last_entry_id = "0-0"
+    while True:
+        try:
+            response = _get_client().xread({ENTRIES_STREAM: last_entry_id}, count=SYNC_BATCH,
+                                           block=int(SYNC_INTERVAL * 1000))
+        except redis.RedisError as e:
+            logger.warning("Could not sync the prompt index: %s", e)
+            time.sleep(SYNC_INTERVAL)
+            continue
+        for entry_id, fields in response[0][1] if response else []:
+            # Locked per entry, so a catch-up of the whole stream never stalls lookups
+            with _index_lock:
+                _index.insert(fields[b"prompt"].decode("utf-8"), fields[b"code_id"].decode("ascii"),
+                              fields[b"style"].decode("utf-8"))
+            last_entry_id = entry_id
+
+
+def _ensure_following() -> None:
+    global _index
+    if _index is not None:
+        return
+    with _index_lock:
+        if _index is None:
+            _index = PromptIndex(PROMPT_INDEX_MAX_ENTRIES)
+            threading.Thread(target=_follow_stream, name="prompt-index-sync", daemon=True).start()
+
+
+@dataclass
+class SimilarPrompt:
+    code: str
+    score: float
+
+
+def find_similar(prompt: str, style: str = "") -> Optional[SimilarPrompt]:
+    """Validated code from an earlier, similar enough prompt, or None."""
+    if not PROMPT_INDEX_ENABLED:
+        return None
+    _ensure_following()
+    with _index_lock:
+        hit = _index.lookup(prompt, style)
+    if hit is None:
+        return None
+    try:
+        client = _get_client()
+        code = client.get(CODE_KEY_PREFIX + hit.code_id)
+        if code is not None:
+            client.expire(CODE_KEY_PREFIX + hit.code_id, PROMPT_INDEX_CODE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not read indexed code: %s", e)
+        return None
+    # The code may have expired while its prompt was still indexed
+    return SimilarPrompt(code=code.decode("utf-8"), score=hit.score) if code is not None else None
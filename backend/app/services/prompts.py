@@ -0,0 +1,501 @@
+# app/services/prompts.py
+"""
+The generation prompt, with few-shot examples chosen per request.
+
+Embedding every example and every guideline line in every prompt costs input
+tokens and time to first token for text the request does not need. Instead:
+
+- Examples come from a library of FewShotExample entries, each tagged with the
+  PromptValidator.MATH_KEYWORDS domains it demonstrates. A request's domains
+  are its keyword hits (templates.detect_domains) plus the domains of its
+  style. The best-scoring PROMPT_MAX_EXAMPLES examples are used; a prompt that
+  matches none gets the first example of the library.
+- Only the guideline line of the requested quality and the lines of the
+  requested and detected styles are included, and only the animation patterns
+  relevant to the detected domains. The technical requirements are always
+  included: they are what keeps the generated code valid.
+
+The library is extensible: register_example() adds an entry, and every .py file
+in PROMPT_EXAMPLES_DIR whose header names its domains is loaded on first use:
+
+    # title: Unit Circle and the Sine Wave
+    # domains: trigonometry, calculus
+    from manim import *
+    ...
+
+PROMPT_FEW_SHOT=full builds the original prompt (both classic examples and all
+guidelines), and PROMPT_FULL_SAMPLE_RATE sends that share of requests through
+it as a control group. Both variants are labelled in the prompt size and
+candidate outcome metrics, so the token savings and the validation pass rate
+can be compared. benchmarks/prompt_tokens.py measures both offline.
+"""
+import math
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.config import PROMPT_EXAMPLES_DIR, PROMPT_FEW_SHOT, PROMPT_FULL_SAMPLE_RATE, PROMPT_MAX_EXAMPLES
+from app.core.logging import logger
+from app.services.templates import detect_domains
+
+DYNAMIC = "dynamic"
+FULL = "full"
+
+# The requested style counts as this many keyword hits on each of its domains
+STYLE_WEIGHT = 2
+
+
+@dataclass
+class FewShotExample:
+    name: str
+    title: str
+    domains: Tuple[str, ...]  # MATH_KEYWORDS domains this example demonstrates
+    code: str
+
+
+# -------------------------------
+# Example library
+# -------------------------------
+EXAMPLE_ALGEBRA = """
+from manim import *
+
+class PythagoreanProof(Scene):
+    def construct(self):
+        # Step 1: Introduce the theorem
+        title = Title("Visual Proof of the Pythagorean Theorem")
+        self.play(Write(title))
+
+        # Step 2: Set up the triangle dimensions
+        a, b = 2.0, 3.0
+        c = np.sqrt(a**2 + b**2)
+
+        # Step 3: Create visual squares representing a² and b²
+        sq_a = Square(side_length=a, fill_color=BLUE,
+                      fill_opacity=0.8).shift(LEFT * (b/2 + a/2))
+        sq_b = Square(side_length=b, fill_color=GREEN,
+                      fill_opacity=0.8).next_to(sq_a, RIGHT, buff=0)
+
+        # Step 4: Add the right triangle to complete the visual
+        triangle = Polygon(sq_a.get_corner(UR), sq_b.get_corner(UL), sq_b.get_corner(DL),
+                          stroke_color=WHITE, fill_color=YELLOW, fill_opacity=0.8)
+
+        self.play(Create(sq_a), Create(sq_b), run_time=1.5)
+        self.play(Create(triangle))
+
+        # Step 5: Visual transformation showing a² + b² = c²
+        rearranged_group = VGroup(sq_a.copy(), sq_b.copy())
+        sq_c = Square(side_length=c, fill_color=RED, fill_opacity=0.8)
+
+        self.play(Transform(rearranged_group, sq_c))
+
+        # Step 6: Display the mathematical conclusion
+        formula = MathTex("a^2", "+", "b^2", "=",
+                          "c^2").next_to(title, DOWN, buff=0.5)
+        formula[0].set_color(BLUE)
+        formula[2].set_color(GREEN)
+        formula[4].set_color(RED)
+        self.play(Write(formula))
+        self.wait(2)
+"""
+
+EXAMPLE_CALCULUS = """
+from manim import *
+
+class DerivativeVisualization(Scene):
+    def construct(self):
+        # Step 1: Set up coordinate system
+        axes = Axes(x_range=[-4, 4, 1], y_range=[-1, 7, 1],
+                    axis_config={"color": BLUE})
+        parabola = axes.plot(lambda x: x**2, color=WHITE, stroke_width=3)
+
+        # Step 2: Create dynamic tracking system
+        x_tracker = ValueTracker(-2)
+
+        # Step 3: Define the tangent line that updates dynamically
+        tangent_line = always_redraw(
+            lambda: axes.get_secant_slope_group(
+                x=x_tracker.get_value(),
+                graph=parabola,
+                dx=0.01,
+                secant_line_color=YELLOW,
+                secant_line_length=4,
+            )
+        )
+
+        # Step 4: Add a tracking dot
+        tracking_dot = always_redraw(
+            lambda: Dot(color=RED).move_to(
+                axes.c2p(x_tracker.get_value(), x_tracker.get_value()**2)
+            )
+        )
+
+        # Step 5: Build the scene progressively
+        self.play(Create(axes), Create(parabola))
+        self.play(Create(tracking_dot), Create(tangent_line))
+        self.wait(1)
+
+        # Step 6: Animate the key insight - derivative as slope
+        self.play(x_tracker.animate.set_value(2), run_time=5)
+
+        # Step 7: Add explanatory text
+        explanation = Text(
+            "Derivative = Slope of Tangent Line", font_size=24).to_edge(UP)
+        self.play(Write(explanation))
+        self.wait(2)
+"""
+
+EXAMPLE_EQUATION = """
+from manim import *
+
+class SolveLinearEquation(Scene):
+    def construct(self):
+        # Step 1: State the problem
+        title = Text("Solving 2x + 3 = 7", font_size=36).to_edge(UP)
+        self.play(Write(title))
+
+        # Step 2: Each line is one step of the derivation
+        steps = [
+            MathTex(r"2x + 3 = 7"),
+            MathTex(r"2x = 7 - 3"),
+            MathTex(r"2x = 4"),
+            MathTex(r"x = \\frac{4}{2}"),
+            MathTex(r"x = 2"),
+        ]
+        current = steps[0].scale(1.4)
+        self.play(Write(current))
+        self.wait(1)
+
+        # Step 3: Transform each step into the next, matching common symbols
+        for step in steps[1:]:
+            step.scale(1.4)
+            self.play(TransformMatchingTex(current, step), run_time=1.5)
+            current = step
+            self.wait(0.5)
+
+        # Step 4: Highlight the solution
+        box = SurroundingRectangle(current, color=YELLOW, buff=0.2)
+        self.play(Create(box))
+        self.wait(2)
+"""
+
+EXAMPLE_TRIGONOMETRY = """
+from manim import *
+
+class UnitCircleSine(Scene):
+    def construct(self):
+        # Step 1: Unit circle on the left, axes for the sine wave on the right
+        circle = Circle(radius=1, color=BLUE).shift(LEFT * 4)
+        axes = Axes(x_range=[0, TAU, PI / 2], y_range=[-1.5, 1.5, 0.5],
+                    x_length=6, y_length=3).shift(RIGHT * 2)
+        self.play(Create(circle), Create(axes))
+
+        # Step 2: The angle drives everything
+        theta = ValueTracker(0)
+
+        # Step 3: A point on the circle and its height
+        dot = always_redraw(lambda: Dot(
+            circle.point_at_angle(theta.get_value()), color=YELLOW))
+        height = always_redraw(lambda: Line(
+            [dot.get_x(), circle.get_center()[1], 0], dot.get_center(), color=RED))
+
+        # Step 4: The sine wave traced so far, joined to the circle
+        wave = always_redraw(lambda: axes.plot(
+            np.sin, x_range=[0, max(theta.get_value(), 0.01)], color=RED))
+        link = always_redraw(lambda: DashedLine(
+            dot.get_center(), axes.c2p(theta.get_value(), np.sin(theta.get_value())), color=GRAY))
+
+        label = MathTex(r"y = \\sin(\\theta)", color=RED).next_to(axes, UP)
+        self.play(Create(dot), Create(height), Write(label))
+        self.add(wave, link)
+
+        # Step 5: One full turn traces one period
+        self.play(theta.animate.set_value(TAU), run_time=6, rate_func=linear)
+        self.wait(2)
+"""
+
+EXAMPLE_LINEAR_ALGEBRA = """
+from manim import *
+
+class MatrixTransformation(Scene):
+    def construct(self):
+        # Step 1: The plane and the two basis vectors
+        plane = NumberPlane(x_range=[-6, 6, 1], y_range=[-4, 4, 1])
+        i_hat = Vector([1, 0], color=GREEN)
+        j_hat = Vector([0, 1], color=RED)
+        self.play(Create(plane))
+        self.play(GrowArrow(i_hat), GrowArrow(j_hat))
+
+        # Step 2: Show the matrix being applied
+        matrix = [[1, 1], [0, 1]]
+        label = MathTex(r"A = \\begin{bmatrix} 1 & 1 \\\\ 0 & 1 \\end{bmatrix}")
+        label.to_corner(UL).add_background_rectangle()
+        self.play(Write(label))
+
+        # Step 3: The whole plane moves with the basis vectors (a shear)
+        self.play(ApplyMatrix(matrix, VGroup(plane, i_hat, j_hat)), run_time=3)
+        self.wait(1)
+
+        # Step 4: The columns of A are where the basis vectors land
+        note = Text("Columns of A = images of the basis vectors", font_size=24)
+        note.to_edge(DOWN).add_background_rectangle()
+        self.play(Write(note))
+        self.wait(2)
+"""
+
+EXAMPLE_PROBABILITY = """
+from manim import *
+
+class DiceSumDistribution(Scene):
+    def construct(self):
+        # Step 1: Title and the outcomes of rolling two dice
+        title = Text("Sum of Two Dice", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        sums = list(range(2, 13))
+        ways = [6 - abs(7 - s) for s in sums]
+
+        # Step 2: Start from an empty histogram
+        chart = BarChart(
+            values=[0] * len(sums),
+            bar_names=[str(s) for s in sums],
+            y_range=[0, 6, 1],
+            x_length=9,
+            y_length=4,
+        ).next_to(title, DOWN)
+        self.play(Create(chart))
+
+        # Step 3: Grow the bars to the number of ways to roll each sum
+        self.play(chart.animate.change_bar_values(ways), run_time=3)
+
+        # Step 4: The distribution peaks at 7
+        peak = MathTex(r"P(7) = \\frac{6}{36} = \\frac{1}{6}", color=YELLOW).to_edge(DOWN)
+        self.play(Write(peak))
+        self.wait(2)
+"""
+
+# Order breaks score ties; the first entry is the fallback for prompts that match no domain
+EXAMPLES: List[FewShotExample] = [
+    FewShotExample("pythagorean_proof", "Geometric Proof", ("geometry",), EXAMPLE_ALGEBRA),
+    FewShotExample("derivative_tangent", "Calculus Concept", ("calculus",), EXAMPLE_CALCULUS),
+    FewShotExample("solve_equation", "Equation Derivation", ("algebra",), EXAMPLE_EQUATION),
+    FewShotExample("unit_circle_sine", "Trigonometric Function", ("trigonometry",), EXAMPLE_TRIGONOMETRY),
+    FewShotExample("matrix_transformation", "Linear Transformation", ("linear_algebra",), EXAMPLE_LINEAR_ALGEBRA),
+    FewShotExample("dice_distribution", "Probability Distribution", ("statistics",), EXAMPLE_PROBABILITY),
+]
+
+# The examples of the original prompt, used for PROMPT_FEW_SHOT=full
+FULL_EXAMPLES = ("pythagorean_proof", "derivative_tangent")
+
+_HEADER = re.compile(r"^#\s*(title|domains)\s*:\s*(.+)$")
+_directory_loaded = False
+
+
+def register_example(example: FewShotExample) -> None:
+    """Adds an example to the library, replacing one of the same name."""
+    for index, existing in enumerate(EXAMPLES):
+        if existing.name == example.name:
+            EXAMPLES[index] = example
+            return
+    EXAMPLES.append(example)
+
+
+def load_examples(directory: str) -> int:
+    """Registers every example file in `directory` (see the module docstring). Returns how many were loaded."""
+    loaded = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".py"):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            code = f.read()
+        header = {}
+        for line in code.splitlines():
+            match = _HEADER.match(line.strip())
+            if not match:
+                break
+            header[match.group(1)] = match.group(2).strip()
+        domains = tuple(d.strip() for d in header.get("domains", "").split(",") if d.strip())
+        if not domains or "from manim import" not in code:
+            logger.warning("Skipping few-shot example %s: it needs a '# domains:' header and Manim code", path)
+            continue
+        name = filename[:-3]
+        title = header.get("title") or name.replace("_", " ").title()
+        register_example(FewShotExample(name, title, domains, code.strip()))
+        loaded += 1
+    return loaded
+
+
+def _library() -> List[FewShotExample]:
+    global _directory_loaded
+    if not _directory_loaded:
+        _directory_loaded = True
+        if PROMPT_EXAMPLES_DIR:
+            try:
+                logger.info("Loaded %d few-shot examples from %s", load_examples(PROMPT_EXAMPLES_DIR), PROMPT_EXAMPLES_DIR)
+            except OSError as e:
+                logger.warning("Could not load few-shot examples from %s: %s", PROMPT_EXAMPLES_DIR, e)
+    return EXAMPLES
+
+
+# -------------------------------
+# Guidelines
+# -------------------------------
+QUALITY_GUIDELINES = {
+    "draft": "Basic visualization, minimal comments",
+    "polished": "Smooth animations, clear explanations, good pacing",
+    "3b1b-style": "Elegant visual storytelling, multiple \"reveal\" moments",
+    "minimal": "Simple, clean, focused on core concept",
+}
+# Render quality names (app.core.quality) that share a guideline
+QUALITY_ALIASES = {"low": "draft", "medium": "polished", "high": "3b1b-style", "production": "3b1b-style"}
+
+STYLE_GUIDELINES = {
+    "educational": "Emphasize step-by-step learning",
+    "geometric": "Focus on shapes, transformations, spatial relationships",
+    "algebraic": "Show equation manipulations and symbolic reasoning",
+    "calculus": "Demonstrate limits, derivatives, integrals with dynamic elements",
+    "probability": "Use histograms, distributions, random processes",
+    "linear-algebra": "Vectors, matrices, transformations, basis changes",
+}
+STYLE_DOMAINS = {
+    "educational": (),
+    "geometric": ("geometry",),
+    "algebraic": ("algebra",),
+    "calculus": ("calculus",),
+    "probability": ("statistics",),
+    "linear-algebra": ("linear_algebra",),
+}
+
+# (pattern, domains it helps with); patterns without domains are always listed
+ANIMATION_PATTERNS = [
+    ("Dynamic function plotting with `always_redraw()`", ("calculus", "trigonometry", "statistics")),
+    ("Geometric transformations and morphing", ("geometry", "linear_algebra")),
+    ("Step-by-step equation derivations", ("algebra", "calculus")),
+    ("Interactive elements with `ValueTracker`", ("calculus", "trigonometry", "linear_algebra")),
+    ("Progressive revelation techniques", ()),
+    ("Mathematical theorem proofs", ("geometry", "algebra")),
+]
+
+PROMPT_TEMPLATE = """
+You are an expert Manim developer and visual educator in the style of 3Blue1Brown. Generate a complete Python script for a Manim Community animation.
+
+**ANALYSIS PHASE - Follow this Chain of Thought:**
+
+1. **Concept Deconstruction**: What mathematical concept needs visualization?
+2. **Visual Insight Discovery**: What's the "aha!" moment that makes this concept click?
+3. **Educational Flow Planning**: How should the explanation unfold step-by-step?
+4. **Pattern Recognition**: Which animation template best fits this concept?
+
+**QUALITY REQUIREMENTS:**
+- Quality Level: {quality}
+- Style Focus: {style}
+- Detail Level: {detail_level}
+
+{guidelines}
+**TECHNICAL REQUIREMENTS:**
+- Import: `from manim import *` only
+- Class name must be descriptive and CamelCase
+- Add step-by-step comments explaining the educational purpose
+- Use meaningful variable names
+- Include proper timing with `run_time` and `wait()`
+- Color code related elements for visual clarity
+-**CRITICAL: For all `MathTex` objects, ensure the string is a raw string (e.g., `r"..."`) and that all LaTeX syntax is 100% valid. Double-check all backslashes and special characters.**
+-**CRITICAL: To set the color of a mobject created by a helper method (like `Brace.get_tex` or `Axes.get_graph_label`), you must do it in two steps. First, create the object. Second, set its color. Example: `label = brace.get_tex("My Label"); label.set_color(BLUE)`**
+
+**Animation Patterns Available:**
+{patterns}
+
+**{examples_heading}:**
+
+{examples}
+
+**User Request**: {user_prompt}
+
+**Generate the complete, educational Python script now:**
+"""
+
+
+# -------------------------------
+# Selection
+# -------------------------------
+def request_domains(prompt: str, style: str) -> Dict[str, int]:
+    """Weight per MATH_KEYWORDS domain: the prompt's keyword hits plus STYLE_WEIGHT for the style's domains."""
+    weights = {domain: hits for domain, hits in detect_domains(prompt).items() if domain != "general"}
+    for domain in STYLE_DOMAINS.get(style, ()):
+        weights[domain] = weights.get(domain, 0) + STYLE_WEIGHT
+    return weights
+
+
+def select_examples(prompt: str, style: str, limit: Optional[int] = None) -> List[FewShotExample]:
+    """The `limit` (PROMPT_MAX_EXAMPLES) examples that best cover the request's domains, best first."""
+    limit = PROMPT_MAX_EXAMPLES if limit is None else limit
+    library = _library()
+    weights = request_domains(prompt, style)
+    scored = [(sum(weights.get(domain, 0) for domain in example.domains), index, example)
+              for index, example in enumerate(library)]
+    chosen = [example for score, _, example in sorted(scored, key=lambda item: (-item[0], item[1])) if score > 0]
+    return (chosen or library[:1])[:max(limit, 1)]
+
+
+def _guidelines(quality: str, style: str, weights: Dict[str, int]) -> str:
+    quality = QUALITY_ALIASES.get(quality, quality)
+    styles = [style] + [name for name, domains in STYLE_DOMAINS.items()
+                        if name != style and any(domain in weights for domain in domains)]
+    sections = []
+    if quality in QUALITY_GUIDELINES:
+        sections.append(f"**Quality Level Guideline:**\n- **{quality}**: {QUALITY_GUIDELINES[quality]}\n")
+    lines = [f"- **{name}**: {STYLE_GUIDELINES[name]}" for name in styles if name in STYLE_GUIDELINES]
+    if lines:
+        sections.append("**Style Focus Guidelines:**\n" + "\n".join(lines) + "\n")
+    return "\n".join(sections)
+
+
+def _full_guidelines() -> str:
+    return ("**Quality Level Guidelines:**\n"
+            + "\n".join(f"- **{name}**: {text}" for name, text in QUALITY_GUIDELINES.items())
+            + "\n\n**Style Focus Guidelines:**\n"
+            + "\n".join(f"- **{name}**: {text}" for name, text in STYLE_GUIDELINES.items()) + "\n")
+
+
+def _examples_block(examples: List[FewShotExample]) -> str:
+    return "\n\n".join(f"**Example {number}: {example.title}**\n```python\n{example.code.strip()}\n```"
+                       for number, example in enumerate(examples, 1))
+
+
+def choose_mode() -> str:
+    """The prompt variant of one request: PROMPT_FEW_SHOT, with PROMPT_FULL_SAMPLE_RATE of requests on full."""
+    if PROMPT_FEW_SHOT == FULL or random.random() < PROMPT_FULL_SAMPLE_RATE:
+        return FULL
+    return DYNAMIC
+
+
+def build_prompt(prompt: str, quality: str, style: str, detail_level: str, mode: str = DYNAMIC) -> Tuple[str, List[str]]:
+    """The generation prompt and the names of the examples it embeds."""
+    if mode == FULL:
+        library = {example.name: example for example in EXAMPLES}
+        examples = [library[name] for name in FULL_EXAMPLES]
+        guidelines = _full_guidelines()
+        patterns = [pattern for pattern, _ in ANIMATION_PATTERNS]
+    else:
+        weights = request_domains(prompt, style)
+        examples = select_examples(prompt, style)
+        guidelines = _guidelines(quality, style, weights)
+        patterns = [pattern for pattern, domains in ANIMATION_PATTERNS
+                    if not domains or not weights or any(domain in weights for domain in domains)]
+    text = PROMPT_TEMPLATE.format(
+        user_prompt=prompt,
+        quality=quality,
+        style=style,
+        detail_level=detail_level,
+        guidelines=guidelines,
+        patterns="\n".join(f"- {pattern}" for pattern in patterns),
+        examples_heading="Examples" if len(examples) > 1 else "Example",
+        examples=_examples_block(examples),
+    )
+    return text, [example.name for example in examples]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and code)."""
+    return math.ceil(len(text) / 4)
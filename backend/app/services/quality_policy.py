@@ -0,0 +1,153 @@
+# app/services/quality_policy.py
+"""
+Load-adaptive quality selection in front of the render queue.
+
+Pressure is read from the depth of all render queues and, when
+RENDER_WORKER_SLOTS is configured, from fleet-wide render slot utilization
+(an active-render counter in Redis kept by the workers). Each QUALITY_DEGRADE_QUEUE_DEPTHS
+threshold the queue crosses moves a request one rung down QUALITY_LADDER.
+The numbers are cached for a second, so a burst of requests costs at most
+one Redis round trip per second.
+"""
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import redis
+from app.config import (
+    QUALITY_DEGRADATION_ENABLED,
+    QUALITY_DEGRADE_QUEUE_DEPTHS,
+    QUALITY_DEGRADE_UTILIZATION,
+    QUALITY_LADDER,
+    REDIS_URL,
+    RENDER_WORKER_SLOTS,
+)
+from app.core.logging import logger
+from app.core.quality import QUALITY_MAP
+from app.services.queue_stats import get_total_depth
+
+ACTIVE_RENDERS_KEY = "manimate:active_renders"
+SNAPSHOT_TTL = 1.0
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def _parse_list(spec: str) -> List[str]:
+    return [item.strip() for item in spec.split(",") if item.strip()]
+
+
+LADDER = _parse_list(QUALITY_LADDER)
+QUEUE_DEPTH_THRESHOLDS = sorted(int(item) for item in _parse_list(QUALITY_DEGRADE_QUEUE_DEPTHS))
+
+
+@dataclass
+class LoadSnapshot:
+    queue_depth: int  # -1 when the broker could not be reached
+    active_renders: int
+    utilization: Optional[float]  # None when RENDER_WORKER_SLOTS is not configured
+
+
+@dataclass
+class QualityDecision:
+    requested: str
+    quality: str
+    pressure_level: int
+
+    @property
+    def degraded(self) -> bool:
+        return self.quality != self.requested
+
+
+# -------------------------------
+# Active render accounting (workers)
+# -------------------------------
+def render_started() -> None:
+    try:
+        _get_client().incr(ACTIVE_RENDERS_KEY)
+    except redis.RedisError as e:
+        logger.warning("Could not record render start: %s", e)
+
+
+def render_finished() -> None:
+    try:
+        if _get_client().decr(ACTIVE_RENDERS_KEY) < 0:
+            # A worker died mid-render after a restart reset the counter
+            _get_client().set(ACTIVE_RENDERS_KEY, 0)
+    except redis.RedisError as e:
+        logger.warning("Could not record render end: %s", e)
+
+
+# -------------------------------
+# Load sampling
+# -------------------------------
+_snapshot: Optional[LoadSnapshot] = None
+_snapshot_at = 0.0
+
+
+def current_load() -> LoadSnapshot:
+    global _snapshot, _snapshot_at
+    now = time.monotonic()
+    if _snapshot is not None and now - _snapshot_at < SNAPSHOT_TTL:
+        return _snapshot
+
+    depth = get_total_depth()
+    try:
+        active = int(_get_client().get(ACTIVE_RENDERS_KEY) or 0)
+    except redis.RedisError as e:
+        logger.warning("Could not read active render count: %s", e)
+        active = 0
+    utilization = active / RENDER_WORKER_SLOTS if RENDER_WORKER_SLOTS > 0 else None
+    _snapshot, _snapshot_at = LoadSnapshot(depth, active, utilization), now
+    return _snapshot
+
+
+def pressure_level(load: LoadSnapshot) -> int:
+    """How many ladder rungs to drop: 0 when the queue keeps up."""
+    if load.queue_depth < 0:
+        return 0  # Unknown load: never degrade on a Redis outage
+    level = sum(1 for threshold in QUEUE_DEPTH_THRESHOLDS if load.queue_depth >= threshold)
+    saturated = load.utilization is not None and load.utilization >= QUALITY_DEGRADE_UTILIZATION
+    if saturated and load.queue_depth > 0:
+        level = max(level, 1)
+    return level
+
+
+# -------------------------------
+# Quality selection
+# -------------------------------
+def _ladder_position(quality: str) -> Optional[int]:
+    if quality in LADDER:
+        return LADDER.index(quality)
+    # Aliases such as "high" sit on the rung with the same Manim flag
+    flag = QUALITY_MAP.get(quality)
+    for position, rung in enumerate(LADDER):
+        if QUALITY_MAP.get(rung) == flag:
+            return position
+    return None
+
+
+def degrade_quality(quality: str, level: int) -> str:
+    position = _ladder_position(quality)
+    if position is None or level <= 0:
+        return quality
+    target = LADDER[min(position + level, len(LADDER) - 1)]
+    # Stepping onto a rung that renders identically is not a downgrade
+    return quality if QUALITY_MAP.get(target) == QUALITY_MAP.get(quality) else target
+
+
+def choose_quality(requested: str) -> QualityDecision:
+    if not QUALITY_DEGRADATION_ENABLED:
+        return QualityDecision(requested, requested, 0)
+    level = pressure_level(current_load())
+    return QualityDecision(requested, degrade_quality(requested, level), level)
+
+
+def under_pressure() -> bool:
+    return pressure_level(current_load()) > 0
@@ -0,0 +1,49 @@
+# app/services/queue_stats.py
+
+from typing import Dict, List
+
+import redis
+from app.config import GENERATION_QUEUE, REDIS_URL, RENDER_QUEUE_BASIC, RENDER_QUEUE_LATEX
+from app.core.logging import logger
+
+# Celery's default queue. With the Redis transport each queue is a plain list.
+DEFAULT_QUEUE = "celery"
+# Every queue render work can wait in (capability-routed queues plus the default), including
+# jobs still waiting for their generation stage: each becomes a render
+RENDER_QUEUES = [DEFAULT_QUEUE, RENDER_QUEUE_LATEX, RENDER_QUEUE_BASIC, GENERATION_QUEUE]
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def get_queue_depth(queue: str = DEFAULT_QUEUE) -> int:
+    """Number of messages waiting in a broker queue, or -1 if Redis is unreachable."""
+    try:
+        return int(_get_client().llen(queue))
+    except redis.RedisError as e:
+        logger.warning("Could not read depth of queue %s: %s", queue, e)
+        return -1
+
+
+def get_queue_depths(queues: List[str] = RENDER_QUEUES) -> Dict[str, int]:
+    """Depth of several queues in one round trip; -1 for each if Redis is unreachable."""
+    try:
+        pipeline = _get_client().pipeline(transaction=False)
+        for queue in queues:
+            pipeline.llen(queue)
+        return {queue: int(depth) for queue, depth in zip(queues, pipeline.execute())}
+    except redis.RedisError as e:
+        logger.warning("Could not read depth of queues %s: %s", queues, e)
+        return {queue: -1 for queue in queues}
+
+
+def get_total_depth(queues: List[str] = RENDER_QUEUES) -> int:
+    """Messages waiting across all render queues, or -1 if Redis is unreachable."""
+    depths = get_queue_depths(queues).values()
+    return -1 if any(depth < 0 for depth in depths) else sum(depths)
@@ -0,0 +1,61 @@
+# app/services/render_cache.py
+"""
+Cache of successful render results, keyed by what determines the video:
+the scene source, the scene class and the Manim quality flag.
+
+Workers upload artifacts under names derived from the same key, so a cached
+URL always points at the video it was recorded for. Template renders are
+deterministic and hit this cache most often.
+"""
+import hashlib
+import json
+from typing import Optional
+
+import redis
+from app.config import REDIS_URL, RENDER_CACHE_ENABLED, RENDER_CACHE_TTL
+from app.core.logging import logger
+from app.core.quality import QUALITY_MAP
+
+RENDER_CACHE_PREFIX = "manimate:render_cache:"
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def render_key(manim_code: str, scene_name: str, quality: str) -> str:
+    # Quality names with the same flag ("low", "draft") render identically
+    flag = QUALITY_MAP.get(quality, "-ql")
+    return hashlib.sha256(f"{flag}\0{scene_name}\0{manim_code}".encode("utf-8")).hexdigest()
+
+
+def artifact_name(scene_name: str, key: str) -> str:
+    """Storage name stem for a render, unique per key."""
+    return f"{scene_name}-{key[:12]}"
+
+
+def get_cached_render(key: str) -> Optional[dict]:
+    if not RENDER_CACHE_ENABLED:
+        return None
+    try:
+        raw = _get_client().get(RENDER_CACHE_PREFIX + key)
+    except redis.RedisError as e:
+        logger.warning("Could not read render cache: %s", e)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def store_render(key: str, result: dict) -> None:
+    if not RENDER_CACHE_ENABLED or result.get("status") != "success":
+        return
+    # Logs are large and specific to the original run
+    cached = {k: v for k, v in result.items() if k not in ("logs", "requested_quality")}
+    try:
+        _get_client().set(RENDER_CACHE_PREFIX + key, json.dumps(cached), ex=RENDER_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not store render in cache: %s", e)
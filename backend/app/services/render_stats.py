@@ -0,0 +1,79 @@
+# app/services/render_stats.py
+
+import redis
+from app.config import REDIS_URL
+from app.core.logging import logger
+
+# Exponentially weighted moving average of full render wall time, per Manim
+# quality flag, shared by all workers through Redis.
+RENDER_SECONDS_KEY = "manimate:render_seconds"
+EWMA_ALPHA = 0.2
+# Measured resource use of the Manim subprocess per quality flag (fields "<flag>:cpu", "<flag>:rss"):
+# an EWMA of busy cores, and a peak RSS that rises at once and decays slowly
+RENDER_USAGE_KEY = "manimate:render_usage"
+RSS_DECAY = 0.05
+
+# Rough starting points used until a worker has rendered at that quality.
+DEFAULT_RENDER_SECONDS = {
+    "-ql": 20.0,
+    "-qm": 45.0,
+    "-qh": 120.0,
+    "-qk": 400.0,
+}
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def estimate_render_seconds(quality_flag: str) -> float:
+    """Best current estimate of how long a full render at this quality takes."""
+    default = DEFAULT_RENDER_SECONDS.get(quality_flag, DEFAULT_RENDER_SECONDS["-ql"])
+    try:
+        value = _get_client().hget(RENDER_SECONDS_KEY, quality_flag)
+    except redis.RedisError as e:
+        logger.warning("Could not read render time estimate: %s", e)
+        return default
+    return float(value) if value is not None else default
+
+
+def record_render_seconds(quality_flag: str, seconds: float) -> None:
+    """Fold an observed full render duration into the shared estimate."""
+    previous = estimate_render_seconds(quality_flag)
+    updated = (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * seconds
+    try:
+        _get_client().hset(RENDER_SECONDS_KEY, quality_flag, round(updated, 3))
+    except redis.RedisError as e:
+        logger.warning("Could not record render time estimate: %s", e)
+
+
+def record_render_usage(quality_flag: str, cores: float, peak_rss: int) -> None:
+    """Fold one render's average busy cores and peak RSS (bytes) into the shared measurements."""
+    try:
+        client = _get_client()
+        previous_cpu, previous_rss = client.hmget(RENDER_USAGE_KEY, [f"{quality_flag}:cpu", f"{quality_flag}:rss"])
+        cpu = cores if previous_cpu is None else (1 - EWMA_ALPHA) * float(previous_cpu) + EWMA_ALPHA * cores
+        rss = peak_rss if previous_rss is None else max(peak_rss, (1 - RSS_DECAY) * float(previous_rss))
+        client.hset(RENDER_USAGE_KEY, mapping={f"{quality_flag}:cpu": round(cpu, 3), f"{quality_flag}:rss": int(rss)})
+    except redis.RedisError as e:
+        logger.warning("Could not record render usage: %s", e)
+
+
+def measured_render_usage() -> dict:
+    """{quality_flag: (cores, peak_rss_bytes)} for every flag measured so far; empty if Redis is unreachable."""
+    try:
+        raw = _get_client().hgetall(RENDER_USAGE_KEY)
+    except redis.RedisError as e:
+        logger.warning("Could not read render usage: %s", e)
+        return {}
+    fields = {key.decode("utf-8"): float(value) for key, value in raw.items()}
+    flags = {key.rsplit(":", 1)[0] for key in fields}
+    return {
+        flag: (fields[f"{flag}:cpu"], int(fields[f"{flag}:rss"]))
+        for flag in flags if f"{flag}:cpu" in fields and f"{flag}:rss" in fields
+    }
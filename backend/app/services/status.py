@@ -0,0 +1,275 @@
+# app/services/status.py
+"""
+Task status lookups for the status endpoints.
+
+- Many task ids are resolved with one MGET against the result backend.
+- Terminal results never change, so they are kept in a bounded in-process
+  cache and served without touching Redis again.
+- Unfinished jobs report their pipeline stage (see app.services.jobs), read
+  in one more round trip.
+- Every poll counts as interest in the unfinished tasks, so renders are only
+  cancelled as abandoned once clients stop polling (see app.services.cancellation).
+- Long-polling waits on the result backend's pub/sub notifications (the
+  Redis backend publishes every result on its key) and on job stage events
+  through one shared listener per process, so waiting clients cost nothing
+  until a state or stage change.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+from celery import states
+from starlette.concurrency import run_in_threadpool
+
+from app.celery_app import celery
+from app.config import REDIS_URL, STATUS_CACHE_SIZE
+from app.core.logging import logger
+from app.services import jobs
+from app.services.cancellation import REASON_CLIENT, cancelled_result, touch
+
+# Fallback poll interval for result backends without pub/sub.
+POLL_INTERVAL = 0.25
+
+
+# -------------------------------
+# Payload formatting
+# -------------------------------
+def format_status(task_id: str, meta: dict) -> dict:
+    """Turns backend task meta into the public status payload."""
+    if meta.get("status") not in states.READY_STATES:
+        return {"task_id": task_id, "status": "IN_PROGRESS"}
+
+    result = meta.get("result")
+    if meta.get("status") == states.REVOKED and not isinstance(result, dict):
+        # Revoked by DELETE /api/render before a worker started it
+        result = cancelled_result(REASON_CLIENT)
+    if isinstance(result, dict) and result.get("status") == "success":
+        payload = {"task_id": task_id, "status": "SUCCESS", "stage": jobs.DONE, "url": result.get("url")}
+        for extra in ("poster_url", "hls_url", "quality", "requested_quality", "scenes", "stitched", "cached"):
+            if result.get(extra):
+                payload[extra] = result[extra]
+        return payload
+    if not isinstance(result, dict):
+        # The task raised instead of returning a structured result
+        result = {"message": str(result), "error_type": "task_exception", "stage": "worker"}
+    return {
+        "task_id": task_id,
+        "status": "FAILURE",
+        "error": result.get("message"),
+        "error_type": result.get("error_type"),
+        "stage": result.get("stage"),
+        "saved_seconds": result.get("saved_seconds"),
+        "logs": result.get("logs"),
+        **({"scenes": result["scenes"]} if result.get("scenes") else {}),
+    }
+
+
+def is_terminal(payload: dict) -> bool:
+    return payload["status"] in ("SUCCESS", "FAILURE")
+
+
+def compute_etag(payload) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+# -------------------------------
+# Terminal result cache
+# -------------------------------
+class TerminalStatusCache:
+    """Bounded LRU of finished task payloads; safe to share across threads."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._items.get(task_id)
+            if payload is not None:
+                self._items.move_to_end(task_id)
+            return payload
+
+    def put(self, task_id: str, payload: dict) -> None:
+        with self._lock:
+            self._items[task_id] = payload
+            self._items.move_to_end(task_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+terminal_cache = TerminalStatusCache(STATUS_CACHE_SIZE)
+
+
+# -------------------------------
+# Lookups
+# -------------------------------
+def _decode(backend, raw) -> dict:
+    if not raw:
+        return {"status": states.PENDING, "result": None}
+    return backend.decode_result(raw)
+
+
+def fetch_statuses(task_ids: List[str]) -> Dict[str, dict]:
+    """Status payloads for many tasks, using one backend round trip for cache misses."""
+    payloads: Dict[str, dict] = {}
+    missing = []
+    for task_id in task_ids:
+        cached = terminal_cache.get(task_id)
+        if cached is not None:
+            payloads[task_id] = cached
+        else:
+            missing.append(task_id)
+
+    if missing:
+        backend = celery.backend
+        keys = [backend.get_key_for_task(task_id) for task_id in missing]
+        values = backend.mget(keys)
+        if hasattr(values, "items"):  # Some backends return a key -> value mapping
+            values = [values.get(key) for key in keys]
+        decoded = [(task_id, format_status(task_id, _decode(backend, raw))) for task_id, raw in zip(missing, values)]
+        records = jobs.fetch(task_id for task_id, _ in decoded)
+        for task_id, payload in decoded:
+            payload = jobs.with_stage(payload, records.get(task_id))
+            if is_terminal(payload):
+                terminal_cache.put(task_id, payload)
+                logger.info("Task %s finished with status %s", task_id, payload["status"])
+            payloads[task_id] = payload
+    touch(task_id for task_id in task_ids if not is_terminal(payloads[task_id]))
+    return payloads
+
+
+def is_known(task_id: str) -> bool:
+    """True if the id is a job or has a result or state in the backend; unknown ids report IN_PROGRESS otherwise."""
+    if terminal_cache.get(task_id) is not None or jobs.fetch([task_id]):
+        return True
+    backend = celery.backend
+    key = backend.get_key_for_task(task_id)
+    values = backend.mget([key])
+    if hasattr(values, "items"):
+        values = [values.get(key)]
+    return bool(values and values[0])
+
+
+# -------------------------------
+# Long-polling
+# -------------------------------
+class ResultListener:
+    """
+    Pattern subscriptions to the result backend's key channels and the job
+    event channels, one connection per process. Waiters register an
+    asyncio.Event per task id and are woken on publish.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._waiters: Dict[str, List[asyncio.Event]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    async def _run(self, *patterns: str) -> None:
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.psubscribe(*patterns)
+            self._ready.set()
+            async for message in pubsub.listen():
+                if message.get("type") != "pmessage":
+                    continue
+                channel, pattern = message["channel"], message["pattern"]
+                if isinstance(channel, bytes):
+                    channel, pattern = channel.decode("utf-8"), pattern.decode("utf-8")
+                task_id = channel[len(pattern) - 1:]
+                for event in self._waiters.get(task_id, ()):
+                    event.set()
+        except Exception as e:
+            logger.warning("Result listener stopped: %s", e)
+        finally:
+            self._ready.set()
+            self._task = None
+            await pubsub.aclose()
+            await client.aclose()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run(celery.backend.get_key_for_task("*"),
+                                                       jobs.JOB_EVENTS_PREFIX + "*"))
+        await self._ready.wait()
+
+    def watch(self, task_ids: List[str]) -> asyncio.Event:
+        """Event set on the next publish for any of the tasks."""
+        event = asyncio.Event()
+        for task_id in task_ids:
+            self._waiters.setdefault(task_id, []).append(event)
+        return event
+
+    def unwatch(self, task_ids: List[str], event: asyncio.Event) -> None:
+        for task_id in task_ids:
+            waiters = self._waiters.get(task_id, [])
+            if event in waiters:
+                waiters.remove(event)
+            if not waiters:
+                self._waiters.pop(task_id, None)
+
+
+_listener: Optional[ResultListener] = None
+
+
+def _supports_pubsub() -> bool:
+    return celery.backend.__class__.__name__ in ("RedisBackend", "SentinelBackend")
+
+
+async def _wait_for_publish(task_ids: List[str], timeout: float, current: Dict[str, dict]) -> None:
+    """
+    Returns once any of the tasks publishes a result or `timeout` elapses.
+    Statuses are re-read after subscribing, so a publish that landed between
+    the caller's read and the subscription is not missed.
+    """
+    global _listener
+    if _listener is None:
+        _listener = ResultListener(REDIS_URL)
+    await _listener.start()
+    event = _listener.watch(task_ids)
+    try:
+        fresh = await run_in_threadpool(fetch_statuses, task_ids)
+        if any(fresh[t] != current[t] for t in task_ids):
+            return
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        _listener.unwatch(task_ids, event)
+
+
+async def get_statuses(task_ids: List[str], wait: float = 0.0,
+                       known_etags: Optional[Dict[str, str]] = None) -> Dict[str, dict]:
+    """
+    Current status payloads. With `wait` > 0, blocks until any task's payload
+    no longer matches the ETag the client already has (or its state at call
+    time), until every task is terminal, or until `wait` seconds pass.
+    """
+    payloads = await run_in_threadpool(fetch_statuses, task_ids)
+    if wait <= 0:
+        return payloads
+
+    known_etags = known_etags or {}
+    baseline = {t: known_etags.get(t) or compute_etag(payloads[t]) for t in task_ids}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        changed = [t for t in task_ids if compute_etag(payloads[t]) != baseline[t]]
+        pending = [t for t in task_ids if not is_terminal(payloads[t])]
+        remaining = deadline - loop.time()
+        if changed or not pending or remaining <= 0:
+            return payloads
+        if _supports_pubsub():
+            await _wait_for_publish(pending, remaining, payloads)
+        else:
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+        payloads = await run_in_threadpool(fetch_statuses, task_ids)
@@ -0,0 +1,516 @@
+# app/services/templates.py
+"""
+Pre-validated scene templates for the most common topics, so those prompts
+skip the LLM call entirely.
+
+A prompt matches a template when it names the template's object (one of its
+subjects), contains every signature group of the template (any alternative per
+group) and none of its exclusions, and its PromptValidator.MATH_KEYWORDS domain
+is compatible. Exclusions cover second topics too (other shapes, extra terms),
+so a prompt about two things goes to the LLM. A few parameters (side lengths,
+exponents, coefficients) are pulled out of the prompt; a prompt asking for a
+variant the template cannot draw (another power, an extra term) matches
+nothing. Rendering the
+same template with the same parameters yields identical code, so repeat
+requests hit the render cache.
+"""
+import re
+import string
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import TEMPLATE_MATCH_THRESHOLD
+from app.services.validator import PromptValidator
+
+NUMBER = r"(-?\d+(?:\.\d+)?)"
+
+# Starting estimate of one LLM generation, refined from observed calls
+DEFAULT_GENERATION_SECONDS = 8.0
+EWMA_ALPHA = 0.2
+
+
+@dataclass
+class SceneTemplate:
+    name: str
+    domains: Tuple[str, ...]  # MATH_KEYWORDS domains this topic belongs to
+    signatures: List[Tuple[str, ...]]  # every group must match; any alternative within a group
+    code: string.Template
+    # Parameters found in the prompt; {} means "use the defaults", None that the prompt asks for
+    # a variant the template cannot draw
+    extract_params: Callable[[str], Optional[Dict[str, str]]]
+    exclusions: Tuple[str, ...] = ()  # phrases meaning the prompt asks for something else
+    defaults: Dict[str, str] = field(default_factory=dict)
+    subjects: Tuple[str, ...] = ()  # the prompt must name one of these (the template's object)
+    allowed: Tuple[str, ...] = ()  # patterns removed before the exclusion check (the scene's own method)
+
+    def render(self, prompt: str) -> Optional[str]:
+        """The scene's code for `prompt`, or None if the prompt asks for a variant this template cannot draw."""
+        params = self.extract_params(prompt)
+        if params is None:
+            return None
+        return self.code.substitute({**self.defaults, **params}).strip() + "\n"
+
+
+@dataclass
+class TemplateMatch:
+    template: SceneTemplate
+    score: float
+    code: str
+
+
+def _fmt(value: float) -> str:
+    return f"{value:g}"
+
+
+# -------------------------------
+# Parameter extraction
+# -------------------------------
+def _pythagorean_params(prompt: str) -> Optional[Dict[str, str]]:
+    triple = re.search(NUMBER + r"\s*[-,/]\s*" + NUMBER + r"\s*[-,/]\s*" + NUMBER, prompt)
+    legs = re.search(r"legs?\s*(?:of\s*)?" + NUMBER + r"\s*(?:and|,)\s*" + NUMBER, prompt, re.IGNORECASE)
+    match = triple or legs
+    if not match:
+        return {}
+    a, b = sorted(abs(float(v)) for v in match.groups()[:2])
+    if not 0 < a <= 50 or not 0 < b <= 50:
+        return None
+    # Keep the squares on screen: the longer leg is drawn at most 3 units
+    scale = min(1.0, 3.0 / b)
+    return {"a": _fmt(a), "b": _fmt(b), "scale": f"{scale:.4g}"}
+
+
+SUPERSCRIPTS = {"²": 2, "³": 3, "⁴": 4, "⁵": 5, "⁶": 6, "⁷": 7, "⁸": 8, "⁹": 9}
+
+# Curves the derivative template cannot draw: it plots y = x^n and nothing else
+_UNSUPPORTED_CURVE = re.compile("|".join([
+    r"\d\s*\*?\s*x",  # coefficients: 3x^2, 2*x
+    r"x\s*(?:(?:\^|\*\*)\s*\d+|[²³⁴⁵⁶⁷⁸⁹])?\s*[+-]\s*[\dx(]",  # extra terms after a power: x^2 + 1, x^2 - 5x
+    r"[\dx)]\s*[+-]\s*x",  # extra terms before one: 1 + x^2
+    r"-\s*x",  # negated: -x^2
+    r"\(\s*x\s*[+-]",  # shifted arguments: (x-1)^2
+    r"/\s*x|x\s*/",  # quotients: 1/x, x/2
+    r"x\s*(?:\^|\*\*)\s*[-(.{]",  # negative, fractional or braced powers
+]))
+
+
+def _derivative_params(prompt: str) -> Optional[Dict[str, str]]:
+    text = prompt.lower()
+    if _UNSUPPORTED_CURVE.search(text):
+        return None
+    match = re.search(r"x\s*(?:\^|\*\*)\s*(\d+)", text)
+    if match:
+        exponent = int(match.group(1))
+    else:
+        superscript = re.search(r"x([²³⁴⁵⁶⁷⁸⁹])", text)
+        exponent = SUPERSCRIPTS[superscript.group(1)] if superscript else 3 if "x cubed" in text else 2
+    if exponent not in (2, 3):
+        return None
+    if exponent == 3:
+        return {"exponent": "3", "derivative": "3x^{2}", "x_range": "[-2.5, 2.5, 1]", "y_range": "[-8, 8, 2]",
+                "start": "-1.8", "end": "1.8"}
+    return {}
+
+
+def _circle_params(prompt: str) -> Optional[Dict[str, str]]:
+    match = re.search(r"radius\s*(?:of\s*|=\s*|r\s*=\s*)?" + NUMBER, prompt, re.IGNORECASE)
+    if not match:
+        return {}
+    radius = float(match.group(1))
+    return {"radius": _fmt(min(max(radius, 0.5), 2.0))} if radius > 0 else {}
+
+
+def _quadratic_params(prompt: str) -> Optional[Dict[str, str]]:
+    text = prompt.replace("²", "^2")
+    match = re.search(r"(-?\d*)\s*x\s*(?:\^|\*\*)\s*2\s*([+-]\s*\d*)\s*x\s*([+-]\s*\d+)\s*=\s*0", text)
+    if not match:
+        # A numeric equation in another form (x^2 - 4 = 0, 2x^2 = 8) would be shown as the default example
+        numeric = re.search(r"\d\s*x|x\s*(?:\^|\*\*)\s*2\s*[+-]\s*\d|=\s*-?\d*[1-9]", text)
+        return None if numeric else {}
+
+    def coefficient(text: str) -> float:
+        text = text.replace(" ", "")
+        return float(text + "1") if text in ("", "+", "-") else float(text)
+
+    a, b, c = coefficient(match.group(1)), coefficient(match.group(2)), coefficient(match.group(3))
+    if a == 0:
+        return None
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        roots = r"\text{no real roots}"
+    else:
+        r1 = (-b + discriminant ** 0.5) / (2 * a)
+        r2 = (-b - discriminant ** 0.5) / (2 * a)
+        roots = f"x = {_fmt(round(r1, 3))}" + ("" if r1 == r2 else f",\\; x = {_fmt(round(r2, 3))}")
+    def term(value: float, variable: str) -> str:
+        # 1x -> x, and zero terms vanish
+        if value == 0:
+            return ""
+        magnitude = "" if abs(value) == 1 and variable else _fmt(abs(value))
+        return f" {'+' if value > 0 else '-'} {magnitude}{variable}"
+
+    leading = {1: "", -1: "-"}.get(a, _fmt(a))
+    equation = f"{leading}x^2{term(b, 'x')}{term(c, '')} = 0"
+    return {"example": equation, "roots": roots}
+
+
+def _sine_params(prompt: str) -> Optional[Dict[str, str]]:
+    text = prompt.lower()
+    match = re.search(NUMBER + r"?\s*\*?\s*sin\s*\(\s*" + NUMBER + r"?\s*\*?\s*x\s*\)", text)
+    if not match:
+        # sin(2x + 1), sin(x/2), ...: another curve than the default sin(x)
+        return None if re.search(r"sin\s*\(", text) else {}
+    if re.match(r"\s*[-+*/^]\s*[\w(]", text[match.end():]) or re.search(r"[\w)]\s*[-+*/]\s*$", text[:match.start()]):
+        # Extra terms: sin(x) + x, x * sin(x), sin(x)^2
+        return None
+    amplitude = float(match.group(1)) if match.group(1) else 1.0
+    frequency = float(match.group(2)) if match.group(2) else 1.0
+    if not 0 < abs(amplitude) <= 3 or not 0 < frequency <= 4:
+        return None
+    label = f"{_fmt(amplitude) if amplitude != 1 else ''}\\sin({_fmt(frequency) if frequency != 1 else ''}x)"
+    return {"amplitude": _fmt(amplitude), "frequency": _fmt(frequency), "label": label}
+
+
+# -------------------------------
+# Templates
+# -------------------------------
+# Adapted from prompts.EXAMPLE_ALGEBRA; the drawn squares are scaled to fit the frame.
+PYTHAGOREAN = string.Template(r'''
+from manim import *
+
+class PythagoreanProof(Scene):
+    def construct(self):
+        # Step 1: Introduce the theorem
+        title = Title("Visual Proof of the Pythagorean Theorem")
+        self.play(Write(title))
+
+        # Step 2: Set up the triangle dimensions
+        a, b = $a, $b
+        c = np.sqrt(a**2 + b**2)
+        s = $scale
+
+        # Step 3: Create visual squares representing a² and b²
+        sq_a = Square(side_length=a * s, fill_color=BLUE, fill_opacity=0.8).shift(LEFT * (b * s / 2 + a * s / 2) + DOWN * 0.5)
+        sq_b = Square(side_length=b * s, fill_color=GREEN, fill_opacity=0.8).next_to(sq_a, RIGHT, buff=0, aligned_edge=DOWN)
+
+        # Step 4: Add the right triangle to complete the visual
+        triangle = Polygon(sq_a.get_corner(UR), sq_b.get_corner(UL), sq_b.get_corner(DL),
+                           stroke_color=WHITE, fill_color=YELLOW, fill_opacity=0.8)
+        self.play(Create(sq_a), Create(sq_b), run_time=1.5)
+        self.play(Create(triangle))
+
+        # Step 5: Visual transformation showing a² + b² = c²
+        rearranged_group = VGroup(sq_a.copy(), sq_b.copy())
+        sq_c = Square(side_length=c * s, fill_color=RED, fill_opacity=0.8).shift(DOWN * 0.5)
+        self.play(FadeOut(triangle), Transform(rearranged_group, sq_c), run_time=2)
+
+        # Step 6: Display the mathematical conclusion
+        formula = MathTex("a^2", "+", "b^2", "=", "c^2").next_to(title, DOWN, buff=0.3)
+        formula[0].set_color(BLUE)
+        formula[2].set_color(GREEN)
+        formula[4].set_color(RED)
+        values = MathTex(f"{a:g}^2 + {b:g}^2 = {c:.3g}^2", font_size=36).to_edge(DOWN)
+        self.play(Write(formula))
+        self.play(Write(values))
+        self.wait(2)
+''')
+
+# Adapted from prompts.EXAMPLE_CALCULUS, parameterized by the power of x.
+DERIVATIVE = string.Template(r'''
+from manim import *
+
+class DerivativeVisualization(Scene):
+    def construct(self):
+        # Step 1: Set up coordinate system
+        axes = Axes(x_range=$x_range, y_range=$y_range, axis_config={"color": BLUE})
+        curve = axes.plot(lambda x: x**$exponent, color=WHITE, stroke_width=3)
+        label = MathTex("y = x^{$exponent}").to_corner(UL)
+
+        # Step 2: Create dynamic tracking system
+        x_tracker = ValueTracker($start)
+
+        # Step 3: Define the tangent line that updates dynamically
+        tangent_line = always_redraw(
+            lambda: axes.get_secant_slope_group(
+                x=x_tracker.get_value(),
+                graph=curve,
+                dx=0.01,
+                secant_line_color=YELLOW,
+                secant_line_length=4,
+            )
+        )
+
+        # Step 4: Add a tracking dot and the live slope value
+        tracking_dot = always_redraw(
+            lambda: Dot(color=RED).move_to(axes.c2p(x_tracker.get_value(), x_tracker.get_value()**$exponent))
+        )
+        slope_value = always_redraw(
+            lambda: Text(f"slope = {$exponent * x_tracker.get_value()**($exponent - 1):.2f}", font_size=28).to_corner(UR)
+        )
+
+        # Step 5: Build the scene progressively
+        self.play(Create(axes), Create(curve), Write(label))
+        self.play(Create(tracking_dot), Create(tangent_line), FadeIn(slope_value))
+        self.wait(1)
+
+        # Step 6: Animate the key insight - derivative as slope
+        self.play(x_tracker.animate.set_value($end), run_time=5)
+
+        # Step 7: Add explanatory text
+        explanation = MathTex(r"\frac{d}{dx}x^{$exponent} = $derivative", font_size=36).to_edge(DOWN)
+        self.play(Write(explanation))
+        self.wait(2)
+''')
+
+CIRCLE_AREA = string.Template(r'''
+from manim import *
+
+class CircleAreaUnwrap(Scene):
+    def construct(self):
+        # Step 1: The circle, cut into equal sectors
+        r, n = $radius, 16
+        title = Text("Area of a Circle", font_size=40).to_edge(UP)
+        sectors = VGroup(*[
+            AnnularSector(inner_radius=0, outer_radius=r, angle=TAU / n, start_angle=i * TAU / n,
+                          fill_color=BLUE if i % 2 == 0 else TEAL, fill_opacity=0.8, stroke_width=1)
+            for i in range(n)
+        ])
+        self.play(Write(title))
+        self.play(Create(sectors), run_time=2)
+        self.wait(0.5)
+
+        # Step 2: Rearrange the sectors tip-to-tail into a near-rectangle
+        arc = r * TAU / n
+        targets = VGroup()
+        for i, sector in enumerate(sectors):
+            piece = sector.copy()
+            bisector = i * TAU / n + TAU / (2 * n)
+            if i % 2 == 0:
+                piece.rotate(PI / 2 - bisector, about_point=ORIGIN)
+                piece.shift(RIGHT * (i // 2) * arc + DOWN * r / 2)
+            else:
+                piece.rotate(-PI / 2 - bisector, about_point=ORIGIN)
+                piece.shift(RIGHT * ((i // 2) * arc + arc / 2) + UP * r / 2)
+            targets.add(piece)
+        targets.move_to(DOWN * 0.5)
+        self.play(Transform(sectors, targets), run_time=3)
+
+        # Step 3: Read off the dimensions of the rectangle
+        width = Brace(targets, DOWN)
+        width_label = MathTex(r"\pi r").next_to(width, DOWN)
+        height = Brace(targets, LEFT)
+        height_label = MathTex("r").next_to(height, LEFT)
+        self.play(GrowFromCenter(width), Write(width_label), GrowFromCenter(height), Write(height_label))
+
+        # Step 4: Conclusion
+        formula = MathTex(r"A = \pi r \cdot r = \pi r^2", font_size=44).next_to(title, DOWN)
+        self.play(Write(formula))
+        self.wait(2)
+''')
+
+QUADRATIC = string.Template(r'''
+from manim import *
+
+class QuadraticFormula(Scene):
+    def construct(self):
+        # Step 1: The general quadratic equation
+        title = Text("The Quadratic Formula", font_size=40).to_edge(UP)
+        steps = [
+            r"ax^2 + bx + c = 0",
+            r"x^2 + \frac{b}{a}x = -\frac{c}{a}",
+            r"\left(x + \frac{b}{2a}\right)^2 = \frac{b^2 - 4ac}{4a^2}",
+            r"x + \frac{b}{2a} = \pm\frac{\sqrt{b^2 - 4ac}}{2a}",
+            r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}",
+        ]
+        self.play(Write(title))
+        current = MathTex(steps[0], font_size=44)
+        self.play(Write(current))
+        self.wait(1)
+
+        # Step 2: Complete the square, one step at a time
+        for step in steps[1:]:
+            nxt = MathTex(step, font_size=44)
+            self.play(TransformMatchingShapes(current, nxt), run_time=1.5)
+            current = nxt
+            self.wait(0.8)
+
+        # Step 3: Highlight the result
+        box = SurroundingRectangle(current, color=YELLOW, buff=0.2)
+        self.play(Create(box))
+
+        # Step 4: Apply it to an example
+        example = MathTex(r"$example", font_size=36).next_to(box, DOWN, buff=0.6)
+        roots = MathTex(r"$roots", font_size=36, color=GREEN).next_to(example, DOWN)
+        self.play(Write(example))
+        self.play(Write(roots))
+        self.wait(2)
+''')
+
+SINE_GRAPH = string.Template(r'''
+from manim import *
+
+class SineWave(Scene):
+    def construct(self):
+        # Step 1: Axes and the curve
+        amplitude, frequency = $amplitude, $frequency
+        axes = Axes(x_range=[0, 2 * PI, PI / 2], y_range=[-3, 3, 1], x_length=10, y_length=5,
+                    axis_config={"color": BLUE})
+        curve = axes.plot(lambda x: amplitude * np.sin(frequency * x), color=YELLOW, stroke_width=3)
+        label = MathTex(r"y = $label").to_corner(UL)
+        self.play(Create(axes))
+        self.play(Create(curve), Write(label), run_time=2)
+
+        # Step 2: Mark zeros, peaks and troughs over one period
+        period = 2 * PI / frequency
+        key_xs = [k * period / 4 for k in range(int(4 * 2 * PI / period) + 1) if k * period / 4 <= 2 * PI]
+        dots = VGroup(*[
+            Dot(axes.c2p(x, amplitude * np.sin(frequency * x)), color=RED if k % 2 else GREEN)
+            for k, x in enumerate(key_xs)
+        ])
+        self.play(LaggedStart(*[FadeIn(dot, scale=0.5) for dot in dots], lag_ratio=0.2))
+
+        # Step 3: Trace the wave with a moving point
+        x_tracker = ValueTracker(0)
+        tracer = always_redraw(
+            lambda: Dot(axes.c2p(x_tracker.get_value(), amplitude * np.sin(frequency * x_tracker.get_value())),
+                        color=WHITE)
+        )
+        self.add(tracer)
+        self.play(x_tracker.animate.set_value(2 * PI), run_time=4, rate_func=linear)
+
+        # Step 4: Amplitude and period
+        info = Text(f"amplitude = {abs(amplitude):g}    period = {period:.2f}", font_size=28).to_edge(DOWN)
+        self.play(Write(info))
+        self.wait(2)
+''')
+
+TEMPLATES: List[SceneTemplate] = [
+    SceneTemplate(
+        name="pythagorean_theorem",
+        domains=("geometry", "algebra"),
+        signatures=[("pythagor", "a^2 + b^2", "a² + b²")],
+        subjects=("pythagorean theorem", "pythagoras", "pythagorean proof", "proof of pythagor", "right triangle",
+                  "a^2 + b^2", "a² + b²", "a^2+b^2", "a²+b²"),
+        exclusions=("3d", "three dimension", "law of cosines", "distance formula", "identity", "sin", "cos", "tan",
+                    "triples", "circle"),
+        code=PYTHAGOREAN,
+        extract_params=_pythagorean_params,
+        defaults={"a": "2", "b": "3", "scale": "1"},
+    ),
+    SceneTemplate(
+        name="derivative_tangent",
+        domains=("calculus",),
+        signatures=[("derivative", "slope"), ("tangent",)],
+        subjects=("x^", "x**", "x²", "x³", "x squared", "x cubed", "parabola"),
+        exclusions=("integral", "sin", "cos", "exp", "log", "e^", "chain rule", "product rule", "second derivative",
+                    "3d", "partial", "sqrt", "√", "root", "reciprocal", "abs", "|x", "ln(", "ln x", "circle",
+                    "ellipse", "hyperbola", "polynomial"),
+        code=DERIVATIVE,
+        extract_params=_derivative_params,
+        defaults={"exponent": "2", "derivative": "2x", "x_range": "[-4, 4, 1]", "y_range": "[-1, 7, 1]",
+                  "start": "-2", "end": "2"},
+    ),
+    SceneTemplate(
+        name="circle_area",
+        domains=("geometry",),
+        signatures=[("area",), ("circle",)],
+        subjects=("area of a circle", "area of the circle", "area of circle", "circle's area", "circle area",
+                  "πr", "pi r", "pi*r"),
+        exclusions=("sphere", "volume", "ellipse", "sector area", "integral", "integrat", "shell", "monte carlo", "3d",
+                    "triangle", "rectangle", "a square", "squares", "polygon", "hexagon", "tangent", "annulus",
+                    "ring", "semicircle", "inscribed", "circumscribed", "compare"),
+        # Unwrapping the circle into a triangle or rectangle is what the scene shows
+        allowed=(r"(?:in)?to an? (?:triangle|rectangle|parallelogram)(?:\s+or\s+(?:an?\s+)?(?:triangle|rectangle|parallelogram))?",),
+        code=CIRCLE_AREA,
+        extract_params=_circle_params,
+        defaults={"radius": "1.5"},
+    ),
+    SceneTemplate(
+        name="quadratic_formula",
+        domains=("algebra",),
+        signatures=[("quadratic",), ("formula", "solve", "solution", "roots", "derivation")],
+        exclusions=("graph", "parabola", "vertex", "complex roots", "cubic", "3d", "inequalit", "system of"),
+        code=QUADRATIC,
+        extract_params=_quadratic_params,
+        defaults={"example": "x^2 - 5x + 6 = 0", "roots": "x = 3,\\; x = 2"},
+    ),
+    SceneTemplate(
+        name="sine_graph",
+        domains=("trigonometry",),
+        signatures=[("sin(x)", "sin x", "sine", "sin(", "sin "), ("graph", "plot", "wave", "curve")],
+        exclusions=("cos", "tan", "fourier", "unit circle", "series", "sum of", "3d", "polar", "derivative", "integral",
+                    "sin^", "sin²", "damped", "identity"),
+        code=SINE_GRAPH,
+        extract_params=_sine_params,
+        defaults={"amplitude": "1", "frequency": "1", "label": "\\sin(x)"},
+    ),
+]
+
+
+# -------------------------------
+# Matching
+# -------------------------------
+def detect_domains(prompt: str) -> Dict[str, int]:
+    """Keyword hits per MATH_KEYWORDS domain, the same way PromptValidator counts them."""
+    prompt_lower = prompt.lower()
+    hits = {}
+    for domain, keywords in PromptValidator.MATH_KEYWORDS.items():
+        count = sum(1 for keyword in keywords if keyword in prompt_lower)
+        if count:
+            hits[domain] = count
+    return hits
+
+
+def _score(template: SceneTemplate, prompt_lower: str, domains: Dict[str, int]) -> float:
+    if template.subjects and not any(subject in prompt_lower for subject in template.subjects):
+        # Some of the keywords, but not the template's object (the tangent of a circle is not a derivative)
+        return 0.0
+    checked = prompt_lower
+    for pattern in template.allowed:
+        checked = re.sub(pattern, " ", checked)
+    if any(phrase in checked for phrase in template.exclusions):
+        return 0.0
+    matched = sum(1 for group in template.signatures if any(alt in prompt_lower for alt in group))
+    score = matched / len(template.signatures)
+    specific = {domain: hits for domain, hits in domains.items() if domain != "general"}
+    if specific:
+        best = max(specific.values())
+        if not any(specific.get(domain) == best for domain in template.domains):
+            # The prompt is mostly about another area; trust the LLM instead
+            score *= 0.75
+    return score
+
+
+def match_template(prompt: str) -> Optional[TemplateMatch]:
+    """The best confidently matching template with its rendered code, or None."""
+    prompt_lower = prompt.lower()
+    domains = detect_domains(prompt)
+    best: Optional[Tuple[float, SceneTemplate]] = None
+    for template in TEMPLATES:
+        score = _score(template, prompt_lower, domains)
+        if score >= TEMPLATE_MATCH_THRESHOLD and (best is None or score > best[0]):
+            best = (score, template)
+    if best is None:
+        return None
+    score, template = best
+    code = template.render(prompt)
+    if code is None:
+        # The topic, but a variant the template cannot draw (x^4, sin(2x + 1)): the LLM handles it
+        return None
+    return TemplateMatch(template=template, score=score, code=code)
+
+
+# -------------------------------
+# Savings accounting
+# -------------------------------
+_generation_seconds = DEFAULT_GENERATION_SECONDS
+
+
+def record_generation_seconds(seconds: float) -> None:
+    """Folds an observed LLM generation time into this process's estimate."""
+    global _generation_seconds
+    _generation_seconds = (1 - EWMA_ALPHA) * _generation_seconds + EWMA_ALPHA * seconds
+
+
+def estimated_generation_seconds() -> float:
+    """What a template hit saves, going by recent LLM calls in this process."""
+    return _generation_seconds
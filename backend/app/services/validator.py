@@ -1,38 +1,82 @@
 # app/services/validator.py
 
 import ast
+import importlib.util
+import os
 import re
+import subprocess
+import tempfile
 from typing import Tuple, List, Set, Optional
 from dataclasses import dataclass
 from enum import Enum
+from app.config import PREFLIGHT_TIMEOUT
 from app.core.logging import logger
+from app.services.manim_api import find_unknown_symbols
 # ----------------------------
 # Prompt Validation
 # ----------------------------
 
-def validate_prompt(prompt: str):
-    if not prompt or not prompt.strip():
-        logger.warning("Prompt validation failed: empty prompt")
-        return False, "Prompt cannot be empty."
-    if len(prompt) > 2000:
-        logger.warning("Prompt validation failed: too long (%s chars)", len(prompt))
-        return False, "Prompt too long."
-    logger.info("Prompt validated successfully")
-    return True, "Valid prompt"
-
-
+# validate_prompt() is defined with the validator classes below
 # ----------------------------
 # Manim Code Validation
 # ----------------------------
 def validate_manim_code(code: str) -> bool:
     try:
         ast.parse(code)
-        logger.info("Manim code validated successfully")
+        logger.debug("Manim code validated successfully")
         return True
     except SyntaxError as e:
         logger.error("Manim code validation failed: %s", e)
         return False
 
+# Same as the worker's pre-flight: run construct() to the last frame, render and write nothing
+DRY_RUN_FLAGS = ["-ql", "-s", "--dry_run", "--disable_caching", "--renderer=cairo"]
+
+
+def manim_available() -> bool:
+    return importlib.util.find_spec("manim") is not None
+
+
+def dry_run_manim_code(code: str, timeout: float = PREFLIGHT_TIMEOUT) -> Tuple[bool, str]:
+    """Runs the first scene's construct() under Manim's --dry_run; catches hallucinated APIs before queueing."""
+    from app.core import manim_launcher
+    from app.core.toolchain import get_toolchain
+    from app.utils.helpers import find_scene_classes
+
+    scene_names = find_scene_classes(code)
+    if not scene_names:
+        return False, "No Scene class found"
+    with tempfile.TemporaryDirectory() as work_dir:
+        scene_path = os.path.join(work_dir, "scene.py")
+        with open(scene_path, "w", encoding="utf-8") as f:
+            f.write(code)
+        with open(os.path.join(work_dir, "manim.cfg"), "w") as f:
+            f.write(get_toolchain().manim_cfg())
+        try:
+            completed = subprocess.run(manim_launcher.command(scene_path, scene_names[0], *DRY_RUN_FLAGS),
+                                       cwd=work_dir, env=manim_launcher.environment(), capture_output=True,
+                                       text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False, f"Dry run timed out after {timeout}s"
+    if completed.returncode != 0:
+        lines = [line for line in completed.stderr.splitlines() if line.strip()]
+        return False, f"Dry run failed: {lines[-1] if lines else 'exit code ' + str(completed.returncode)}"
+    return True, "Dry run passed"
+
+
+def validate_manim_symbols(code: str) -> "ValidationResult":
+    """Resolves the Manim names, members and keywords the code uses against the Manim API index."""
+    unknown = find_unknown_symbols(code)
+    if not unknown:
+        return ValidationResult(True, "All Manim symbols resolved.")
+    return ValidationResult(
+        False,
+        f"Unknown Manim symbols: {', '.join(str(symbol) for symbol in unknown[:5])}",
+        "unknown_symbol",
+        [f"Use {symbol.suggestion} instead of {symbol.symbol}" for symbol in unknown if symbol.suggestion],
+    )
+
+
 class ValidationLevel(Enum):
     """Validation strictness levels"""
     STRICT = "strict"
@@ -462,10 +506,17 @@ class ManimValidator:
         return prompt_result, code_result
 
 # Convenience functions for backward compatibility
+_prompt_validator = PromptValidator()
+
+
 def validate_prompt(prompt: str) -> Tuple[bool, str]:
-    """Simple prompt validation for backward compatibility"""
-    validator = ManimValidator()
-    result = validator.validate_prompt(prompt)
+    """Simple prompt validation for backward compatibility. Logs the outcome, never the prompt itself."""
+    result = _prompt_validator.validate_prompt(prompt)
+    if result.is_valid:
+        logger.debug("Prompt validated successfully (%d chars)", len(prompt))
+    else:
+        logger.warning("Prompt validation failed: %s (%d chars)", result.error_type,
+                       len(prompt) if isinstance(prompt, str) else 0)
     return result.is_valid, result.message
 
 def validate_and_sanitize_manim_code(code: str) -> Tuple[bool, str]:
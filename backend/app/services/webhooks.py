@@ -0,0 +1,312 @@
+# app/services/webhooks.py
+"""
+Completion webhooks, so server-to-server clients need not poll.
+
+POST /api/render may carry a callback_url (and callback_secret). The API
+stores them in Redis under the task id. When the render reaches a final state,
+the first party to see that state claims the registration (SET NX on a claim
+key) and queues the notify_webhook task. That party is the worker
+(task_postrun), or the API on a cancel. Each render therefore triggers at most
+one delivery. The message carries only the task id and the payload:
+notify_webhook reads the URL and the secret from the registration, so the
+secret never reaches the broker or the task logs. The registration is deleted
+once the delivery succeeds or gives up.
+
+Callbacks cannot target the internal network. Unless
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES is set, the host must resolve only to public
+addresses (no loopback, RFC 1918, link-local such as 169.254.169.254, or
+reserved ranges). That is checked when the callback is registered and again
+before every delivery attempt, as DNS may have changed in between. Redirects
+are not followed: a 3xx response is a refused delivery.
+
+notify_webhook POSTs the same JSON payload GET /api/status returns. The
+headers identify the delivery (X-Manimate-Delivery is the task id, which
+receivers can use to deduplicate) and carry a signature:
+
+    X-Manimate-Timestamp: <unix seconds>
+    X-Manimate-Signature: sha256=<hex HMAC-SHA256 of "<timestamp>.<body>">
+
+The key is the callback's secret, or WEBHOOK_SECRET for callbacks without one.
+Timeouts, connection errors, 408, 429 and 5xx responses are retried with
+exponential backoff, up to WEBHOOK_MAX_ATTEMPTS attempts. Other 4xx responses
+mean the receiver refused the delivery and are not retried. Deliveries that
+give up are kept in a capped dead-letter list.
+
+A local receiver for testing, which verifies signatures and prints the payloads:
+
+    python -m app.services.webhooks receive --port 9000 --secret s3cret [--fail 2]
+
+(it listens on 127.0.0.1, so run the API and workers with
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES=true to reach it).
+"""
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import socket
+import sys
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import redis
+from app.celery_app import celery, NOTIFY_WEBHOOK_TASK
+from app.config import (
+    REDIS_URL,
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES,
+    WEBHOOK_ALLOWED_HOSTS,
+    WEBHOOK_BACKOFF_BASE,
+    WEBHOOK_BACKOFF_MAX,
+    WEBHOOK_DEAD_LETTER_MAX,
+    WEBHOOK_QUEUE,
+    WEBHOOK_SECRET,
+    WEBHOOK_TIMEOUT,
+)
+from app.core.logging import logger
+
+WEBHOOK_KEY_PREFIX = "manimate:webhook:"
+CLAIM_KEY_PREFIX = "manimate:webhook_claim:"
+DEAD_LETTER_KEY = "manimate:webhook_dead_letters"
+REGISTRATION_TTL = 24 * 3600  # longer than any render stays queued
+
+EVENT = "render.completed"
+EVENT_HEADER = "X-Manimate-Event"
+DELIVERY_HEADER = "X-Manimate-Delivery"
+TIMESTAMP_HEADER = "X-Manimate-Timestamp"
+SIGNATURE_HEADER = "X-Manimate-Signature"
+SIGNATURE_TOLERANCE = 300  # seconds a receiver accepts between signing and arrival
+REFUSED = 0  # deliver()'s status when the request was not sent (blocked address); never retried
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+# -------------------------------
+# Address checks
+# -------------------------------
+def address_error(host: str) -> Optional[str]:
+    """Why callbacks may not go to `host` (it resolves to a non-public address), or None."""
+    if WEBHOOK_ALLOW_PRIVATE_ADDRESSES:
+        return None
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        return f"callback_url host {host} does not resolve: {e}"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            return f"callback_url host {host} resolves to a non-public address ({address})."
+    return None
+
+
+# -------------------------------
+# Registration (API side)
+# -------------------------------
+def callback_url_error(url: str) -> Optional[str]:
+    """Why `url` cannot be used as a callback, or None if it can. Resolves the host (blocking)."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url must be an absolute http(s) URL."
+    if WEBHOOK_ALLOWED_HOSTS and parts.hostname.lower() not in WEBHOOK_ALLOWED_HOSTS:
+        return f"callback_url host {parts.hostname} is not allowed."
+    return address_error(parts.hostname)
+
+
+def register(task_id: str, url: str, secret: Optional[str] = None) -> bool:
+    """Remembers where to announce the render's completion. False if Redis is unreachable."""
+    try:
+        _get_client().set(WEBHOOK_KEY_PREFIX + task_id, json.dumps({"url": url, "secret": secret}),
+                          ex=REGISTRATION_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not register the webhook of %s: %s", task_id, e)
+        return False
+    return True
+
+
+def claim(task_id: str) -> bool:
+    """Takes the registration of a finished render, so only one party notifies. False if it has none."""
+    try:
+        client = _get_client()
+        if not client.exists(WEBHOOK_KEY_PREFIX + task_id):
+            return False
+        claimed = client.set(CLAIM_KEY_PREFIX + task_id, 1, nx=True, ex=REGISTRATION_TTL)
+        if claimed:
+            # Outlives every retry of the delivery
+            client.expire(WEBHOOK_KEY_PREFIX + task_id, REGISTRATION_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not claim the webhook of %s: %s", task_id, e)
+        return False
+    return bool(claimed)
+
+
+def registration(task_id: str) -> Optional[dict]:
+    """The callback's URL and secret, read by the delivery task."""
+    try:
+        raw = _get_client().get(WEBHOOK_KEY_PREFIX + task_id)
+    except redis.RedisError as e:
+        logger.warning("Could not read the webhook of %s: %s", task_id, e)
+        raise
+    return json.loads(raw) if raw else None
+
+
+def release(task_id: str) -> None:
+    """Forgets the callback once its delivery succeeded or gave up."""
+    try:
+        _get_client().delete(WEBHOOK_KEY_PREFIX + task_id, CLAIM_KEY_PREFIX + task_id)
+    except redis.RedisError as e:
+        logger.warning("Could not release the webhook of %s: %s", task_id, e)
+
+
+def schedule(task_id: str, payload: dict) -> bool:
+    """Queues the delivery of a final status payload, if the render has a callback. True if one was queued."""
+    if not claim(task_id):
+        return False
+    celery.send_task(NOTIFY_WEBHOOK_TASK, args=[task_id, payload], queue=WEBHOOK_QUEUE or None)
+    return True
+
+
+# -------------------------------
+# Delivery (worker side)
+# -------------------------------
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), timestamp.encode("ascii") + b"." + body, hashlib.sha256)
+    return "sha256=" + digest.hexdigest()
+
+
+def verify(secret: str, timestamp: str, body: bytes, signature: str, tolerance: float = SIGNATURE_TOLERANCE) -> bool:
+    """Receiver-side check of a delivery's signature and age."""
+    try:
+        fresh = abs(time.time() - int(timestamp)) <= tolerance
+    except (TypeError, ValueError):
+        return False
+    return fresh and hmac.compare_digest(sign(secret, timestamp, body), signature or "")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Turns 3xx responses into HTTPError: a receiver must not send the worker elsewhere."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def deliver(url: str, secret: Optional[str], task_id: str, payload: dict) -> Tuple[Optional[int], Optional[str]]:
+    """
+    One POST attempt: (HTTP status, or None on a network error, or REFUSED if
+    the host now resolves to a blocked address; error or None on a 2xx).
+    """
+    blocked = address_error(urlsplit(url).hostname or "")
+    if blocked:
+        return REFUSED, blocked
+    body = json.dumps({"event": EVENT, **payload}, separators=(",", ":")).encode("utf-8")
+    timestamp = str(int(time.time()))
+    headers = {"Content-Type": "application/json", "User-Agent": "manimate-webhooks",
+               EVENT_HEADER: EVENT, DELIVERY_HEADER: task_id, TIMESTAMP_HEADER: timestamp}
+    secret = secret or WEBHOOK_SECRET
+    if secret:
+        headers[SIGNATURE_HEADER] = sign(secret, timestamp, body)
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    try:
+        with _opener.open(request, timeout=WEBHOOK_TIMEOUT) as response:
+            return response.status, None
+    except urllib.error.HTTPError as e:
+        if 300 <= e.code < 400:
+            return e.code, f"HTTP {e.code} {e.reason} (redirects are not followed)"
+        return e.code, f"HTTP {e.code} {e.reason}"
+    except (urllib.error.URLError, OSError) as e:
+        return None, f"{type(e).__name__}: {getattr(e, 'reason', e)}"
+
+
+def retryable(status: Optional[int]) -> bool:
+    return status is None or status in (408, 429) or status >= 500  # REFUSED and 3xx are final
+
+
+def backoff(attempt: int) -> float:
+    """Seconds before retry number `attempt` + 1: doubling from WEBHOOK_BACKOFF_BASE, capped, with jitter."""
+    delay = min(WEBHOOK_BACKOFF_BASE * 2 ** attempt, WEBHOOK_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def dead_letter(task_id: str, url: str, payload: dict, attempts: int, error: str) -> None:
+    """Keeps a delivery that gave up, for operators to inspect or replay."""
+    record = {"task_id": task_id, "url": url, "attempts": attempts, "error": error,
+              "failed_at": time.time(), "payload": payload}
+    try:
+        pipe = _get_client().pipeline()
+        pipe.lpush(DEAD_LETTER_KEY, json.dumps(record))
+        pipe.ltrim(DEAD_LETTER_KEY, 0, WEBHOOK_DEAD_LETTER_MAX - 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not dead-letter the webhook of %s: %s", task_id, e)
+
+
+def dead_letters(limit: int = 100) -> List[dict]:
+    """The most recent dead-lettered deliveries, newest first."""
+    try:
+        raw = _get_client().lrange(DEAD_LETTER_KEY, 0, limit - 1)
+    except redis.RedisError as e:
+        logger.warning("Could not read webhook dead letters: %s", e)
+        return []
+    return [json.loads(item) for item in raw]
+
+
+# -------------------------------
+# Test receiver
+# -------------------------------
+def receive(port: int, secret: Optional[str], fail: int) -> None:
+    state = {"deliveries": 0}
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            state["deliveries"] += 1
+            if state["deliveries"] <= fail:
+                print(f"[{state['deliveries']}] {self.headers.get(DELIVERY_HEADER)}: failing on purpose (503)")
+                self.send_response(503)
+                self.end_headers()
+                return
+            signature = self.headers.get(SIGNATURE_HEADER)
+            valid = verify(secret, self.headers.get(TIMESTAMP_HEADER), body, signature) if secret else None
+            print(f"[{state['deliveries']}] {self.headers.get(DELIVERY_HEADER)} signature="
+                  f"{'valid' if valid else 'INVALID' if secret else 'unchecked'}: {body.decode('utf-8')}")
+            self.send_response(204 if valid is not False else 401)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Listening on http://127.0.0.1:{port}/")
+    HTTPServer(("127.0.0.1", port), Receiver).serve_forever()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local receiver for testing render webhooks")
+    parser.add_argument("command", choices=["receive"])
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--secret", default=None, help="verify signatures with this secret")
+    parser.add_argument("--fail", type=int, default=0, help="answer the first N deliveries with 503")
+    args = parser.parse_args()
+    try:
+        receive(args.port, args.secret, args.fail)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
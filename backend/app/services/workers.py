@@ -0,0 +1,65 @@
+# app/services/workers.py
+"""
+Registry of live render workers and what their toolchain can do, kept in a
+Redis hash (hostname -> JSON). Workers write their entry at boot and remove
+it on shutdown, so operators and the router can see where LaTeX is available.
+"""
+import json
+import time
+from typing import Dict, List
+
+import redis
+from app.config import BROKER_VISIBILITY_TIMEOUT, REDIS_URL, TASK_MAX_DELIVERIES
+from app.core.logging import logger
+
+WORKERS_KEY = "manimate:workers"
+DELIVERIES_KEY_PREFIX = "manimate:deliveries:"
+
+_redis_client = None
+
+
+def _get_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def advertise(hostname: str, capabilities: dict, queues: List[str]) -> None:
+    entry = {**capabilities, "queues": queues, "advertised_at": time.time()}
+    try:
+        _get_client().hset(WORKERS_KEY, hostname, json.dumps(entry))
+    except redis.RedisError as e:
+        logger.warning("Could not advertise worker %s: %s", hostname, e)
+
+
+def withdraw(hostname: str) -> None:
+    try:
+        _get_client().hdel(WORKERS_KEY, hostname)
+    except redis.RedisError as e:
+        logger.warning("Could not withdraw worker %s: %s", hostname, e)
+
+
+def list_workers() -> Dict[str, dict]:
+    """Advertised workers by hostname; empty if Redis is unreachable."""
+    try:
+        raw = _get_client().hgetall(WORKERS_KEY)
+    except redis.RedisError as e:
+        logger.warning("Could not list workers: %s", e)
+        return {}
+    return {host.decode("utf-8"): json.loads(entry) for host, entry in raw.items()}
+
+
+def count_delivery(task_id: str) -> int:
+    """How many times a worker has started this task, this time included. 1 if Redis is unreachable."""
+    key = DELIVERIES_KEY_PREFIX + task_id
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        pipe.incr(key)
+        # Redeliveries happen one visibility timeout apart
+        pipe.expire(key, BROKER_VISIBILITY_TIMEOUT * (TASK_MAX_DELIVERIES + 1))
+        deliveries, _ = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not count delivery of %s: %s", task_id, e)
+        return 1
+    return int(deliveries)
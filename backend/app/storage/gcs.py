@@ -1,21 +1,34 @@
 # app/storage/gcs.py
-from google.cloud import storage
-from app.config import GCP_PROJECT_ID, GCS_BUCKET_NAME
+from functools import lru_cache
+from app.config import GCP_PROJECT_ID
 
-def upload_to_gcs(file_path: str, bucket_name: str, destination_blob_name: str):
+@lru_cache(maxsize=1)
+def get_storage_client():
+    # Imported lazily: google.cloud.storage is slow to import and only
+    # needed once a render actually finishes.
+    from google.cloud import storage
+    # The client will automatically find and use the credentials file
+    # specified in your .env file. No manual path needed!
+    return storage.Client(project=GCP_PROJECT_ID)
+
+def upload_to_gcs(file_path: str, bucket_name: str, destination_blob_name: str, content_type: str = None):
     """
     Uploads a file to GCS. It automatically finds credentials from the
     GOOGLE_APPLICATION_CREDENTIALS environment variable.
     """
-    # The client will automatically find and use the credentials file
-    # specified in your .env file. No manual path needed!
-    storage_client = storage.Client(project=GCP_PROJECT_ID)
+    storage_client = get_storage_client()
     
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
 
     # Upload the file and make it public
-    blob.upload_from_filename(file_path)
+    blob.upload_from_filename(file_path, content_type=content_type)
  
 
-    return blob.public_url
\ No newline at end of file
+    return blob.public_url
+
+def download_from_gcs(bucket_name: str, blob_name: str, destination_path: str):
+    """Downloads a previously uploaded object to a local file."""
+    storage_client = get_storage_client()
+    storage_client.bucket(bucket_name).blob(blob_name).download_to_filename(destination_path)
+    return destination_path
@@ -0,0 +1,138 @@
+# app/storage/local.py
+"""
+Local-disk storage for deployments without GCS. Files are served by the
+/api/videos endpoint.
+
+Each stored file has a JSON sidecar under `.meta/` holding its SHA-256 and
+content type. The hash is computed while copying, so the strong ETag costs
+nothing at serve time. Files written by other means are hashed on first
+request and the result is cached.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from app.config import LOCAL_STORAGE_BASE_URL, LOCAL_STORAGE_DIR
+
+META_DIR = ".meta"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    path: str
+    size: int
+    mtime: float
+    etag: str  # strong validator: quoted SHA-256 of the content
+    content_type: str
+
+
+def _root() -> str:
+    return os.path.realpath(LOCAL_STORAGE_DIR)
+
+
+def resolve_key(key: str) -> Optional[str]:
+    """Absolute path for a storage key, or None if it escapes the store or names metadata."""
+    parts = key.replace("\\", "/").split("/")
+    if not key or any(part in ("", ".", "..") or part.startswith(".") for part in parts):
+        return None
+    root = _root()
+    path = os.path.realpath(os.path.join(root, *parts))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def _meta_path(key: str) -> str:
+    return os.path.join(_root(), META_DIR, *key.split("/")) + ".json"
+
+
+def upload_to_local(file_path: str, bucket_name: str, destination_blob_name: str, content_type: str = None):
+    """
+    Same signature as upload_to_gcs. `bucket_name` is ignored; the file is
+    copied into LOCAL_STORAGE_DIR atomically and its public URL returned.
+    """
+    destination = resolve_key(destination_blob_name)
+    if destination is None:
+        raise ValueError(f"Invalid storage key: {destination_blob_name}")
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=".upload-")
+    try:
+        with open(file_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            while chunk := src.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                dst.write(chunk)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    stat = os.stat(destination)
+    meta_path = _meta_path(destination_blob_name)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "sha256": digest.hexdigest(),
+            "content_type": content_type or mimetypes.guess_type(destination)[0],
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }, f)
+
+    return f"{LOCAL_STORAGE_BASE_URL}/{destination_blob_name}"
+
+
+def download_from_local(bucket_name: str, blob_name: str, destination_path: str):
+    """Same signature as download_from_gcs: copies a stored file out of the store."""
+    source = resolve_key(blob_name)
+    if source is None or not os.path.isfile(source):
+        raise FileNotFoundError(f"No stored file for key: {blob_name}")
+    shutil.copyfile(source, destination_path)
+    return destination_path
+
+
+@lru_cache(maxsize=4096)
+def _content_meta(key: str, path: str, size: int, mtime_ns: int, inode: int) -> tuple:
+    # Keyed on the stat identity, so a replaced file misses the cache.
+    try:
+        with open(_meta_path(key), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("size") == size and meta.get("mtime_ns") == mtime_ns:
+            return meta["sha256"], meta.get("content_type")
+    except (OSError, ValueError, KeyError):
+        pass
+    with open(path, "rb") as f:
+        sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+    return sha256, None
+
+
+def stat_key(key: str) -> Optional[StoredFile]:
+    """Metadata for a stored file, or None if it does not exist. May hash the file on a cold cache."""
+    path = resolve_key(key)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    sha256, content_type = _content_meta(key, path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    return StoredFile(
+        path=path,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        etag=f'"{sha256}"',
+        content_type=content_type or mimetypes.guess_type(path)[0] or "application/octet-stream",
+    )
@@ -1,88 +1,594 @@
 # app/tasks.py
+import hashlib
 import subprocess
 import tempfile
 import os
-import sys
+import signal
+import time
 import shutil
-from celery import Celery
-from app.config import REDIS_URL, GCS_BUCKET_NAME
-from app.storage.gcs import upload_to_gcs
-from app.core.logging import logger
-celery = Celery(__name__, broker=REDIS_URL, backend=REDIS_URL)
+from concurrent.futures import ThreadPoolExecutor
+import redis
+from celery import states
+from celery.signals import (
+    celeryd_after_setup, task_prerun, task_postrun, task_revoked, worker_ready, worker_process_shutdown,
+    worker_shutdown,
+)
+from app.celery_app import celery, BASIC_QUEUE, COLLECT_SCENES_TASK, GENERATE_TASK, LATEX_QUEUE, RENDER_TASK
+from app.config import (
+    CANCEL_KILL_GRACE, CANCEL_POLL_INTERVAL, GCS_BUCKET_NAME, GENERATION_QUEUE, PREFLIGHT_ENABLED, PREFLIGHT_TIMEOUT, STORAGE_BACKEND, UPLOAD_CONCURRENCY, WORKER_METRICS_PORT,
+    QUALITY_DEGRADATION_ENABLED, QUALITY_UPGRADE_DELAY, QUALITY_UPGRADE_MAX_ATTEMPTS, RENDER_WORKER_SLOTS,
+    SCENE_STITCH_ENABLED, TASK_ACKS_LATE, TASK_MAX_DELIVERIES, WEBHOOK_MAX_ATTEMPTS, WORKER_STAGES,
+)
+from app.storage.gcs import download_from_gcs, upload_to_gcs
+from app.storage.local import download_from_local, upload_to_local
+from app.services.postprocess import concat_videos, count_frames, ffmpeg_available, postprocess_video
+from app.services.render_stats import estimate_render_seconds, record_render_seconds, record_render_usage
+from app.services import admission, cancellation, jobs, prompt_index, quality_policy, webhooks, workers
+from app.services.status import format_status, is_terminal
+from app.services.render_cache import artifact_name, get_cached_render, render_key, store_render
+from app.core import accounting, manim_launcher, metrics, tracing
+from app.core.encoding import ENCODER_ENV, PROFILES, profile_for
+from app.core.logging import bind, logger, shutdown_logging, unbind
+from app.core.quality import QUALITY_MAP, QUALITY_DIR_MAP
+from app.core.toolchain import get_toolchain
+from app.utils.helpers import needs_latex
+
+# Pre-flight: run construct() at the lowest quality, jump every animation to its
+# final state (-s) and write nothing to disk (--dry_run).
+PREFLIGHT_FLAGS = ["-ql", "-s", "--dry_run", "--disable_caching"]
+
+
+# -------------------------------
+# Metrics and tracing hooks
+# -------------------------------
+# Open worker-side spans and bound log ids, keyed by task id, between task_prerun and task_postrun.
+_task_spans = {}
+_task_log_ids = {}
+
+
+@task_prerun.connect
+def _observe_queue_wait(task_id=None, task=None, **kwargs):
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+    if enqueued_at:
+        metrics.QUEUE_WAIT_SECONDS.labels(task.name).observe(max(time.time() - enqueued_at, 0.0))
+    _task_spans[task_id] = tracing.begin_span(
+        f"celery.{task.name}",
+        parent=getattr(task.request, "traceparent", None),
+        task_id=task_id,
+    )
+    _task_log_ids[task_id] = bind(task_id=task_id, render_id=getattr(task.request, "render_id", None),
+                                  trace_id=_task_spans[task_id].trace_id)
+
+
+@task_postrun.connect
+def _count_task_failures(task_id=None, task=None, retval=None, state=None, **kwargs):
+    failed = isinstance(retval, dict) and retval.get("status", "").upper() == "FAILURE"
+    if failed:
+        metrics.FAILURES.labels(
+            retval.get("stage", "worker"), retval.get("error_type", "unknown")
+        ).inc()
+    if state != states.IGNORED:
+        # A generation stage that handed its job to the render stage keeps the slot for it
+        admission.release(getattr(task.request, "client_id", None), task_id)
+    if task.name in (RENDER_TASK, COLLECT_SCENES_TASK):
+        # Only the task id the API handed out has a pending prompt
+        if isinstance(retval, dict) and retval.get("status") == "success":
+            prompt_index.confirm(task_id)
+        else:
+            prompt_index.discard(task_id)
+    if task.name in (GENERATE_TASK, RENDER_TASK, COLLECT_SCENES_TASK):
+        # Renders that will be retried, and handed-over generation stages, are not terminal yet
+        payload = format_status(task_id, {"status": state, "result": retval})
+        if is_terminal(payload):
+            jobs.advance(task_id, jobs.DONE)
+            webhooks.schedule(task_id, payload)
+    span = _task_spans.pop(task_id, None)
+    if span is not None:
+        span.set_attribute("celery.state", state or "")
+        if failed:
+            span.error = retval.get("message")
+        tracing.end_span(span)
+    token = _task_log_ids.pop(task_id, None)
+    if token is not None:
+        unbind(token)
+
+
+@task_revoked.connect
+def _release_revoked(request=None, expired=False, **kwargs):
+    # A revoked message never reaches task_postrun: free what the API reserved for it
+    if request is None:
+        return
+    # The worker's Request for a reserved message it drops, the task Context for one revoked at execution time
+    fields = request.request_dict if hasattr(request, "request_dict") else vars(request)
+    task_id, task_name = fields.get("id"), fields.get("task")
+    admission.release(fields.get("client_id"), task_id)
+    if task_name in (GENERATE_TASK, RENDER_TASK, COLLECT_SCENES_TASK):
+        prompt_index.discard(task_id)
+    if task_name == RENDER_TASK and not expired:
+        args = list(fields.get("args") or ())
+        quality_flag = QUALITY_MAP.get(args[2] if len(args) > 2 else "low", "-ql")
+        metrics.CANCELLATIONS.labels(cancellation.REASON_CLIENT, "queued").inc()
+        metrics.RECLAIMED_SECONDS.labels(cancellation.REASON_CLIENT).inc(estimate_render_seconds(quality_flag))
+
+
+@worker_ready.connect
+def _start_metrics_exporter(**kwargs):
+    if WORKER_METRICS_PORT:
+        metrics.start_exporter(WORKER_METRICS_PORT)
+        logger.info("Worker metrics exporter listening on :%s", WORKER_METRICS_PORT)
+
+
+# -------------------------------
+# Toolchain probing and queue selection
+# -------------------------------
+def subscribe_render_queues(app) -> list:
+    """Adds the render queues this worker's toolchain can serve to the ones it consumes."""
+    toolchain = get_toolchain()
+    queues = [BASIC_QUEUE] + ([LATEX_QUEUE] if toolchain.has_latex else [])
+    for queue in queues:
+        app.amqp.queues.select_add(queue)
+    return queues
+
+
+@celeryd_after_setup.connect
+def _probe_toolchain(sender=None, instance=None, **kwargs):
+    # Runs once in the main worker process, before it starts consuming
+    queues = subscribe_render_queues(instance.app) if "render" in WORKER_STAGES else []
+    if "generation" in WORKER_STAGES:
+        instance.app.amqp.queues.select_add(GENERATION_QUEUE)
+        queues.append(GENERATION_QUEUE)
+    toolchain = get_toolchain()
+    logger.info(
+        "Worker %s toolchain: latex=%s dvisvgm=%s ffmpeg=%s libraries=%s cpus=%s; consuming %s",
+        sender, toolchain.latex, toolchain.dvisvgm, toolchain.ffmpeg_version,
+        toolchain.libraries, toolchain.cpu_count, queues,
+    )
+    if not toolchain.has_latex and "render" in WORKER_STAGES:
+        logger.warning("No latex/dvisvgm on %s: scenes using Tex/MathTex will not be routed here", sender)
+    workers.advertise(sender, toolchain.capabilities(), queues)
+
+
+@worker_shutdown.connect
+def _withdraw_worker(sender=None, **kwargs):
+    workers.withdraw(getattr(sender, "hostname", str(sender)))
+
+
+@worker_process_shutdown.connect
+def _cleanup_metrics(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+    tracing.shutdown_tracing()
+    shutdown_logging()
+
+
+def _manim_command(scene_file_path: str, scene_name: str, *flags: str) -> list:
+    # The launcher is the Manim CLI plus the encoder profile from ENCODER_ENV
+    return manim_launcher.command(scene_file_path, scene_name, *flags, "--renderer=cairo")
+
+
+def _encoder_env(quality_flag: str) -> dict:
+    """Environment for a render at `quality_flag`: the launcher's, plus the tier's encoder profile unless it keeps Manim's."""
+    profile = profile_for(quality_flag)
+    if profile == PROFILES["manim"]:
+        return manim_launcher.environment()
+    return manim_launcher.environment({**os.environ, ENCODER_ENV: profile.to_json()})
+
+
+def _kill_process_group(process: subprocess.Popen):
+    """
+    Stops Manim and everything it spawned (ffmpeg, latex, dvisvgm): SIGTERM to
+    the process group, SIGKILL if it lingers. Returns the remaining (stdout, stderr).
+    """
+    if os.name != "posix":
+        process.kill()
+        return process.communicate()
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            return process.communicate(timeout=CANCEL_KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            continue
+    return process.communicate()
+
+
+def _run_manim(command: list, cwd: str, timeout: float = None, cancel_check=None, env: dict = None):
+    """
+    Runs a Manim CLI command in its own process group. Returns (returncode,
+    stdout, stderr); returncode is None when the process had to be killed after
+    `timeout` seconds. `cancel_check` is called every CANCEL_POLL_INTERVAL
+    seconds; if it returns a reason, the process group is killed and
+    RenderCancelled is raised.
+    """
+    # Reaped with wait4: the usage of Manim and its children goes to the caller's accounting.collect()
+    process = accounting.AccountedPopen(
+        command, cwd=cwd,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, encoding='utf-8', env=env,
+        start_new_session=os.name == "posix",
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        wait = CANCEL_POLL_INTERVAL if cancel_check else None
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.0)
+            wait = remaining if wait is None else min(wait, remaining)
+        try:
+            # Safe to retry after TimeoutExpired: output read so far is kept
+            stdout, stderr = process.communicate(timeout=wait)
+            return process.returncode, stdout, stderr
+        except subprocess.TimeoutExpired:
+            if deadline is not None and time.monotonic() >= deadline:
+                stdout, stderr = _kill_process_group(process)
+                return None, stdout, stderr
+            reason = cancel_check()
+            if reason:
+                _kill_process_group(process)
+                raise cancellation.RenderCancelled(reason)
+
+
+def _summarize_error(stderr: str) -> str:
+    """Pulls the final exception line (e.g. "NameError: ...") out of Manim's output."""
+    lines = [line.strip(" │╭╰─") for line in (stderr or "").splitlines()]
+    lines = [line for line in lines if line]
+    for line in reversed(lines):
+        if "Error" in line or "Exception" in line:
+            return line
+    return lines[-1] if lines else "Unknown error"
+
+
+def _preflight_scene(scene_file_path: str, scene_name: str, cwd: str, quality_flag: str, cancel_check=None):
+    """
+    Executes construct() without rendering frames or writing video. Returns None
+    if the scene is safe to render, otherwise a structured FAILURE result.
+    """
+    started = time.monotonic()
+    command = _manim_command(scene_file_path, scene_name, *PREFLIGHT_FLAGS)
+    with tracing.start_span("manim.preflight", scene=scene_name) as span:
+        returncode, stdout, stderr = _run_manim(command, cwd, timeout=PREFLIGHT_TIMEOUT, cancel_check=cancel_check,
+                                                env=manim_launcher.environment())
+        span.set_attribute("returncode", -1 if returncode is None else returncode)
+    elapsed = time.monotonic() - started
+    metrics.PREFLIGHT_SECONDS.labels("passed" if returncode == 0 else "failed").observe(elapsed)
+
+    if returncode == 0:
+        logger.info("Pre-flight passed for scene %s in %.2fs", scene_name, elapsed)
+        return None
+
+    saved_seconds = max(estimate_render_seconds(quality_flag) - elapsed, 0.0)
+    if returncode is None:
+        error_type = "preflight_timeout"
+        message = f"Pre-flight check timed out after {PREFLIGHT_TIMEOUT}s."
+    else:
+        error_type = "preflight_error"
+        message = f"Pre-flight check failed: {_summarize_error(stderr)}"
+    logger.warning(
+        "Pre-flight failed for scene %s in %.2fs (%s), saved ~%.1f worker-seconds",
+        scene_name, elapsed, error_type, saved_seconds,
+    )
+    return {
+        "status": "FAILURE",
+        "stage": "preflight",
+        "error_type": error_type,
+        "message": message,
+        "logs": f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}",
+        "preflight_seconds": round(elapsed, 3),
+        "saved_seconds": round(saved_seconds, 3),
+    }
+
+
+def _account_usage(quality_dir: str, style: str, stages: dict, video_bytes: int, upload_bytes: int,
+                   frames: int = None) -> dict:
+    """Records a finished render's usage per stage in metrics; returns the compact form kept with the result."""
+    for stage, usage in stages.items():
+        metrics.TASK_CPU_SECONDS.labels(quality_dir, style, stage).observe(usage.cpu)
+        metrics.TASK_WRITTEN_BYTES.labels(quality_dir, style, stage).inc(usage.written_bytes)
+    metrics.RENDER_PEAK_RSS_BYTES.labels(quality_dir, style).observe(stages["render"].peak_rss)
+    metrics.RENDER_OUTPUT_BYTES.labels(quality_dir, style).observe(video_bytes)
+    if frames:
+        metrics.RENDERED_FRAMES.labels(quality_dir, style).inc(frames)
+    summary = {stage: usage.compact() for stage, usage in stages.items()}
+    summary.update(video_bytes=video_bytes, upload_bytes=upload_bytes, frames=frames)
+    return summary
+
+
+def _cancelled(reason: str, phase: str, scene_name: str, quality_flag: str, spent_seconds: float) -> dict:
+    """Result of a cancelled render; the render time it no longer needs counts as reclaimed."""
+    reclaimed = max(estimate_render_seconds(quality_flag) - spent_seconds, 0.0)
+    metrics.CANCELLATIONS.labels(reason, phase).inc()
+    metrics.RECLAIMED_SECONDS.labels(reason).inc(reclaimed)
+    logger.info("Render of scene %s cancelled while %s (%s), reclaimed ~%.1f worker-seconds",
+                scene_name, phase, reason, reclaimed)
+    return cancellation.cancelled_result(reason, reclaimed)
+
+
+upload_file = upload_to_local if STORAGE_BACKEND == "local" else upload_to_gcs
+download_file = download_from_local if STORAGE_BACKEND == "local" else download_from_gcs
+
+CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+
+def _delivery_artifacts(processed, stem: str) -> list:
+    """(local_path, blob_name) pairs for everything that should be uploaded."""
+    artifacts = [(processed.video_path, f"{stem}.mp4")]
+    if processed.poster_path:
+        artifacts.append((processed.poster_path, f"{stem}.jpg"))
+    if processed.hls_dir:
+        for root, _, files in os.walk(processed.hls_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, processed.hls_dir).replace(os.sep, "/")
+                artifacts.append((path, f"{stem}/hls/{relative}"))
+    return artifacts
+
+
+def _upload_artifacts(artifacts: list) -> dict:
+    """Uploads all artifacts in parallel; returns blob_name -> public URL."""
+    def upload(artifact):
+        path, blob_name = artifact
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1])
+        return blob_name, upload_file(path, GCS_BUCKET_NAME, blob_name, content_type=content_type)
+
+    if len(artifacts) == 1:
+        return dict([upload(artifacts[0])])
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_CONCURRENCY, len(artifacts))) as pool:
+        return dict(pool.map(upload, artifacts))
 
-MIKTEX_BIN_PATH = r"C:\Program Files\MiKTeX\miktex\bin\x64"
 
 @celery.task(bind=True)
-def render_manim_scene(self, manim_code: str, scene_name: str, quality: str = "low"):
+def render_manim_scene(self, manim_code: str, scene_name: str, quality: str = "low", requested_quality: str = None):
     """
     [FINAL CORRECTED VERSION] This version maps the descriptive quality names
     (e.g., '3b1b-style') to the correct single-letter flags required by ManimCE.
+    A dry-run pre-flight runs first so broken scenes fail in seconds instead of
+    after a full-quality render. `requested_quality` is set when load
+    shedding chose a lower `quality` than the client asked for.
     """
-    logger.info(f"Celery worker received render task for scene: {scene_name}")
-    logger.debug(f"--- Code to be rendered for {scene_name} ---\n{manim_code}\n--------------------")
+    logger.info("Celery worker received render task for scene: %s", scene_name)
+    logger.debug("--- Code to be rendered for %s ---\n%s\n--------------------", scene_name, manim_code)
+    # Late acks redeliver a render whose worker died; one that keeps killing workers must stop.
+    # upgrade_render calls this task in-process, without a message (or id) of its own.
+    if TASK_ACKS_LATE and self.request.id and workers.count_delivery(self.request.id) > TASK_MAX_DELIVERIES:
+        return {"status":"FAILURE", "stage": "worker", "error_type": "worker_lost", "message":f"The render was interrupted {TASK_MAX_DELIVERIES} times (worker crash or out of memory)."}
+    # Default to low quality if an unknown string is passed.
+    quality_flag = QUALITY_MAP.get(quality, "-ql")
+    # Set by the API (one of the known styles or "other"); only used to label resource metrics
+    style = getattr(self.request, "style", None) or "unknown"
+    # Scenes of a multi-scene render are cancelled through the id clients poll
+    render_id = getattr(self.request, "render_id", None) or self.request.id
+    cancel_check = (lambda: cancellation.cancel_reason(render_id)) if render_id else None
+    started = time.monotonic()
+    if cancel_check:
+        reason = cancel_check()
+        if reason:
+            return _cancelled(reason, "queued", scene_name, quality_flag, 0.0)
+    jobs.advance(render_id, jobs.RENDERING)
+    metrics.ACTIVE_RENDERS.inc()
+    track_utilization = QUALITY_DEGRADATION_ENABLED and RENDER_WORKER_SLOTS > 0
+    if track_utilization:
+        quality_policy.render_started()
     try:
-        latex_path = os.path.join(MIKTEX_BIN_PATH, "latex.exe")
-        if not os.path.exists(latex_path):
-            return {"status":"Failure", "message":"CRITICAL: latex.exe not found."}
+        cache_key = render_key(manim_code, scene_name, quality)
+        cached = get_cached_render(cache_key)
+        if cached:
+            logger.info("Render cache hit for scene %s at %s", scene_name, quality)
+            metrics.RENDER_CACHE_HITS.labels("worker").inc()
+            metrics.SECONDS_SAVED.labels("render_cache").inc(estimate_render_seconds(QUALITY_MAP.get(quality, "-ql")))
+            result = {**cached, "cached": True, "logs": ""}
+            if requested_quality and requested_quality != quality:
+                result["requested_quality"] = requested_quality
+            return result
+
+        toolchain = get_toolchain()
+        if not toolchain.has_latex and needs_latex(manim_code):
+            return {"status":"FAILURE", "stage": "setup", "error_type": "toolchain_missing", "message":"This scene uses LaTeX (Tex/MathTex) but this worker has no latex/dvisvgm."}
 
-        python_executable = sys.executable
         corrected_code = manim_code.replace("from manimlib import *", "from manim import *")
 
         with tempfile.TemporaryDirectory() as temp_dir:
             scene_file_path = os.path.join(temp_dir, "scene.py")
             config_path = os.path.join(temp_dir, "manim.cfg")
-            config_content = f"[CLI]\ntex_executable = {latex_path.replace('\\', '/')}\n"
-            
+            config_content = toolchain.manim_cfg()
+
             with open(config_path, "w") as f:
                 f.write(config_content)
             with open(scene_file_path, "w", encoding="utf-8") as f:
                 f.write(corrected_code)
 
-            # --- THE FINAL, CRITICAL FIX ---
-            # Map descriptive quality names to Manim's single-letter flags.
-            QUALITY_MAP = {
-                "minimal": "-ql",
-                "draft": "-ql",
-                "low": "-ql",
-                "polished": "-qm",
-                "medium": "-qm",
-                "3b1b-style": "-qh", # 3b1b-style implies high quality
-                "high": "-qh",
-                "production": "-qk" # For 4k if needed
-            }
-            # Default to low quality if an unknown string is passed.
-            quality_flag = QUALITY_MAP.get(quality, "-ql")
-
-            # Also map to the correct output directory name
-            QUALITY_DIR_MAP = {
-                "-ql": "480p15",
-                "-qm": "720p30",
-                "-qh": "1080p60",
-                "-qk": "2160p60"
-            }
             quality_dir = QUALITY_DIR_MAP.get(quality_flag, "480p15")
             output_file_path = os.path.join(temp_dir, "media", "videos", "scene", quality_dir, f"{scene_name}.mp4")
 
+            stages = {}
+            if PREFLIGHT_ENABLED:
+                with accounting.collect() as stages["preflight"]:
+                    preflight_failure = _preflight_scene(scene_file_path, scene_name, temp_dir, quality_flag, cancel_check)
+                if preflight_failure:
+                    return preflight_failure
+
             # The command is now correct and uses the mapped flag.
-            command = [
-                python_executable, "-m", "manim",
-                scene_file_path, scene_name, quality_flag,
-                "--renderer=cairo"
-            ]
-
-            process = subprocess.Popen(
-                command, cwd=temp_dir,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                text=True, encoding='utf-8'
-            )
-            stdout, stderr = process.communicate()
-            
+            command = _manim_command(scene_file_path, scene_name, quality_flag)
+
+            render_started = time.monotonic()
+            encoder = profile_for(quality_flag)
+            with tracing.start_span("manim.render", scene=scene_name, quality=quality_dir, encoder=encoder.name) as span, \
+                    accounting.collect() as stages["render"]:
+                returncode, stdout, stderr = _run_manim(command, temp_dir, cancel_check=cancel_check,
+                                                        env=_encoder_env(quality_flag))
+                span.set_attribute("returncode", -1 if returncode is None else returncode)
+            render_seconds = time.monotonic() - render_started
+            metrics.RENDER_SECONDS.labels(quality_dir).observe(render_seconds)
+
             if not os.path.exists(output_file_path):
-                return { "status": "FAILURE", "message": "Render completed, but the output file path was incorrect or not found.", "logs": f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"}
+                return { "status": "FAILURE", "stage": "render", "error_type": "render_error", "message": "Render completed, but the output file path was incorrect or not found.", "logs": f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"}
+            record_render_seconds(quality_flag, render_seconds)
+            if stages["render"].peak_rss and render_seconds > 0:
+                # Calibrates the autoscaler's cost table for this quality
+                record_render_usage(quality_flag, stages["render"].cpu / render_seconds, stages["render"].peak_rss)
+
+            # Faststart, poster frame and optional HLS renditions
+            with tracing.start_span("postprocess", quality=quality_dir):
+                processed = postprocess_video(output_file_path, temp_dir, quality_dir, encoder)
+            if processed.usage:
+                stages["postprocess"] = processed.usage
+
+            # Content-addressed names: different code or quality never overwrites a cached URL
+            stem = artifact_name(scene_name, cache_key)
+            artifacts = _delivery_artifacts(processed, stem)
+            jobs.advance(render_id, jobs.UPLOADING)
+            with tracing.start_span("storage.upload", files=len(artifacts)), metrics.UPLOAD_SECONDS.time(), \
+                    accounting.measure_process() as stages["upload"]:
+                urls = _upload_artifacts(artifacts)
+            video_bytes = os.path.getsize(processed.video_path)
+            upload_bytes = sum(os.path.getsize(path) for path, _ in artifacts)
 
-            destination_blob_name = f"{scene_name}.mp4"
-            public_url = upload_to_gcs(output_file_path, GCS_BUCKET_NAME, destination_blob_name)
-            return { "status": "success", "url": public_url, "logs": stdout }
+            result = { "status": "success", "url": urls[f"{stem}.mp4"], "logs": stdout, "quality": quality, "scene_name": scene_name, "video_blob": f"{stem}.mp4" }
+            if processed.poster_path:
+                result["poster_url"] = urls[f"{stem}.jpg"]
+            if processed.hls_dir:
+                result["hls_url"] = urls[f"{stem}/hls/master.m3u8"]
+            if processed.timings:
+                result["postprocess_seconds"] = processed.timings
+            store_render(cache_key, result)
+            # Not cached: a render cache hit costs none of this
+            result["usage"] = _account_usage(quality_dir, style, stages, video_bytes, upload_bytes,
+                                             count_frames(processed.video_path))
+            if requested_quality and requested_quality != quality:
+                result["requested_quality"] = requested_quality
+            return result
 
+    except cancellation.RenderCancelled as e:
+        # The temporary workspace is already gone: TemporaryDirectory cleaned up on the way out
+        return _cancelled(e.reason, "running", scene_name, quality_flag, time.monotonic() - started)
     except Exception as e:
-        return { "status": "FAILURE", "message": f"An unexpected error occurred: {str(e)}", "logs": "" }
\ No newline at end of file
+        return { "status": "FAILURE", "stage": "worker", "error_type": "unexpected_error", "message": f"An unexpected error occurred: {str(e)}", "logs": "" }
+    finally:
+        metrics.ACTIVE_RENDERS.dec()
+        if track_utilization:
+            quality_policy.render_finished()
+
+
+@celery.task(bind=True, max_retries=QUALITY_UPGRADE_MAX_ATTEMPTS)
+def upgrade_render(self, degraded_result, manim_code: str, scene_name: str, quality: str):
+    """
+    Linked after a degraded render: once load subsides, re-renders the scene
+    at the quality the client asked for. Clients poll this task for the
+    upgraded URL.
+    """
+    if not isinstance(degraded_result, dict) or degraded_result.get("status") != "success":
+        return {"status": "FAILURE", "stage": "upgrade", "error_type": "upgrade_skipped",
+                "message": "The degraded render did not succeed; nothing to upgrade."}
+    if quality_policy.under_pressure():
+        if self.request.retries >= self.max_retries:
+            return {"status": "FAILURE", "stage": "upgrade", "error_type": "load_not_subsided",
+                    "message": f"Load stayed high; keeping the {degraded_result.get('quality')} render."}
+        logger.info("Deferring %s upgrade to %s: render queue still under pressure", scene_name, quality)
+        raise self.retry(countdown=QUALITY_UPGRADE_DELAY)
+    return render_manim_scene(manim_code, scene_name, quality)
+
+
+
+@celery.task(bind=True)
+def collect_scene_renders(self, results: list, scene_names: list):
+    """
+    Chord callback for a file with several scenes. `results` arrive in source
+    order. When stitching is enabled and ffmpeg is available, the parts are
+    concatenated into one video; otherwise the first scene's URL is the
+    primary one and every part is listed under `scenes`.
+    """
+    scenes = []
+    for scene_name, result in zip(scene_names, results):
+        entry = {"scene_name": scene_name, "status": "SUCCESS" if result.get("status") == "success" else "FAILURE"}
+        entry.update({k: result[k] for k in ("url", "poster_url", "message", "error_type", "stage") if result.get(k)})
+        scenes.append(entry)
+
+    failed = [(name, result) for name, result in zip(scene_names, results) if result.get("status") != "success"]
+    if failed:
+        name, result = failed[0]
+        return {
+            "status": "FAILURE",
+            "stage": result.get("stage", "render"),
+            "error_type": result.get("error_type", "render_error"),
+            "message": f"Scene {name} failed ({len(failed)}/{len(scene_names)} scenes failed): {result.get('message')}",
+            "logs": result.get("logs", ""),
+            "scenes": scenes,
+        }
+
+    combined = {
+        "status": "success",
+        "url": results[0]["url"],
+        "quality": results[0].get("quality"),
+        "scenes": scenes,
+        "stitched": False,
+        "logs": "",
+    }
+    if results[0].get("requested_quality"):
+        combined["requested_quality"] = results[0]["requested_quality"]
+    if results[0].get("poster_url"):
+        combined["poster_url"] = results[0]["poster_url"]
+    if not SCENE_STITCH_ENABLED:
+        return combined
+    if not ffmpeg_available():
+        logger.warning("ffmpeg not found; returning %d scenes unstitched", len(scene_names))
+        return combined
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with tracing.start_span("storage.download", files=len(scene_names)):
+                parts = [
+                    download_file(GCS_BUCKET_NAME, result["video_blob"], os.path.join(temp_dir, f"{index:03d}.mp4"))
+                    for index, result in enumerate(results)
+                ]
+            parts_digest = hashlib.sha256("\n".join(r["video_blob"] for r in results).encode("utf-8")).hexdigest()
+            blob_name = f"{artifact_name(scene_names[0] + '_combined', parts_digest)}.mp4"
+            with tracing.start_span("postprocess.concat", scenes=len(parts)):
+                stitched_path = concat_videos(parts, os.path.join(temp_dir, blob_name))
+            with tracing.start_span("storage.upload", files=1), metrics.UPLOAD_SECONDS.time():
+                combined["url"] = upload_file(stitched_path, GCS_BUCKET_NAME, blob_name, content_type="video/mp4")
+            combined["stitched"] = True
+    except Exception as e:
+        # The individual scenes are still available
+        logger.warning("Stitching %s failed: %s", scene_names, e)
+    return combined
+
+
+@celery.task(bind=True, max_retries=None)
+def notify_webhook(self, task_id: str, payload: dict):
+    """
+    POSTs a finished render's status payload to its callback URL (see
+    app.services.webhooks), retrying with backoff while the receiver is
+    unreachable or failing. The URL and secret come from the registration,
+    never from the message.
+    """
+    attempt = self.request.retries + 1
+    try:
+        callback = webhooks.registration(task_id)
+    except redis.RedisError:
+        raise self.retry(countdown=webhooks.backoff(self.request.retries))
+    if callback is None:
+        logger.warning("Webhook registration of %s expired before delivery", task_id)
+        return {"status": "FAILURE", "stage": "webhook", "error_type": "webhook_expired",
+                "message": "The callback registration expired before it could be delivered."}
+    url = callback["url"]
+    with tracing.start_span("webhook.deliver", attempt=attempt):
+        status, error = webhooks.deliver(url, callback.get("secret"), task_id, payload)
+    if error is None:
+        metrics.WEBHOOK_DELIVERIES.labels("delivered").inc()
+        webhooks.release(task_id)
+        return {"status": "success", "task_id": task_id, "attempts": attempt, "http_status": status}
+    if webhooks.retryable(status) and attempt < WEBHOOK_MAX_ATTEMPTS:
+        metrics.WEBHOOK_DELIVERIES.labels("retried").inc()
+        countdown = webhooks.backoff(self.request.retries)
+        logger.info("Webhook for %s failed (%s); attempt %d again in %.0fs", task_id, error, attempt + 1, countdown)
+        raise self.retry(countdown=countdown)
+    metrics.WEBHOOK_DELIVERIES.labels("dead_lettered").inc()
+    logger.warning("Giving up on the webhook for %s after %d attempts: %s", task_id, attempt, error)
+    webhooks.dead_letter(task_id, url, payload, attempt, error)
+    webhooks.release(task_id)
+    return {"status": "FAILURE", "stage": "webhook", "error_type": "webhook_failed",
+            "message": f"Delivering to {url} failed after {attempt} attempts: {error}"}
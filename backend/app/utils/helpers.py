@@ -1,16 +1,110 @@
 # app/utils/helpers.py
 
 import ast
+from typing import Dict, List
+
+from app.core.logging import logger
+
+# Manim base classes a renderable scene can derive from
+MANIM_SCENE_BASES = {
+    "Scene",
+    "MovingCameraScene",
+    "ThreeDScene",
+    "SpecialThreeDScene",
+    "ZoomedScene",
+    "VectorScene",
+    "LinearTransformationScene",
+}
+
+
+def _base_name(base: ast.expr) -> str:
+    # Handles both `Scene` and `manim.Scene`
+    if isinstance(base, ast.Name):
+        return base.id
+    if isinstance(base, ast.Attribute):
+        return base.attr
+    return ""
+
+
+def find_scene_classes(code: str) -> List[str]:
+    """
+    Names of every renderable Scene class in source order. Indirect
+    subclasses (class B(A) where class A(ThreeDScene)) count, and a class
+    needs a construct() of its own or from a base in the same file. Bases
+    that exist only to be subclassed (no construct anywhere) are skipped.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        logger.warning("Error extracting scene names: %s", e)
+        return []
+
+    classes: Dict[str, ast.ClassDef] = {
+        node.name: node for node in tree.body if isinstance(node, ast.ClassDef)
+    }
+
+    def is_scene(name: str, seen=()) -> bool:
+        node = classes.get(name)
+        if node is None or name in seen:
+            return False
+        for base in map(_base_name, node.bases):
+            if base in MANIM_SCENE_BASES and base not in classes:
+                return True
+            if is_scene(base, seen + (name,)):
+                return True
+        return False
+
+    def has_construct(name: str, seen=()) -> bool:
+        node = classes.get(name)
+        if node is None or name in seen:
+            return False
+        if any(isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name == "construct"
+               for item in node.body):
+            return True
+        return any(has_construct(_base_name(base), seen + (name,)) for base in node.bases)
+
+    return [name for name in classes if is_scene(name) and has_construct(name)]
+
 
 def extract_scene_name(code: str) -> str:
+    scene_names = find_scene_classes(code)
+    return scene_names[0] if scene_names else "DefaultScene"
+
+
+# Mobjects and helpers that compile LaTeX. Axes labels and number lines with
+# numbers build DecimalNumber/MathTex internally.
+LATEX_CONSTRUCTORS = {
+    "Tex", "MathTex", "SingleStringMathTex", "Title", "BulletedList",
+    "Matrix", "IntegerMatrix", "DecimalMatrix", "MobjectMatrix",
+    "BraceLabel", "BraceText", "DecimalNumber", "Integer", "Variable", "TexTemplate",
+}
+LATEX_METHODS = {
+    "get_axis_labels", "get_x_axis_label", "get_y_axis_label", "get_graph_label",
+    "add_coordinates", "get_tex", "add_labels",
+}
+LATEX_KEYWORDS = {"include_numbers", "tex_template"}
+
+
+def needs_latex(code: str) -> bool:
+    """
+    Whether rendering the code needs a LaTeX toolchain. Errs on the side of
+    True: unparseable code and anything that mentions Tex count.
+    """
     try:
         tree = ast.parse(code)
-        for node in tree.body:
-            if isinstance(node, ast.ClassDef):
-                for base in node.bases:
-                    if hasattr(base, "id") and base.id == "Scene":
-                        return node.name
-        return "DefaultScene"
-    except Exception as e:
-        print("Error extracting scene name:", str(e))
-        return "DefaultScene"
+    except SyntaxError:
+        return "Tex" in code
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if _base_name(node.func) in LATEX_CONSTRUCTORS | LATEX_METHODS:
+                return True
+            options = [(keyword.arg, keyword.value) for keyword in node.keywords]
+        elif isinstance(node, ast.Dict):  # e.g. Axes(x_axis_config={"include_numbers": True})
+            options = [(key.value, value) for key, value in zip(node.keys, node.values)
+                       if isinstance(key, ast.Constant)]
+        else:
+            continue
+        for name, value in options:
+            if name in LATEX_KEYWORDS and not (isinstance(value, ast.Constant) and not value.value):
+                return True
+    return False
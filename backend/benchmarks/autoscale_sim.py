@@ -0,0 +1,208 @@
+# benchmarks/autoscale_sim.py
+"""
+Throughput of worker scheduling policies, by simulation.
+
+Real renders take minutes and gigabytes, so comparing worker settings on real
+hardware is slow and noisy. This discrete-time simulation replays a job mix
+against a small fleet using the production cost table (app.services.autoscale)
+and the production planner (plan_concurrency). It compares three policies:
+
+  * default     - Celery defaults: one process per core, prefetch multiplier 4,
+                  ack on receipt (a render killed by the OOM killer is lost)
+  * prefetch1   - one process per core, prefetch 1, late acks (killed renders
+                  are requeued)
+  * cost_aware  - CostAwareAutoscaler: pool and prefetch follow plan_concurrency,
+                  late acks
+
+Model:
+  * A job runs for its quality's render time when it gets all the cores it
+    asks for. When the running jobs ask for more cores than the machine has,
+    every job slows down in proportion.
+  * A job's resident memory grows from 40% of its peak at start to the peak
+    when it finishes (frames and encoder buffers accumulate). When the running
+    jobs need more memory than the machine has, the kernel kills the largest
+    one and its progress is wasted.
+  * With late acks a killed render is redelivered, up to TASK_MAX_DELIVERIES
+    times; with early acks it is lost.
+  * Each worker reserves messages up to its prefetch limit. A reserved message
+    waits for that worker even while a sibling worker is idle.
+
+Run from the backend directory:
+
+    python -m benchmarks.autoscale_sim
+    python -m benchmarks.autoscale_sim --workers 4 --cores 8 --memory-gb 16 --jobs 400 --mix ql:0.4,qh:0.4,qk:0.2
+"""
+import argparse
+import json
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.config import TASK_MAX_DELIVERIES
+from app.services.autoscale import MB, RENDER_COSTS, Capacity, JobCost, plan_concurrency
+from app.services.render_stats import DEFAULT_RENDER_SECONDS
+
+GB = 1024 * MB
+DT = 0.5  # seconds per simulation step
+SCALE_INTERVAL = 1.0  # the autoscaler thread wakes once a second
+
+
+@dataclass
+class Job:
+    id: int
+    flag: str
+    cost: JobCost
+    seconds: float  # wall time with all requested cores
+    submitted: float
+    progress: float = 0.0
+    finished: Optional[float] = None
+    kills: int = 0
+
+    def resident(self) -> float:
+        return self.cost.memory * (0.4 + 0.6 * min(self.progress / self.seconds, 1.0))
+
+
+@dataclass
+class Worker:
+    cores: int
+    memory: int
+    concurrency: int
+    reserved: List[Job] = field(default_factory=list)
+    running: List[Job] = field(default_factory=list)
+    busy_core_seconds: float = 0.0
+
+
+POLICIES = {
+    "default": {"prefetch_multiplier": 4, "acks_late": False, "cost_aware": False},
+    "prefetch1": {"prefetch_multiplier": 1, "acks_late": True, "cost_aware": False},
+    "cost_aware": {"prefetch_multiplier": 1, "acks_late": True, "cost_aware": True},
+}
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for item in spec.split(","):
+        name, weight = item.split(":")
+        mix[f"-{name.strip()}"] = float(weight)
+    return mix
+
+
+def make_jobs(count: int, mix: dict, arrival_rate: float, seed: int) -> List[Job]:
+    rng = random.Random(seed)
+    flags, weights = list(mix), list(mix.values())
+    jobs, now = [], 0.0
+    for i in range(count):
+        flag = rng.choices(flags, weights=weights, k=1)[0]
+        # +-30% around the default render time for that quality
+        seconds = DEFAULT_RENDER_SECONDS[flag] * rng.uniform(0.7, 1.3)
+        jobs.append(Job(i, flag, RENDER_COSTS[flag], seconds, now))
+        if arrival_rate > 0:
+            now += rng.expovariate(arrival_rate)
+    return jobs
+
+
+def simulate(policy: dict, jobs: List[Job], workers: int, cores: int, memory: int, memory_fraction: float) -> dict:
+    jobs = [Job(j.id, j.flag, j.cost, j.seconds, j.submitted) for j in jobs]
+    pending = sorted(jobs, key=lambda j: j.submitted)
+    queue: List[Job] = []
+    fleet = [Worker(cores, memory, cores) for _ in range(workers)]
+    capacity = Capacity(cpu=float(cores), memory=int(memory * memory_fraction))
+    now, next_scale, lost, kills, wasted = 0.0, 0.0, [], 0, 0.0
+
+    while pending or queue or any(w.reserved or w.running for w in fleet):
+        while pending and pending[0].submitted <= now:
+            queue.append(pending.pop(0))
+
+        if policy["cost_aware"] and now >= next_scale:
+            next_scale = now + SCALE_INTERVAL
+            for worker in fleet:
+                demand = [job.cost for job in worker.running + worker.reserved]
+                worker.concurrency = plan_concurrency(demand, len(queue), capacity, 1, cores)
+
+        for worker in fleet:
+            # Fetch up to the prefetch limit; with late acks running messages count against it
+            if policy["cost_aware"]:
+                limit = worker.concurrency * policy["prefetch_multiplier"]
+            else:
+                limit = cores * policy["prefetch_multiplier"]
+            held = len(worker.reserved) + (len(worker.running) if policy["acks_late"] else 0)
+            while queue and held < limit:
+                worker.reserved.append(queue.pop(0))
+                held += 1
+            while worker.reserved and len(worker.running) < worker.concurrency:
+                worker.running.append(worker.reserved.pop(0))
+
+            # OOM killer: the largest job goes first until the rest fit
+            while sum(job.resident() for job in worker.running) > worker.memory:
+                victim = max(worker.running, key=lambda job: job.resident())
+                worker.running.remove(victim)
+                wasted += victim.progress * victim.cost.cpu
+                victim.progress, victim.kills = 0.0, victim.kills + 1
+                kills += 1
+                if policy["acks_late"] and victim.kills < TASK_MAX_DELIVERIES:
+                    queue.insert(0, victim)  # rejected on worker loss, redelivered
+                else:
+                    lost.append(victim)
+
+            demand = sum(job.cost.cpu for job in worker.running)
+            speed = min(1.0, worker.cores / demand) if demand else 0.0
+            worker.busy_core_seconds += min(demand, worker.cores) * DT
+            for job in list(worker.running):
+                job.progress += DT * speed
+                if job.progress >= job.seconds:
+                    job.finished = now + DT
+                    worker.running.remove(job)
+        now += DT
+
+    done = [job for job in jobs if job.finished is not None]
+    latencies = sorted(job.finished - job.submitted for job in done)
+    makespan = max((job.finished for job in done), default=0.0)
+    return {
+        "completed": len(done),
+        "lost": len(lost),
+        "oom_kills": kills,
+        "wasted_core_seconds": round(wasted),
+        "makespan_seconds": round(makespan, 1),
+        "jobs_per_hour": round(len(done) / makespan * 3600, 1) if makespan else 0.0,
+        "latency_mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "latency_p95": round(latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)], 1) if latencies else 0.0,
+        "cpu_utilization": round(sum(w.busy_core_seconds for w in fleet) / (makespan * cores * workers), 3)
+        if makespan else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cores", type=int, default=8)
+    parser.add_argument("--memory-gb", type=float, default=16)
+    parser.add_argument("--memory-fraction", type=float, default=0.8, help="WORKER_MEMORY_FRACTION for cost_aware")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--mix", default="ql:0.5,qm:0.2,qh:0.2,qk:0.1", help="quality:weight pairs")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="jobs per second (0: all queued at once)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.jobs, parse_mix(args.mix), args.arrival_rate, args.seed)
+    memory = int(args.memory_gb * GB)
+    report = {
+        name: simulate(policy, jobs, args.workers, args.cores, memory, args.memory_fraction)
+        for name, policy in POLICIES.items()
+    }
+    if args.json:
+        print(json.dumps({"config": vars(args), "policies": report}, indent=2))
+        return 0
+
+    print(f"{args.workers} workers x {args.cores} cores / {args.memory_gb:g} GB, {args.jobs} jobs ({args.mix})")
+    columns = ["completed", "lost", "oom_kills", "wasted_core_seconds", "makespan_seconds", "jobs_per_hour",
+               "latency_mean", "latency_p95", "cpu_utilization"]
+    print(f"{'policy':<12}" + "".join(f"{column:>{len(column) + 2}}" for column in columns))
+    for name, row in report.items():
+        print(f"{name:<12}" + "".join(f"{row[column]:>{len(column) + 2}}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+# benchmarks/e2e_throughput.py
+"""
+Offline end-to-end throughput benchmark.
+
+Replays the prompt corpus in test.json against the real FastAPI app and an
+in-process Celery worker (memory broker, in-memory result backend), with:
+
+  * a deterministic stub LLM returning canned code per prompt,
+  * a fake renderer (sleep or CPU-burn, scaled by quality) or real Manim at -ql,
+  * an in-memory storage backend instead of GCS.
+
+Scene templates, the prompt index and the render cache are off unless
+--templates / --prompt-index / --render-cache are given, so runs stay
+comparable with older baselines. The prompt index and render cache start
+cold on every run.
+
+Per-stage latency comes from the request traces (app.core.tracing), so the
+numbers use the same span names an operator sees in production.
+
+Run from the backend directory (needs httpx in addition to requirements.txt):
+
+    python -m benchmarks.e2e_throughput --concurrency 1,4,16 --save-baseline
+    python -m benchmarks.e2e_throughput --compare benchmarks/baselines/e2e_throughput.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from app.core import tracing
+from app.core.logging import logger
+from app.main import app
+from app import generation, tasks
+from app.core.toolchain import get_toolchain
+from app.services import prompt_index, render_cache
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_CORPUS = os.path.join(REPO_ROOT, "test.json")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "e2e_throughput.json")
+
+# Fake render time multiplier relative to -ql, roughly pixels x fps.
+QUALITY_COST = {"-ql": 1.0, "-qm": 2.0, "-qh": 4.0, "-qk": 12.0}
+
+CANNED_SCENE = """
+from manim import *
+
+class {name}(Scene):
+    def construct(self):
+        # Step 1: Title for the concept
+        title = Text("{title}", font_size=32).to_edge(UP)
+        self.play(Write(title))
+
+        # Step 2: A simple shape standing in for the visualization
+        shape = {shape}
+        self.play(Create(shape), run_time=1.5)
+
+        # Step 3: Highlight and wrap up
+        self.play(shape.animate.set_color(YELLOW))
+        self.wait(1)
+"""
+
+SHAPES = ["Circle(radius=1.5)", "Square(side_length=2)", "Triangle().scale(2)", "RegularPolygon(n=6)"]
+
+
+# -------------------------------
+# Stubs
+# -------------------------------
+def stub_generate_manim_code(llm_latency: float, scenes: int = 1):
+    def generate(prompt: str, **kwargs) -> dict:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if llm_latency:
+            time.sleep(llm_latency)
+        # With several scenes the file is split into parts, each rendered as its own subtask
+        parts = [
+            CANNED_SCENE.format(
+                name=f"Scene{digest[:8].upper()}" + (f"Part{index + 1}" if scenes > 1 else ""),
+                title=prompt[:40].replace('"', "'"),
+                shape=SHAPES[(int(digest, 16) + index) % len(SHAPES)],
+            ).strip()
+            for index in range(scenes)
+        ]
+        code = parts[0] + "".join("\n\n" + part.split("\n", 1)[1].lstrip() for part in parts[1:])
+        return {"code": code, "provider_used": "stub", "validation_result": "stub", "success": True}
+    return generate
+
+
+def fake_run_manim(mode: str, base_seconds: float):
+    def run(command: list, cwd: str, timeout: float = None, cancel_check=None, env: dict = None):
+        if "--dry_run" in command:
+            return 0, "", ""
+        # [python, -m, app.core.manim_launcher, scene.py, SceneName, flags...]
+        scene_name = command[command.index(next(arg for arg in command if arg.endswith(".py"))) + 1]
+        quality_flag = next((flag for flag in command if flag in tasks.QUALITY_DIR_MAP), "-ql")
+        duration = base_seconds * QUALITY_COST[quality_flag]
+        if mode == "cpu":
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                sum(i * i for i in range(1000))
+        else:
+            time.sleep(duration)
+        output_dir = os.path.join(cwd, "media", "videos", "scene", tasks.QUALITY_DIR_MAP[quality_flag])
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{scene_name}.mp4"), "wb") as f:
+            f.write(os.urandom(64 * 1024))
+        return 0, "fake render", ""
+    return run
+
+
+class InMemoryStorage:
+    def __init__(self):
+        self.blobs = {}
+
+    def upload(self, file_path: str, bucket_name: str, destination_blob_name: str, content_type: str = None) -> str:
+        with open(file_path, "rb") as f:
+            self.blobs[(bucket_name, destination_blob_name)] = f.read()
+        return f"memory://{bucket_name}/{destination_blob_name}"
+
+    def download(self, bucket_name: str, blob_name: str, destination_path: str) -> str:
+        with open(destination_path, "wb") as f:
+            f.write(self.blobs[(bucket_name, blob_name)])
+        return destination_path
+
+
+def install_stubs(args) -> InMemoryStorage:
+    storage = InMemoryStorage()
+    generation.generate_manim_code = stub_generate_manim_code(args.llm_latency, args.scenes)
+    tasks.upload_file = storage.upload
+    tasks.download_file = storage.download
+    tasks.record_render_seconds = lambda *a, **k: None
+    tasks.estimate_render_seconds = lambda quality_flag: 0.0
+    if args.renderer != "real":
+        tasks._run_manim = fake_run_manim(args.renderer, args.render_seconds)
+        # Fake renders never call latex, so this worker may take MathTex scenes too
+        toolchain = get_toolchain()
+        toolchain.latex = toolchain.latex or "latex"
+        toolchain.dvisvgm = toolchain.dvisvgm or "dvisvgm"
+    generation.TEMPLATES_ENABLED = args.templates
+    render_cache.RENDER_CACHE_ENABLED = args.render_cache
+    run_prefix = f"manimate:bench:{uuid.uuid4().hex}:"
+    render_cache.RENDER_CACHE_PREFIX = run_prefix + "render_cache:"
+    prompt_index.PROMPT_INDEX_ENABLED = args.prompt_index
+    prompt_index.PENDING_KEY_PREFIX = run_prefix + "prompt_index:pending:"
+    prompt_index.CODE_KEY_PREFIX = run_prefix + "prompt_index:code:"
+    prompt_index.ENTRIES_STREAM = run_prefix + "prompt_index:entries"
+
+    tasks.celery.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        # The memory transport polls idle queues (the Redis one blocks on BRPOP), and its synchronous
+        # consumer loop only reopens a full prefetch window every 2s. Each hop of the job pipeline
+        # (generation, then render) would pay both, so poll often and keep the window open.
+        broker_transport_options={"polling_interval": 0.05},
+        worker_prefetch_multiplier=8,
+        worker_hijack_root_logger=False,
+    )
+    # The in-process worker skips celeryd_after_setup, so subscribe it to the stage queues directly
+    tasks.subscribe_render_queues(tasks.celery)
+    tasks.celery.amqp.queues.select_add(tasks.GENERATION_QUEUE)
+    return storage
+
+
+# -------------------------------
+# Load generation
+# -------------------------------
+def load_corpus(path: str, force_quality: str = None) -> list:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        {
+            "prompt": entry["prompt"],
+            "quality": force_quality or entry.get("quality", "low"),
+            "style": entry.get("style", "educational"),
+        }
+        for entry in entries
+    ]
+
+
+async def run_one(client: httpx.AsyncClient, payload: dict, poll_interval: float, timeout: float) -> dict:
+    started = time.perf_counter()
+    response = await client.post("/api/render", json=payload)
+    if response.status_code != 202:
+        return {"ok": False, "latency": time.perf_counter() - started, "error": response.text}
+    body = response.json()
+    task_id = body["task_id"]
+    accepted = time.perf_counter() - started
+    while time.perf_counter() - started < timeout:
+        status = (await client.get(f"/api/status/{task_id}")).json()
+        if status["status"] != "IN_PROGRESS":
+            return {
+                "ok": status["status"] == "SUCCESS",
+                "latency": time.perf_counter() - started,
+                "accept_latency": accepted,
+                "template": status.get("template"),
+                "cached": bool(status.get("cached")),
+                "error": status.get("error"),
+            }
+        await asyncio.sleep(poll_interval)
+    return {"ok": False, "latency": time.perf_counter() - started, "error": "timeout"}
+
+
+async def run_level(corpus: list, concurrency: int, repeat: int, poll_interval: float, timeout: float) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def bounded(payload):
+            async with semaphore:
+                return await run_one(client, payload, poll_interval, timeout)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(bounded(p) for _ in range(repeat) for p in corpus))
+        wall = time.perf_counter() - started
+    return results, wall
+
+
+# -------------------------------
+# Reporting
+# -------------------------------
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        cuts = [ordered[0]] * 99
+    else:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+    return {
+        "count": len(ordered),
+        "p50": round(cuts[49], 4),
+        "p95": round(cuts[94], 4),
+        "p99": round(cuts[98], 4),
+    }
+
+
+def stage_latencies(spans: list) -> dict:
+    by_name = defaultdict(list)
+    enqueued_end = {}
+    task_start = {}
+    for span in spans:
+        name = span.name
+        if name.startswith("POST /api/render"):
+            name = "api.render_request"
+        elif name.startswith("GET /api/status"):
+            continue
+        by_name[name].append(span.duration)
+        if span.name == "enqueue_render":
+            enqueued_end[span.trace_id] = span.end_ns
+        elif span.name.startswith("celery."):
+            task_start[span.trace_id] = span.start_ns
+    for trace_id, start_ns in task_start.items():
+        if trace_id in enqueued_end:
+            by_name["queue_wait"].append(max(start_ns - enqueued_end[trace_id], 0) / 1e9)
+    return {name: percentiles(values) for name, values in sorted(by_name.items())}
+
+
+def print_level(level: dict) -> None:
+    print(f"\n=== concurrency={level['concurrency']}  requests={level['requests']}  "
+          f"ok={level['succeeded']}  rps={level['requests_per_second']:.2f}  wall={level['wall_seconds']:.2f}s  "
+          f"templates={level.get('template_hits', 0)}  cached={level.get('cache_hits', 0)}")
+    print(f"{'stage':<40}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = {"end_to_end": level["end_to_end"], **level["stages"]}
+    for name, stats in rows.items():
+        if stats["count"]:
+            print(f"{name:<40}{stats['count']:>6}{stats['p50']:>10.4f}{stats['p95']:>10.4f}{stats['p99']:>10.4f}")
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    regressions = []
+    for level in report["levels"]:
+        old = previous.get(level["concurrency"])
+        if not old:
+            continue
+        if level["requests_per_second"] < old["requests_per_second"] * (1 - threshold):
+            regressions.append(f"c={level['concurrency']} rps {old['requests_per_second']:.2f} -> {level['requests_per_second']:.2f}")
+        rows = {"end_to_end": level["end_to_end"], **level["stages"]}
+        old_rows = {"end_to_end": old["end_to_end"], **old["stages"]}
+        for name, stats in rows.items():
+            before = old_rows.get(name, {}).get("p95")
+            if before and stats["p95"] and stats["p95"] > before * (1 + threshold):
+                regressions.append(f"c={level['concurrency']} {name} p95 {before:.4f}s -> {stats['p95']:.4f}s")
+    if regressions:
+        print(f"\nREGRESSIONS (>{threshold:.0%} vs {baseline_path}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {threshold:.0%} vs {baseline_path}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client concurrency levels")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay the corpus per level")
+    parser.add_argument("--workers", type=int, default=4, help="in-process Celery worker threads")
+    parser.add_argument("--renderer", choices=["sleep", "cpu", "real"], default="sleep")
+    parser.add_argument("--render-seconds", type=float, default=0.2, help="fake render time at -ql")
+    parser.add_argument("--scenes", type=int, default=1, help="Scene classes per generated file (rendered in parallel)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stub LLM latency in seconds")
+    parser.add_argument("--templates", action="store_true", help="serve matching prompts from scene templates")
+    parser.add_argument("--prompt-index", action="store_true", help="reuse code generated for similar prompts")
+    parser.add_argument("--render-cache", action="store_true", help="reuse identical finished renders")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="keep per-request app logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    install_stubs(args)
+    exporter = tracing.InMemorySpanExporter()
+    tracing.configure_tracing(exporter, sample_ratio=1.0)
+    corpus = load_corpus(args.corpus, force_quality="low" if args.renderer == "real" else None)
+
+    from celery.contrib.testing.worker import start_worker
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")},
+        "levels": [],
+    }
+    with start_worker(tasks.celery, pool="threads", concurrency=args.workers,
+                      perform_ping_check=False, loglevel="WARNING"):
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            exporter.clear()
+            results, wall = asyncio.run(run_level(corpus, concurrency, args.repeat, args.poll_interval, args.timeout))
+            tracing.force_flush()
+            succeeded = [r for r in results if r["ok"]]
+            level = {
+                "concurrency": concurrency,
+                "requests": len(results),
+                "succeeded": len(succeeded),
+                "wall_seconds": round(wall, 4),
+                "requests_per_second": round(len(succeeded) / wall, 4) if wall else 0.0,
+                "template_hits": sum(1 for r in succeeded if r.get("template")),
+                "cache_hits": sum(1 for r in succeeded if r.get("cached")),
+                "end_to_end": percentiles([r["latency"] for r in succeeded]),
+                "stages": stage_latencies(list(exporter.spans)),
+                "errors": sorted({str(r.get("error")) for r in results if not r["ok"]}),
+            }
+            report["levels"].append(level)
+            print_level(level)
+
+    exit_code = 0
+    if args.compare:
+        exit_code = compare(report, args.compare, args.threshold)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
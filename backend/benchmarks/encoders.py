@@ -0,0 +1,171 @@
+# benchmarks/encoders.py
+"""
+Encode time, CPU usage and output size per encoder profile.
+
+Two modes:
+
+  * render (default) - renders reference scenes through the worker's Manim
+    command (python -m app.core.manim_launcher) once per profile and quality. Frame
+    rendering is identical across profiles, so the wall-time differences are
+    the encoder's. Needs Manim (and LaTeX for MathTex scenes).
+  * --transcode VIDEO - re-encodes an existing video with ffmpeg per profile.
+    This measures the encoder alone and reports SSIM against the source.
+    Needs ffmpeg only.
+
+CPU is the user+sys time of the child processes; cpu/wall above 1 means the
+encoder used several cores.
+
+Run from the backend directory:
+
+    python -m benchmarks.encoders                                  # test_render/scene.py at -ql and -qh
+    python -m benchmarks.encoders --qualities qh,qk --profiles manim,fast,hevc --repeat 3
+    python -m benchmarks.encoders --transcode /path/to/1080p60.mp4 --profiles manim,fast,draft,small,hevc
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.config import FFMPEG_BINARY
+from app.core.encoding import ENCODER_ENV, PROFILES, parse_profile
+from app.core.quality import QUALITY_DIR_MAP
+from app.core.toolchain import get_toolchain
+from app.utils.helpers import find_scene_classes
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SCENES = os.path.join(REPO_ROOT, "test_render", "scene.py")
+DEFAULT_PROFILES = "manim,fast,draft,small"
+
+
+def children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def timed_run(command: list, cwd: str, env: dict = None) -> tuple:
+    """(wall seconds, child CPU seconds, completed process)"""
+    cpu_before, started = children_cpu_seconds(), time.perf_counter()
+    completed = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+    return time.perf_counter() - started, children_cpu_seconds() - cpu_before, completed
+
+
+def render_once(scene_path: str, scene_name: str, quality_flag: str, profile) -> dict:
+    from app.core import manim_launcher
+    from app.tasks import _manim_command  # the worker's exact command line
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        shutil.copy(scene_path, os.path.join(work_dir, "scene.py"))
+        with open(os.path.join(work_dir, "manim.cfg"), "w") as f:
+            f.write(get_toolchain().manim_cfg())
+        command = _manim_command(os.path.join(work_dir, "scene.py"), scene_name, quality_flag, "--disable_caching")
+        env = manim_launcher.environment({**os.environ, ENCODER_ENV: profile.to_json()})
+        wall, cpu, completed = timed_run(command, work_dir, env)
+        output = os.path.join(work_dir, "media", "videos", "scene", QUALITY_DIR_MAP[quality_flag], f"{scene_name}.mp4")
+        if completed.returncode != 0 or not os.path.exists(output):
+            raise RuntimeError(f"{scene_name} {quality_flag} {profile.name} failed:\n{completed.stderr[-2000:]}")
+        return {"wall": wall, "cpu": cpu, "bytes": os.path.getsize(output)}
+
+
+def ssim(encoded: str, source: str):
+    completed = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-i", encoded, "-i", source, "-lavfi", "ssim", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    match = re.search(r"All:([0-9.]+)", completed.stderr)
+    return float(match.group(1)) if match else None
+
+
+def transcode_once(source: str, profile) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir:
+        output = os.path.join(work_dir, "out.mp4")
+        command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", "-i", source, "-an",
+                   *profile.ffmpeg_args(), output]
+        wall, cpu, completed = timed_run(command, work_dir)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{profile.name} failed: {completed.stderr.strip()}")
+        return {"wall": wall, "cpu": cpu, "bytes": os.path.getsize(output), "ssim": ssim(output, source)}
+
+
+def summarize(runs: list) -> dict:
+    wall = statistics.median(run["wall"] for run in runs)
+    cpu = statistics.median(run["cpu"] for run in runs)
+    row = {"wall_seconds": round(wall, 3), "cpu_seconds": round(cpu, 3),
+           "cpu_per_wall": round(cpu / wall, 2) if wall else 0.0, "bytes": runs[0]["bytes"]}
+    if "ssim" in runs[0]:
+        row["ssim"] = runs[0]["ssim"]
+    return row
+
+
+def add_relative(rows: list, key: tuple) -> None:
+    """Wall time and size relative to the "manim" profile of the same case (1.00 = unchanged)."""
+    baseline = {tuple(row[k] for k in key): row for row in rows if row["profile"] == "manim"}
+    for row in rows:
+        base = baseline.get(tuple(row[k] for k in key))
+        if base:
+            row["wall_vs_manim"] = round(row["wall_seconds"] / base["wall_seconds"], 2)
+            row["size_vs_manim"] = round(row["bytes"] / base["bytes"], 2)
+
+
+def print_rows(rows: list, columns: list) -> None:
+    widths = {column: max(len(column), *(len(str(row.get(column, ""))) for row in rows)) + 2 for column in columns}
+    print("".join(f"{column:>{widths[column]}}" for column in columns))
+    for row in rows:
+        print("".join(f"{str(row.get(column, '')):>{widths[column]}}" for column in columns))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", default=DEFAULT_SCENES, help="Python file with the reference Scene classes")
+    parser.add_argument("--qualities", default="ql,qh", help="quality flags without the dash")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILES, help=f"names from {sorted(PROFILES)} or codec/preset/crf")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (the median is reported)")
+    parser.add_argument("--transcode", default=None, help="re-encode this video instead of rendering scenes")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    profiles = [parse_profile(spec) for spec in args.profiles.split(",")]
+    rows = []
+    if args.transcode:
+        if shutil.which(FFMPEG_BINARY) is None:
+            print(f"ffmpeg ({FFMPEG_BINARY}) not found", file=sys.stderr)
+            return 2
+        for profile in profiles:
+            runs = [transcode_once(args.transcode, profile) for _ in range(args.repeat)]
+            rows.append({"profile": profile.name, **summarize(runs)})
+        add_relative(rows, ())
+        columns = ["profile", "wall_seconds", "cpu_seconds", "cpu_per_wall", "bytes", "ssim", "wall_vs_manim",
+                   "size_vs_manim"]
+    else:
+        if importlib.util.find_spec("manim") is None:
+            print("Manim is not installed; use --transcode VIDEO to benchmark the encoders alone", file=sys.stderr)
+            return 2
+        with open(args.scenes, encoding="utf-8") as f:
+            scene_names = find_scene_classes(f.read())
+        for scene_name in scene_names:
+            for quality in args.qualities.split(","):
+                quality_flag = "-" + quality.strip().lstrip("-")
+                for profile in profiles:
+                    runs = [render_once(args.scenes, scene_name, quality_flag, profile) for _ in range(args.repeat)]
+                    rows.append({"scene": scene_name, "quality": quality_flag, "profile": profile.name,
+                                 **summarize(runs)})
+        add_relative(rows, ("scene", "quality"))
+        columns = ["scene", "quality", "profile", "wall_seconds", "cpu_seconds", "cpu_per_wall", "bytes",
+                   "wall_vs_manim", "size_vs_manim"]
+
+    if args.json:
+        print(json.dumps({"config": vars(args), "results": rows}, indent=2))
+    else:
+        print_rows(rows, columns)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# benchmarks/microbench.py
+"""
+Micro-benchmarks for the per-request hot paths:
+
+  * PromptValidator.validate_prompt
+  * CodeValidator.validate_and_sanitize_code
+  * llm.extract_python_code
+  * llm.validate_manim_code
+  * helpers.extract_scene_name
+
+Each function runs against realistic and pathological generated inputs (huge
+responses, many code fences, unterminated fences, deeply nested ASTs). For
+every case we record the per-call time (best and median of several repeats)
+and the peak memory allocated by one call (tracemalloc).
+
+Run from the backend directory:
+
+    python -m benchmarks.microbench --save-baseline
+    python -m benchmarks.microbench --compare benchmarks/baselines/microbench.json
+
+--compare exits non-zero when a case is slower or allocates more than the
+baseline by more than the configured thresholds.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+from app.services.llm import extract_python_code, validate_manim_code
+from app.services.prompts import EXAMPLE_ALGEBRA, EXAMPLE_CALCULUS
+from app.services.validator import CodeValidator, PromptValidator
+from app.utils.helpers import extract_scene_name
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "microbench.json")
+
+
+# -------------------------------
+# Inputs
+# -------------------------------
+def _fenced(code: str, lang: str = "python") -> str:
+    return f"```{lang}\n{code}\n```"
+
+
+def _nested_expression(depth: int) -> str:
+    return "(" * depth + "1" + ")" * depth
+
+
+def _nested_blocks_scene(depth: int) -> str:
+    body = []
+    for level in range(depth):
+        body.append("    " * (level + 2) + f"if x > {level}:")
+    body.append("    " * (depth + 2) + "self.play(Create(Circle()))")
+    return (
+        "from manim import *\n\n"
+        "class Deep(Scene):\n"
+        "    def construct(self):\n"
+        "        # Deeply nested control flow\n"
+        "        x = 1\n"
+        + "\n".join(body) + "\n"
+        + "".join(f"        # padding {i}\n" for i in range(10))
+    )
+
+
+def build_inputs() -> dict:
+    code = EXAMPLE_ALGEBRA.strip()
+    prose = "This animation walks through the proof step by step. " * 20
+    realistic_response = f"Here is the scene you asked for.\n\n{_fenced(code)}\n\n{prose}"
+    huge_response = ("Explanation of the visual approach. " * 30000) + "\n" + _fenced(code)
+    many_fences = "\n".join(_fenced(f"x = {i}", "") for i in range(2000)) + "\n" + _fenced(code)
+    many_inline_ticks = " ".join(f"`v{i}`" for i in range(20000)) + "\n" + _fenced(code)
+    unterminated = "```python\n" + code + "\n" + ("        self.wait(1)\n" * 20000)
+    no_fences_huge = code + "\n" + ("        self.wait(1)\n" * 20000)
+    big_scene = code + "\n" + "".join(
+        f"        sq_{i} = Square().shift(RIGHT * {i % 7})\n        self.play(Create(sq_{i}))\n"
+        for i in range(3000)
+    )
+    nested_expr_scene = (
+        "from manim import *\n\nclass NestedExpr(Scene):\n    def construct(self):\n"
+        "        # Deeply nested expression\n"
+        f"        value = {_nested_expression(180)}\n"
+        "        self.play(Create(Circle()))\n"
+        + "".join(f"        # padding {i}\n" for i in range(10))
+    )
+    many_classes = "from manim import *\n\n" + "".join(
+        f"class Helper{i}(VGroup):\n    pass\n\n" for i in range(2000)
+    ) + EXAMPLE_CALCULUS.replace("from manim import *", "")
+
+    typical_prompt = "Show the derivative of y = x^2 as the slope of the tangent line that moves along the curve"
+    long_prompt = ("Visualize the integral of a polynomial function and the area under the curve. " * 30)[:2000]
+    # Many trigger words with no terminating keyword exercise the `.+` backtracking
+    adversarial_prompt = ("ignore forget disregard pretend " * 70)[:1990] + " graph"
+
+    return {
+        "prompt": {
+            "typical": typical_prompt,
+            "max_length": long_prompt,
+            "adversarial_backtracking": adversarial_prompt,
+        },
+        "response": {
+            "realistic": realistic_response,
+            "huge_1mb": huge_response,
+            "many_fences": many_fences,
+            "many_inline_backticks": many_inline_ticks,
+            "unterminated_fence": unterminated,
+            "no_fences_huge": no_fences_huge,
+        },
+        "code": {
+            "realistic": code,
+            "large_scene": big_scene,
+            "deeply_nested_blocks": _nested_blocks_scene(90),
+            "deeply_nested_expression": nested_expr_scene,
+            "many_classes": many_classes,
+        },
+    }
+
+
+def build_cases() -> dict:
+    inputs = build_inputs()
+    prompt_validator = PromptValidator()
+    code_validator = CodeValidator()
+    targets = {
+        "PromptValidator.validate_prompt": (prompt_validator.validate_prompt, "prompt"),
+        "CodeValidator.validate_and_sanitize_code": (code_validator.validate_and_sanitize_code, "code"),
+        "llm.extract_python_code": (extract_python_code, "response"),
+        "llm.validate_manim_code": (validate_manim_code, "code"),
+        "helpers.extract_scene_name": (extract_scene_name, "code"),
+    }
+    cases = {}
+    for target, (fn, kind) in targets.items():
+        for input_name, value in inputs[kind].items():
+            cases[f"{target}[{input_name}]"] = (fn, value)
+    return cases
+
+
+# -------------------------------
+# Measurement
+# -------------------------------
+def measure(fn, value, repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(lambda: fn(value))
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    per_call = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(value)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "calls_per_repeat": number,
+        "peak_alloc_kib": round(max(peak - before, 0) / 1024, 2),
+        "retained_kib": round(max(after - before, 0) / 1024, 2),
+    }
+
+
+def compare(results: dict, baseline_path: str, time_threshold: float, alloc_threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["cases"]
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if stats["best_us"] > old["best_us"] * (1 + time_threshold):
+            regressions.append(f"{name}: time {old['best_us']:.1f}us -> {stats['best_us']:.1f}us")
+        # Ignore allocation noise below 1 KiB
+        if stats["peak_alloc_kib"] > max(old["peak_alloc_kib"] * (1 + alloc_threshold), old["peak_alloc_kib"] + 1):
+            regressions.append(f"{name}: peak alloc {old['peak_alloc_kib']:.1f}KiB -> {stats['peak_alloc_kib']:.1f}KiB")
+    if regressions:
+        print(f"\nREGRESSIONS vs {baseline_path}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions vs {baseline_path}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing repeat")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--alloc-threshold", type=float, default=0.25, help="allowed relative allocation growth")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<75}{'best us':>12}{'median us':>12}{'peak KiB':>11}")
+    for name, (fn, value) in build_cases().items():
+        if args.filter not in name:
+            continue
+        stats = measure(fn, value, args.repeat, args.min_time)
+        results[name] = stats
+        print(f"{name:<75}{stats['best_us']:>12.1f}{stats['median_us']:>12.1f}{stats['peak_alloc_kib']:>11.1f}")
+
+    exit_code = 0
+    if args.compare:
+        exit_code = compare(results, args.compare, args.time_threshold, args.alloc_threshold)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "cases": results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
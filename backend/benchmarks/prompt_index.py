@@ -0,0 +1,185 @@
+# benchmarks/prompt_index.py
+"""
+Lookup latency and recall of the near-duplicate prompt index at scale.
+
+Fills an in-memory PromptIndex with synthetic prompts built from a Zipf-weighted
+math vocabulary, so popular terms produce crowded LSH buckets the way real
+traffic would. Then it times lookups for three kinds of query:
+
+  * reworded  - a stored prompt with other filler words, "x²" for "x^2" and plurals
+  * extended  - a stored prompt with one extra content word (similarity n/(n+1))
+  * fresh     - a newly generated prompt, mostly unrelated to the index
+
+No Redis is involved; this measures the in-process index only.
+
+Run from the backend directory:
+
+    python -m benchmarks.prompt_index                      # 1M entries
+    python -m benchmarks.prompt_index --entries 100000 --save-baseline
+    python -m benchmarks.prompt_index --compare benchmarks/baselines/prompt_index.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+from app.services.prompt_index import PromptIndex, code_id_for
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "prompt_index.json")
+
+TOPICS = """
+derivative integral limit tangent slope area circle triangle square rectangle polygon angle radius diameter
+circumference sine cosine tangent wave parabola hyperbola ellipse vector matrix eigenvalue eigenvector determinant
+transformation rotation reflection projection dot cross product sum series sequence convergence taylor fourier
+probability distribution normal mean variance median histogram regression correlation graph function polynomial
+quadratic cubic exponential logarithm root equation inequality proof theorem pythagorean similarity congruence
+volume surface sphere cylinder cone cube prism pyramid coordinate plane axis origin unit complex number imaginary
+real rational irrational prime factor divisor fraction ratio proportion percentage chain rule product quotient
+implicit partial gradient divergence curl optimization maximum minimum critical inflection concavity asymptote
+continuity riemann trapezoid simpson area-under-curve arc length polar parametric spiral cardioid rose
+""".split()
+FILLER = ["show", "visualize", "animate", "explain", "demonstrate", "illustrate", "the", "a", "of", "how", "using",
+          "please", "step", "by", "with", "clearly", "for", "me"]
+POWERS = {"x^2": "x²", "x^3": "x³"}
+
+
+def _zipf_choice(rng: random.Random, items: list, weights: list) -> str:
+    return rng.choices(items, weights=weights, k=1)[0]
+
+
+def make_prompt(rng: random.Random, weights: list) -> list:
+    """Content words of a synthetic prompt: 3-6 topic words plus an optional power or number."""
+    words = {_zipf_choice(rng, TOPICS, weights) for _ in range(rng.randint(3, 6))}
+    extra = rng.random()
+    if extra < 0.3:
+        words.add(rng.choice(list(POWERS)))
+    elif extra < 0.6:
+        words.add(str(rng.randint(0, 999)))
+    return sorted(words)
+
+
+def render(rng: random.Random, words: list) -> str:
+    parts = [rng.choice(FILLER)]
+    for word in rng.sample(words, len(words)):
+        parts.append(word)
+        if rng.random() < 0.4:
+            parts.append(rng.choice(FILLER))
+    return " ".join(parts)
+
+
+def reword(rng: random.Random, words: list) -> str:
+    changed = [POWERS.get(word, word) if rng.random() < 0.5 else word for word in words]
+    changed = [word + "s" if word.isalpha() and len(word) > 3 and not word.endswith("s") and rng.random() < 0.3
+               else word for word in changed]
+    return render(rng, changed)
+
+
+def percentiles(values: list) -> dict:
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1e6
+
+    return {"count": len(ordered), "p50_us": at(0.50), "p95_us": at(0.95), "p99_us": at(0.99), "max_us": ordered[-1] * 1e6}
+
+
+def time_lookups(index: PromptIndex, queries: list, threshold: float) -> tuple:
+    latencies, hits = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        hit = index.lookup(query, threshold=threshold)
+        latencies.append(time.perf_counter() - started)
+        hits += hit is not None
+    return percentiles(latencies), hits / len(queries)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20_000, help="lookups per query kind")
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="allowed relative p99 slowdown")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(TOPICS))]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    index = PromptIndex(args.entries)
+    # Keep a sample of stored prompts to query against; storing all of them would dwarf the index
+    sample_every = max(args.entries // args.queries, 1)
+    stored = []
+    started = time.perf_counter()
+    for i in range(args.entries):
+        words = make_prompt(rng, weights)
+        code_id = code_id_for(str(i))
+        if index.insert(render(rng, words), code_id) and i % sample_every == 0:
+            stored.append(words)
+    build_seconds = time.perf_counter() - started
+
+    # A hit on reworded/extended queries is expected (recall); on fresh ones it means a popular combination
+    reworded = [reword(rng, words) for words in stored[:args.queries]]
+    extended = [render(rng, words + [rng.choice(TOPICS)]) for words in stored[:args.queries] if len(words) >= 4]
+    fresh = [render(rng, make_prompt(rng, weights)) for _ in range(args.queries)]
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")},
+        "entries": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "inserts_per_second": round(args.entries / build_seconds),
+        "index_bytes": index.memory_bytes(),
+        "bytes_per_entry": round(index.memory_bytes() / max(len(index), 1), 1),
+        # ru_maxrss is KiB on Linux
+        "rss_growth_bytes": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024,
+        "lookups": {},
+    }
+    for name, queries in (("reworded", reworded), ("extended", extended), ("fresh", fresh)):
+        latency, hit_rate = time_lookups(index, queries, args.threshold)
+        report["lookups"][name] = {**latency, "hit_rate": round(hit_rate, 4)}
+
+    print(f"entries={report['entries']}  build={report['build_seconds']}s ({report['inserts_per_second']}/s)  "
+          f"index={report['index_bytes'] / 2**20:.1f} MiB ({report['bytes_per_entry']} B/entry)  "
+          f"rss+={report['rss_growth_bytes'] / 2**20:.1f} MiB")
+    print(f"{'query':<12}{'n':>8}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'max us':>10}{'hit rate':>10}")
+    for name, row in report["lookups"].items():
+        print(f"{name:<12}{row['count']:>8}{row['p50_us']:>10.1f}{row['p95_us']:>10.1f}{row['p99_us']:>10.1f}"
+              f"{row['max_us']:>10.1f}{row['hit_rate']:>10.3f}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, row in report["lookups"].items():
+            old = baseline["lookups"].get(name)
+            if old and row["p99_us"] > old["p99_us"] * (1 + args.time_threshold):
+                regressions.append(f"{name}: p99 {old['p99_us']:.1f}us -> {row['p99_us']:.1f}us")
+            if old and row["hit_rate"] < old["hit_rate"] - 0.02:
+                regressions.append(f"{name}: hit rate {old['hit_rate']:.3f} -> {row['hit_rate']:.3f}")
+        if regressions:
+            print(f"\nREGRESSIONS vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print(f"\nNo regressions vs {args.compare}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# benchmarks/prompt_tokens.py
+"""
+Input tokens and validation pass rate of the dynamic few-shot prompt against
+the full one (see app/services/prompts.py).
+
+For every prompt of the corpus (the repository's test.json by default) both
+variants are built and their tokens counted: with tiktoken's cl100k_base
+encoding when tiktoken is installed, else with prompts.estimate_tokens. Every
+example of the library is also run through llm.check_candidate, since an
+invalid example teaches invalid code.
+
+With --live PROVIDER, each prompt is also sent --samples times per variant to
+the provider (its system key from the environment), and each completion goes
+through llm.check_candidate. That is the validation pass rate of each variant,
+plus their mean call latency.
+
+Run from the backend directory:
+
+    python -m benchmarks.prompt_tokens
+    python -m benchmarks.prompt_tokens --live gemini --samples 2 --save-baseline
+    python -m benchmarks.prompt_tokens --compare benchmarks/baselines/prompt_tokens.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from app.services import llm, prompts
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "prompt_tokens.json")
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "..", "..", "test.json")
+VARIANTS = (prompts.FULL, prompts.DYNAMIC)
+
+
+def token_counter():
+    """(name, count function): tiktoken when installed, else the four-characters-per-token estimate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return "estimate", prompts.estimate_tokens
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return "cl100k_base", lambda text: len(encoding.encode(text))
+
+
+def live_pass_rate(provider: str, built: list, samples: int) -> dict:
+    """Completions per variant that pass llm.check_candidate, and the mean call latency."""
+    results = {}
+    for variant in VARIANTS:
+        passed, total, errors, seconds = 0, 0, 0, 0.0
+        for entry in built:
+            for _ in range(samples):
+                try:
+                    completions = llm._complete(provider, entry[variant]["text"], None)
+                except Exception as e:
+                    print(f"  {variant}: {provider} call failed: {e}")
+                    errors += 1
+                    continue
+                for completion in completions:
+                    total += 1
+                    seconds += completion.seconds
+                    passed += llm.check_candidate(llm.extract_python_code(completion.text))[0]
+        results[variant] = {"candidates": total, "passed": passed, "errors": errors,
+                            "pass_rate": round(passed / total, 4) if total else None,
+                            "mean_seconds": round(seconds / total, 2) if total else None}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", default=DEFAULT_CORPUS, help="JSON list of {prompt, quality, style}")
+    parser.add_argument("--live", default=None, metavar="PROVIDER", help="also measure the pass rate with this provider")
+    parser.add_argument("--samples", type=int, default=1, help="live completions per prompt and variant")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--token-threshold", type=float, default=0.05, help="allowed relative growth of dynamic tokens")
+    parser.add_argument("--pass-threshold", type=float, default=0.05, help="allowed drop of the dynamic pass rate")
+    args = parser.parse_args()
+
+    with open(args.prompts, encoding="utf-8") as f:
+        corpus = json.load(f)
+    tokenizer, count = token_counter()
+
+    built = []
+    for case in corpus:
+        style = case.get("style") or "educational"
+        quality = case.get("quality") or "polished"
+        entry = {"prompt": case["prompt"], "style": style}
+        for variant in VARIANTS:
+            text, examples = prompts.build_prompt(case["prompt"], quality, style, "intermediate", variant)
+            entry[variant] = {"text": text, "tokens": count(text), "examples": examples}
+        built.append(entry)
+
+    totals = {variant: sum(entry[variant]["tokens"] for entry in built) for variant in VARIANTS}
+    invalid = [example.name for example in prompts.EXAMPLES if not llm.check_candidate(example.code.strip())[0]]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "tokenizer": tokenizer,
+        "prompts": len(built),
+        "max_examples": prompts.PROMPT_MAX_EXAMPLES,
+        "tokens": {variant: {"total": totals[variant], "mean": round(totals[variant] / max(len(built), 1), 1)}
+                   for variant in VARIANTS},
+        "reduction": round(1 - totals[prompts.DYNAMIC] / max(totals[prompts.FULL], 1), 4),
+        "invalid_examples": invalid,
+    }
+
+    print(f"{'full':>6}{'dynamic':>9}  {'style':<15}{'examples':<26}prompt")
+    for entry in built:
+        print(f"{entry[prompts.FULL]['tokens']:>6}{entry[prompts.DYNAMIC]['tokens']:>9}  {entry['style']:<15}"
+              f"{','.join(entry[prompts.DYNAMIC]['examples']):<26}{entry['prompt'][:48]}")
+    print(f"\n{len(built)} prompts ({tokenizer} tokens): full mean {report['tokens']['full']['mean']}, "
+          f"dynamic mean {report['tokens']['dynamic']['mean']}, reduction {report['reduction']:.1%}")
+    print(f"Library examples passing check_candidate: {len(prompts.EXAMPLES) - len(invalid)}/{len(prompts.EXAMPLES)}"
+          + (f" (invalid: {', '.join(invalid)})" if invalid else ""))
+
+    if args.live:
+        report["live"] = {"provider": args.live, "samples": args.samples,
+                          **live_pass_rate(args.live, built, args.samples)}
+        for variant in VARIANTS:
+            row = report["live"][variant]
+            rate = f"{row['pass_rate']:.1%}" if row["pass_rate"] is not None else "n/a"
+            print(f"{variant:<8} pass rate {rate} ({row['passed']}/{row['candidates']}, {row['errors']} errors), "
+                  f"mean call {row['mean_seconds']}s")
+
+    exit_code = 1 if invalid else 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = []
+        old_tokens = baseline["tokens"][prompts.DYNAMIC]["mean"]
+        if baseline.get("tokenizer") == tokenizer and \
+                report["tokens"][prompts.DYNAMIC]["mean"] > old_tokens * (1 + args.token_threshold):
+            regressions.append(f"dynamic tokens {old_tokens} -> {report['tokens'][prompts.DYNAMIC]['mean']}")
+        old_rate = baseline.get("live", {}).get(prompts.DYNAMIC, {}).get("pass_rate")
+        new_rate = report.get("live", {}).get(prompts.DYNAMIC, {}).get("pass_rate")
+        if old_rate is not None and new_rate is not None and new_rate < old_rate - args.pass_threshold:
+            regressions.append(f"dynamic pass rate {old_rate:.3f} -> {new_rate:.3f}")
+        if regressions:
+            print(f"\nREGRESSIONS vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print(f"\nNo regressions vs {args.compare}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# benchmarks/startup.py
+"""
+Cold-start import profile for the API and the render worker.
+
+Each entry point is imported in a fresh interpreter under `-X importtime`.
+We report the wall time of the import, the heaviest modules by cumulative
+time, and whether any module that entry point must not load (provider SDKs
+in the worker, GCS or LLM SDKs in the API) was imported anyway.
+
+Run from the backend directory:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --save-baseline
+    python -m benchmarks.startup --compare benchmarks/baselines/startup.json
+
+Exits non-zero when an entry point exceeds its import budget, loads a
+forbidden module, or regresses past --threshold against a baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "startup.json")
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Import budgets in milliseconds and modules each process must not load eagerly.
+ENTRY_POINTS = {
+    "api": {
+        "module": "app.main",
+        "budget_ms": 900,
+        "forbidden": ["openai", "google.generativeai", "google.cloud.storage", "app.tasks"],
+    },
+    "worker": {
+        "module": "app.tasks",
+        "budget_ms": 600,
+        "forbidden": ["fastapi", "openai", "google.generativeai", "app.services.llm", "google.cloud.storage"],
+    },
+}
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+import json
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _run(module: str, importtime: bool) -> subprocess.CompletedProcess:
+    command = [sys.executable, "-W", "ignore"]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", PROBE.format(module=module)]
+    return subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+
+
+def _parse_importtime(stderr: str) -> list:
+    """Returns [(cumulative_us, module)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return rows
+
+
+def profile(name: str, spec: dict, runs: int, top: int) -> dict:
+    timings = []
+    probe = None
+    for _ in range(runs):
+        result = _run(spec["module"], importtime=False)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(probe["elapsed"] * 1000)
+
+    heaviest = sorted(_parse_importtime(_run(spec["module"], importtime=True).stderr), reverse=True)
+    loaded = set(probe["modules"])
+    return {
+        "module": spec["module"],
+        "median_ms": round(statistics.median(timings), 1),
+        "best_ms": round(min(timings), 1),
+        "budget_ms": spec["budget_ms"],
+        "modules_loaded": len(loaded),
+        "forbidden_loaded": [m for m in spec["forbidden"] if m in loaded],
+        "heaviest": [{"module": m, "cumulative_ms": round(us / 1000, 1)} for us, m in heaviest[:top]],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "entry_points": {}}
+    problems = []
+    for name, spec in ENTRY_POINTS.items():
+        stats = profile(name, spec, args.runs, args.top)
+        report["entry_points"][name] = stats
+        print(f"\n=== {name} ({stats['module']}): median {stats['median_ms']}ms, best {stats['best_ms']}ms, "
+              f"budget {stats['budget_ms']}ms, {stats['modules_loaded']} modules")
+        for row in stats["heaviest"]:
+            print(f"  {row['cumulative_ms']:>8.1f}ms  {row['module']}")
+        if stats["median_ms"] > stats["budget_ms"]:
+            problems.append(f"{name}: {stats['median_ms']}ms exceeds budget of {stats['budget_ms']}ms")
+        if stats["forbidden_loaded"]:
+            problems.append(f"{name}: loads {', '.join(stats['forbidden_loaded'])} at import time")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["entry_points"]
+        for name, stats in report["entry_points"].items():
+            old = baseline.get(name)
+            if old and stats["median_ms"] > old["median_ms"] * (1 + args.threshold):
+                problems.append(f"{name}: {old['median_ms']}ms -> {stats['median_ms']}ms vs baseline")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if problems:
+        print("\nSTARTUP BUDGET VIOLATIONS:")
+        for line in problems:
+            print(f"  {line}")
+        return 1
+    print("\nAll entry points within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+# tests/test_manim_api.py
+import textwrap
+
+import pytest
+
+from app.services import manim_api
+from app.services.manim_api import VAR_KEYWORD, VAR_POSITIONAL, ManimApi, find_unknown_symbols
+
+
+def _class(name, bases=(), members=None, init=None, getattr_=False):
+    return {"name": name, "bases": [f"manim.{base}" for base in bases], "members": members or {},
+            "init": init, "getattr": getattr_}
+
+
+# A slice of the index build_index() writes, with the real signatures of these names
+CLASSES = {
+    "manim.Mobject": _class("Mobject", members={
+        "add": [VAR_POSITIONAL], "shift": [VAR_POSITIONAL], "scale": ["scale_factor", VAR_KEYWORD],
+        "move_to": ["point_or_mobject", "aligned_edge", "coor_mask"],
+        "next_to": ["mobject_or_point", "direction", "buff", "aligned_edge", "submobject_to_align",
+                    "index_of_submobject_to_align", "coor_mask"],
+        "set_color": ["color", "family"], "get_center": [], "rotate": ["angle", "axis", "about_point", VAR_KEYWORD],
+        "animate": None, "submobjects": None,
+    }, init=["color", "name", "dim", "target", "z_index"], getattr_=True),
+    "manim.VMobject": _class("VMobject", ["Mobject"], members={
+        "set_fill": ["color", "opacity", "family"],
+        "set_stroke": ["color", "width", "opacity", "background", "family"],
+    }, init=["fill_color", "fill_opacity", "stroke_color", "stroke_opacity", "stroke_width", VAR_KEYWORD]),
+    "manim.Circle": _class("Circle", ["VMobject"], members={"surround": ["mobject", "dim_to_match", "stretch",
+                                                                        "buffer_factor"]},
+                           init=["radius", "color", VAR_KEYWORD]),
+    "manim.Dot": _class("Dot", ["Circle"], init=["point", "radius", "stroke_width", "fill_opacity", "color",
+                                                 VAR_KEYWORD]),
+    "manim.Text": _class("Text", ["VMobject"], init=["text", "fill_opacity", "stroke_width", "color", "font_size",
+                                                     "line_spacing", "font", "slant", "weight", VAR_KEYWORD]),
+    "manim.Scene": _class("Scene", members={
+        "construct": [], "play": [VAR_POSITIONAL, "subcaption", "subcaption_duration", "subcaption_offset",
+                                  VAR_KEYWORD],
+        "wait": ["duration", "stop_condition", "frozen_frame"], "add": [VAR_POSITIONAL],
+        "remove": [VAR_POSITIONAL], "camera": None,
+    }, init=["renderer", "camera_class", "always_update_mobjects", "random_seed", "skip_animations"]),
+    "manim.Animation": _class("Animation", init=["mobject", "lag_ratio", "run_time", "rate_func", "name",
+                                                 "remover", VAR_KEYWORD]),
+    "manim.Create": _class("Create", ["Animation"], init=["mobject", "lag_ratio", "introducer", VAR_KEYWORD]),
+}
+SYMBOLS = {
+    **{entry["name"]: {"kind": "class", "ref": key} for key, entry in CLASSES.items()},
+    "always_redraw": {"kind": "function", "params": ["func"]},
+    "rate_functions": {"kind": "module", "members": ["linear", "smooth", "there_and_back"]},
+    "np": {"kind": "module", "members": None},
+    **{name: {"kind": "value"} for name in ("BLUE", "RED", "WHITE", "UP", "DOWN", "LEFT", "RIGHT", "ORIGIN", "PI")},
+}
+INDEX = {"format": manim_api.INDEX_FORMAT, "manim_version": "0.18.1", "symbols": SYMBOLS, "classes": CLASSES}
+
+
+@pytest.fixture
+def api():
+    return ManimApi(INDEX)
+
+
+def unknown(code, api):
+    return [str(issue) for issue in find_unknown_symbols(textwrap.dedent(code), api)]
+
+
+def test_common_idioms_pass(api):
+    code = """
+        from manim import *
+        import numpy as np
+
+
+        class Labelled(VMobject):
+            def __init__(self, label, **kwargs):
+                super().__init__(**kwargs)
+                self.label = Text(label, font_size=24)
+                self.add(self.label)
+
+
+        class Demo(Scene):
+            def construct(self):
+                circle = Circle(radius=2, color=BLUE, fill_opacity=0.5)
+                circle.set_fill(RED, opacity=0.8).set_stroke(WHITE, width=2)
+                title = Text("Hello", font_size=36).next_to(circle, UP, buff=0.5)
+                dot = Dot(point=np.array([1, 0, 0]))
+                dot.set_x(2)  # Mobject.__getattr__ answers set_*/get_*
+                tracker = always_redraw(lambda: Dot().move_to(circle.get_center()))
+                self.points = [LEFT, RIGHT]
+                self.play(Create(circle), run_time=2, rate_func=rate_functions.smooth)
+                self.play(circle.animate.shift(LEFT).scale(2), title.animate.rotate(PI / 4))
+                self.add(dot, tracker, Labelled("x", stroke_width=1))
+                self.helper(title)
+                for i, point in enumerate(self.points):
+                    self.add(Dot(point).shift(i * DOWN))
+                self.wait(1)
+
+            def helper(self, mobject):
+                self.remove(mobject)
+                self.camera.frame_center = ORIGIN
+    """
+    assert unknown(code, api) == []
+
+
+def test_hallucinated_classes(api):
+    code = """
+        from manim import *
+        from manim import Arrow3D
+
+
+        class Demo(Scene):
+            def construct(self):
+                self.add(Circel(radius=1), Arrow3D())
+    """
+    # The import binds Arrow3D, so the call itself is not reported again
+    assert sorted(unknown(code, api)) == ["Arrow3D", "Circel (did you mean Circle?)"]
+
+
+def test_unknown_members(api):
+    code = """
+        from manim import *
+
+
+        class Demo(Scene):
+            def construct(self):
+                circle = Circle()
+                circle.scale_to(2)
+                circle.set_colour(RED)  # Mobject.__getattr__ makes any set_* valid
+                self.play_anim(Create(circle), rate_func=rate_functions.smoothh)
+    """
+    assert unknown(code, api) == [
+        "rate_functions.smoothh (did you mean smooth?)",
+        "Demo.play_anim (did you mean play?)",
+        "Circle.scale_to (did you mean scale?)",
+    ]
+
+
+def test_unknown_keyword_arguments(api):
+    code = """
+        from manim import *
+
+
+        class Demo(Scene):
+            def construct(self):
+                label = Text("x", font_color=RED)
+                circle = Circle()
+                circle.set_fill(RED, opactiy=0.5)
+                self.add(label, always_redraw(function=lambda: circle))
+                self.wait(time=1)
+    """
+    assert sorted(unknown(code, api)) == sorted([
+        "Text(font_color=...) (did you mean fill_color?)",
+        "always_redraw(function=...) (did you mean func?)",
+        "Demo.wait(time=...)",
+        "Circle.set_fill(opactiy=...) (did you mean opacity?)",
+    ])
+
+
+def test_unresolvable_code_is_not_checked(api):
+    code = """
+        from manim import *
+        from numpy import *
+
+
+        def build():
+            return Circle()
+
+
+        class Demo(Scene):
+            def construct(self):
+                circle = build()
+                circle.scale_to(2)  # result of a function: type unknown
+                shape = Circle()
+                shape = shape.copy()  # rebound: type unknown
+                shape.anything()
+                self.add(linspace(0, 1), circle, shape)
+    """
+    assert unknown(code, api) == []
+    assert unknown("def broken(:", api) == []
+
+
+def test_load_api_picks_the_configured_version(tmp_path, monkeypatch):
+    manim_api.write_index(INDEX, str(tmp_path))
+    manim_api.write_index({**INDEX, "manim_version": "0.17.3"}, str(tmp_path))
+    monkeypatch.setattr(manim_api, "MANIM_API_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(manim_api, "_installed_manim_version", lambda: None)
+    manim_api.load_api.cache_clear()
+    try:
+        monkeypatch.setattr(manim_api, "MANIM_API_VERSION", "")
+        assert manim_api.load_api().version == "0.18.1"  # the newest
+        manim_api.load_api.cache_clear()
+        monkeypatch.setattr(manim_api, "MANIM_API_VERSION", "0.17.3")
+        assert manim_api.load_api().version == "0.17.3"
+    finally:
+        manim_api.load_api.cache_clear()
@@ -0,0 +1,29 @@
+# tests/test_manim_launcher.py
+import os
+import subprocess
+import textwrap
+
+from app.core import manim_launcher
+
+
+def test_launcher_subprocess_sees_stdlib_logging(tmp_path):
+    # A stand-in Manim CLI that imports what the real one does at startup
+    package = tmp_path / "stub" / "manim"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent("""
+        import sys
+
+        def main():
+            import logging.handlers
+            print("manim", *sys.argv[1:], logging.handlers.__name__)
+    """))
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    env = manim_launcher.environment({**os.environ, "PYTHONPATH": str(tmp_path / "stub")})
+    completed = subprocess.run(manim_launcher.command("scene.py", "MyScene", "-ql"), cwd=work_dir, env=env,
+                               capture_output=True, text=True, timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "manim scene.py MyScene -ql logging.handlers"
@@ -0,0 +1,28 @@
+# tests/test_prompt_index.py
+import pytest
+
+from app.services.prompt_index import PromptIndex, code_id_for
+
+STORED = "Show the derivative of x^2 as the slope of the tangent line moving along the curve"
+
+
+@pytest.fixture
+def index():
+    index = PromptIndex(1000)
+    index.insert(STORED, code_id_for("x^2 tangent"), "calculus")
+    return index
+
+
+def test_reworded_prompt_hits(index):
+    hit = index.lookup("Visualize the derivative of x² as slope of the tangent lines moving along the curve", "calculus")
+    assert hit is not None and hit.code_id == code_id_for("x^2 tangent")
+
+
+@pytest.mark.parametrize("prompt", [
+    STORED.replace("x^2", "x^3"),
+    STORED.replace("tangent", "secant"),
+    STORED.replace("x^2", "sin x"),
+    STORED + " at x = 1",
+])
+def test_other_math_misses(index, prompt):
+    assert index.lookup(prompt, "calculus") is None
@@ -0,0 +1,44 @@
+# tests/test_templates.py
+import pytest
+
+from app.services.templates import match_template
+
+
+@pytest.mark.parametrize("prompt, template", [
+    ("Show the derivative of y = x^2 as the slope of the tangent line that moves along the curve", "derivative_tangent"),
+    ("Show the derivative of y = x³ as the slope of the tangent line", "derivative_tangent"),
+    ("Demonstrate how the area of a circle is πr^2 by unwrapping the circle into a triangle or rectangle", "circle_area"),
+    ("Visualize the Pythagorean theorem with legs 3 and 4", "pythagorean_theorem"),
+    ("Animate the graph of y = sin(x), highlighting key points and the wave nature", "sine_graph"),
+    ("Show a visual derivation and solution of the quadratic equation ax^2 + bx + c = 0", "quadratic_formula"),
+])
+def test_matches_its_topic(prompt, template):
+    match = match_template(prompt)
+    assert match is not None and match.template.name == template
+
+
+@pytest.mark.parametrize("prompt", [
+    # Variants of the topic the template cannot draw
+    "derivative of x^4 with tangent line",
+    "derivative of 1/x with a tangent line",
+    "derivative of sqrt(x) as the slope of the tangent",
+    "derivative of 3x^2 + 2x as the slope of the tangent",
+    "derivative of y=(x-1)^2 tangent slope",
+    "plot sin(2x + 1) as a wave",
+    "Graph y = sin(x) + x",
+    "solve the quadratic x^2 - 4 = 0 using the formula",
+    # Keywords of a template, but another object or a second topic
+    "slope of the tangent of a circle is perpendicular",
+    "pythagorean identity sin^2 + cos^2 = 1",
+    "area of a circle using integration by shells",
+    "Compare areas of a circle and a triangle",
+    "tangent line to a circle and its area",
+])
+def test_does_not_match_other_requests(prompt):
+    assert match_template(prompt) is None
+
+
+def test_derivative_explanation_writes_out_the_power():
+    code = match_template("Show the derivative of y = x^3 as the slope of the tangent line").code
+    assert r"\frac{d}{dx}x^{3} = 3x^{2}" in code
+    assert "x^{3 - 1}" not in code